@@ -1,20 +1,28 @@
 # app/main.py
 import os
-import glob
 import json
-from datetime import datetime
+import uuid
+from datetime import datetime, timezone
 from fastapi import Body, FastAPI, HTTPException, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 
 # services
-from app.services.scheduler import start_scheduler
-from app.services.vector_store import search_emails
+from app.services.scheduler import start_scheduler, stop_scheduler
+from app.services.vector_store import search_emails, search_emails_async, close_clients, to_epoch, QDRANT_ASYNC, SEARCH_MODES
 from app.services.digest_runner import run_and_email_digest
 from app.services.summarizer import run_rag_daily, summarize_emails_direct
-from app.services.gmail_service import get_emails_from_last_24_hours, authenticate_gmail
+from app.services.gmail_service import get_emails_from_last_24_hours, authenticate_gmail, auth_stats
+from app.services.summary_cache import get_summary_cache
+from app.services.history_store import get_history_store
+from app.services.sender_rules import ESSENTIAL_PATH, invalidate_sender_rules
+from app.services.jobs import get_job_manager
+from app.services.backend_router import get_router
+from app.services.telemetry import get_registry
+from app.services.embeddings import warmup as warmup_embeddings, EMBEDDINGS_WARMUP
 
 # --- Templates & Static ---
 templates = Jinja2Templates(directory="app/templates")
@@ -22,9 +30,9 @@ app = FastAPI(title="MailSmart API", version="1.0.0")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 LOG_DIR = os.getenv("LOG_DIR", "logs")
-ESSENTIAL_PATH = "config/essential.json"
 SCHEDULE_HOUR = int(os.getenv("SCHEDULE_HOUR", 7))
 SCHEDULE_MINUTE = int(os.getenv("SCHEDULE_MINUTE", 0))
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 20))
 
 @asynccontextmanager
 async def lifespan(app_: FastAPI):
@@ -33,32 +41,48 @@ async def lifespan(app_: FastAPI):
         start_scheduler()
     except Exception as e:
         print("⚠️ Scheduler failed to start:", e)
+    # Optionally load the embedding model before serving traffic
+    if EMBEDDINGS_WARMUP:
+        try:
+            await run_in_threadpool(warmup_embeddings)
+        except Exception as e:
+            print("⚠️ Embedding warm-up failed:", e)
     yield
+    stop_scheduler()
+    close_clients()
 
 app.router.lifespan_context = lifespan
 
 # -------------------- Helpers --------------------
-def load_summaries():
-    summaries = []
-    if os.path.exists(LOG_DIR):
-        for fname in sorted(os.listdir(LOG_DIR), reverse=True):
-            if fname.endswith(".json"):
-                try:
-                    with open(os.path.join(LOG_DIR, fname), "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                except Exception:
-                    continue
-                data.setdefault("run_time", fname.replace("summary_", "").replace(".json", ""))
-                emails = data.get("summary", {}).get("summary_of_emails", [])
-                normalized_emails = [
-                    {"summary": e.get("summary", "") if isinstance(e, dict) else e,
-                     "sender": e.get("sender", "Unknown") if isinstance(e, dict) else "Unknown"}
-                    for e in emails
-                ]
-                data["total_emails"] = len(emails)
-                data["important_emails"] = normalized_emails
-                summaries.append(data)
-    return summaries
+def _normalize_summary(data: dict) -> dict:
+    data.setdefault("run_time", data.get("time", ""))
+    emails = data.get("summary", {}).get("summary_of_emails", [])
+    normalized_emails = [
+        {"summary": e.get("summary", "") if isinstance(e, dict) else e,
+         "sender": e.get("sender", "Unknown") if isinstance(e, dict) else "Unknown"}
+        for e in emails
+    ]
+    data["total_emails"] = len(emails)
+    data["important_emails"] = normalized_emails
+    return data
+
+def _parse_day(value: str):
+    # YYYY-MM-DD -> epoch seconds (UTC), None if empty
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date (expected YYYY-MM-DD): {value}")
+
+def load_summaries(limit: int = HISTORY_PAGE_SIZE, offset: int = 0, start: float = None, end: float = None):
+    """One page of past runs, newest first, from the indexed history store."""
+    records = get_history_store().list(limit=limit, offset=offset, start=start, end=end)
+    return [_normalize_summary(r) for r in records]
+
+def load_latest_summary():
+    latest = get_history_store().latest()
+    return _normalize_summary(dict(latest)) if latest else None
 
 def load_essentials():
     if not os.path.exists(ESSENTIAL_PATH):
@@ -67,9 +91,10 @@ def load_essentials():
         return json.load(f)
 
 def save_essentials(data):
-    os.makedirs("config", exist_ok=True)
+    os.makedirs(os.path.dirname(ESSENTIAL_PATH) or ".", exist_ok=True)
     with open(ESSENTIAL_PATH, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
+    invalidate_sender_rules()  # don't rely on mtime resolution for back-to-back edits
 
 # -------------------- Routes --------------------
 @app.get("/", response_class=HTMLResponse)
@@ -78,65 +103,211 @@ async def home(request: Request):
 
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
-    summaries = load_summaries()
+    latest = load_latest_summary()
+    summaries = [latest] if latest else []
     return templates.TemplateResponse("dashboard.html", {"request": request, "summaries": summaries, "current_year": datetime.now().year})
 
 @app.get("/history", response_class=HTMLResponse)
-async def history(request: Request):
-    history = load_summaries()
-    return templates.TemplateResponse("history.html", {"request": request, "history": history, "current_year": datetime.now().year})
+async def history(request: Request, page: int = 1, start: str = None, end: str = None):
+    page = max(page, 1)
+    start_ts, end_ts = _parse_day(start), _parse_day(end)
+    if end_ts is not None:
+        end_ts += 24 * 3600  # include the whole end day
+    history = load_summaries(limit=HISTORY_PAGE_SIZE, offset=(page - 1) * HISTORY_PAGE_SIZE, start=start_ts, end=end_ts)
+    total = get_history_store().count(start=start_ts, end=end_ts)
+    return templates.TemplateResponse("history.html", {
+        "request": request, "history": history, "current_year": datetime.now().year,
+        "page": page, "has_next": page * HISTORY_PAGE_SIZE < total, "start": start or "", "end": end or ""
+    })
 
 @app.get("/essentials", response_class=HTMLResponse)
 async def essentials_page(request: Request):
     data = load_essentials()
     return templates.TemplateResponse("essentials.html", {"request": request, "essentials": data.get("senders", []), "current_year": datetime.now().year})
 
+# -------------------- Background jobs --------------------
+def _digest_job(progress, max_results: int = 20, profile: bool = False):
+    return run_and_email_digest(max_results=max_results, progress=progress, profile=profile or None)
+
+def _summarize_job(progress, limit: int = 20, profile: bool = False):
+    return {"summary": run_rag_daily(max_results=limit, progress=progress, profile=profile or None)}
+
+def _summarize_direct_job(progress, emails: list):
+    return {"summary": summarize_emails_direct(emails, progress=progress)}
+
+def _raw_emails_job(progress, limit: int = 10):
+    emails = get_emails_from_last_24_hours(max_results=limit)
+    progress("fetched", count=len(emails))
+    return {"emails": emails}
+
+def _queued(job):
+    return JSONResponse({"status": job.status, "job_id": job.id, "kind": job.kind}, status_code=202)
+
+@app.post("/jobs/digest")
+def submit_digest_job(max_results: int = 20, profile: bool = False):
+    return _queued(get_job_manager().submit("digest", _digest_job, max_results=max_results, profile=profile))
+
+@app.post("/jobs/summarize")
+def submit_summarize_job(limit: int = 20, profile: bool = False):
+    return _queued(get_job_manager().submit("summarize", _summarize_job, limit=limit, profile=profile))
+
+@app.post("/jobs/raw-emails")
+def submit_raw_emails_job(limit: int = 10):
+    return _queued(get_job_manager().submit("raw_emails", _raw_emails_job, limit=limit))
+
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": [j.to_dict(include_result=False) for j in get_job_manager().list()]}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/events")
+def job_events(job_id: str):
+    """Server-sent events: one `data:` line per progress event until the job ends."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return StreamingResponse(_job_event_stream(job), media_type="text/event-stream")
+
+def _job_event_stream(job, with_result: bool = False):
+    sent = 0
+    while True:
+        events = job.wait_events(sent)
+        if not events:
+            yield ": keep-alive\n\n"
+        for event in events:
+            yield f"data: {json.dumps(event, default=str)}\n\n"
+        sent += len(events)
+        if job.done and sent >= len(job.events):
+            break
+    if with_result and job.status == "succeeded":
+        yield f"data: {json.dumps({'stage': 'result', **job.result}, default=str)}\n\n"
+
+def _streamed(job):
+    """Stream a job's progress (including summary points as they arrive), then its result."""
+    return StreamingResponse(_job_event_stream(job, with_result=True), media_type="text/event-stream")
+
 # -------------------- API Endpoints --------------------
 @app.post("/run-now")
-def run_now():
+def run_now(wait: bool = False, max_results: int = 20, profile: bool = False):
+    """
+    Queue a digest run and return its job id (202). Concurrent clicks share
+    the in-flight run. wait=true keeps the old blocking behaviour.
+    profile=true records a cProfile of the run next to the summary logs.
+    """
+    if not wait:
+        return _queued(get_job_manager().submit("digest", _digest_job, max_results=max_results, profile=profile))
     try:
-        result = run_and_email_digest()
+        result = run_and_email_digest(max_results=max_results, profile=profile or None)
         return JSONResponse({"status": "ok", "summary": result})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/raw-emails")
-def raw_emails(limit: int = 10):
+def raw_emails(limit: int = 10, background: bool = False):
     """
     Fetch recent emails (last 24 hours) using Gmail API.
     Works locally or on deployment headlessly.
+    background=true queues the fetch as a job instead.
     """
+    if background:
+        return _queued(get_job_manager().submit("raw_emails", _raw_emails_job, limit=limit))
     try:
         return {"emails": get_emails_from_last_24_hours(max_results=limit)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/summarize")
-def summarize_endpoint(regenerate: bool = False, limit: int = 20):
+def summarize_endpoint(regenerate: bool = False, limit: int = 20, background: bool = False, stream: bool = False,
+                       profile: bool = False):
+    """
+    stream=true (with regenerate=true) answers with server-sent events:
+    pipeline progress, each summary point as soon as the LLM has written it,
+    then the full summary.
+    """
     try:
+        if regenerate and stream:
+            return _streamed(get_job_manager().submit("summarize", _summarize_job, limit=limit, profile=profile))
+        if regenerate and background:
+            return _queued(get_job_manager().submit("summarize", _summarize_job, limit=limit, profile=profile))
         if regenerate:
-            return {"summary": run_rag_daily(max_results=limit)}
-        files = sorted(glob.glob(os.path.join(LOG_DIR, "summary_*.json")), reverse=True)
-        if files:
-            with open(files[0], "r", encoding="utf-8") as fh:
-                data = json.load(fh)
-            return {"summary": data.get("summary")}
+            return {"summary": run_rag_daily(max_results=limit, profile=profile or None)}
+        latest = get_history_store().latest()
+        if latest:
+            return {"summary": latest.get("summary")}
         return {"summary": run_rag_daily(max_results=limit)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/history")
+def api_history(limit: int = HISTORY_PAGE_SIZE, offset: int = 0, start: str = None, end: str = None):
+    start_ts, end_ts = _parse_day(start), _parse_day(end)
+    if end_ts is not None:
+        end_ts += 24 * 3600
+    store = get_history_store()
+    return {
+        "total": store.count(start=start_ts, end=end_ts),
+        "items": store.list(limit=min(limit, 200), offset=offset, start=start_ts, end=end_ts),
+    }
+
 @app.post("/summarize/direct")
-def summarize_direct(payload: dict):
+def summarize_direct(payload: dict, stream: bool = False):
     try:
         emails = payload.get("emails", [])
+        if stream:
+            job = get_job_manager().submit("summarize-direct", _summarize_direct_job, key=uuid.uuid4().hex, emails=emails)
+            return _streamed(job)
         return {"summary": summarize_emails_direct(emails)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/summary-cache")
+def summary_cache_stats():
+    cache = get_summary_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: span histograms and run counters."""
+    return PlainTextResponse(get_registry().render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/backends")
+def backend_health():
+    """Circuit state, latency EWMA and latency histogram per LLM backend."""
+    return get_router().snapshot()
+
+@app.get("/api/gmail-auth")
+def gmail_auth_stats():
+    """Credential/service cache counters (loads, refreshes, builds, hits)."""
+    return auth_stats()
+
 @app.get("/search")
-def search(q: str, top_k: int = 5):
+async def search(q: str = "", top_k: int = 5, sender: str = None, after: str = None, before: str = None, mode: str = None,
+                 account: str = None):
+    """
+    Hybrid BM25 + vector search (mode=hybrid|vector|lexical, default SEARCH_MODE).
+    sender filters by address; after/before take epoch seconds or ISO dates.
+    Results come from one mailbox: account (see accounts.py), default if omitted.
+    """
+    try:
+        filters = {"sender": sender, "after": to_epoch(after), "before": to_epoch(before), "account": account}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {e}")
+    if mode and mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown search mode: {mode}")
     try:
-        return {"query": q, "results": search_emails(q, top_k=top_k)}
+        if QDRANT_ASYNC:
+            results = await search_emails_async(q, top_k=top_k, mode=mode, **filters)
+        else:
+            results = await run_in_threadpool(search_emails, q, top_k=top_k, mode=mode, **filters)
+        return {"query": q, "results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
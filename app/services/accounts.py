@@ -0,0 +1,87 @@
+# app/services/accounts.py
+"""
+Mailbox accounts for multi-tenant digests.
+
+config/accounts.json:
+{
+  "accounts": [
+    {"id": "alice", "hour": 7, "minute": 0, "timezone": "Europe/Berlin", "max_results": 50},
+    {"id": "bob", "token_path": "secrets/bob.json", "timezone": "America/New_York"}
+  ]
+}
+
+Each account's OAuth token lives in TOKEN_DIR/<id>.json unless token_path is
+given. Without an accounts file there is a single "default" account that
+uses token.json and the SCHEDULE_* env settings, same as before.
+"""
+import os
+import re
+import json
+from typing import Dict, List
+
+from dotenv import load_dotenv
+load_dotenv()
+
+ACCOUNTS_PATH = os.getenv("ACCOUNTS_PATH", "config/accounts.json")
+TOKEN_DIR = os.getenv("TOKEN_DIR", "tokens")
+DEFAULT_ACCOUNT = "default"
+DEFAULT_TOKEN_PATH = "token.json"
+
+SCHEDULE_HOUR = int(os.getenv("SCHEDULE_HOUR", 7))
+SCHEDULE_MINUTE = int(os.getenv("SCHEDULE_MINUTE", 0))
+SCHEDULE_TIMEZONE = os.getenv("SCHEDULE_TIMEZONE", "Asia/Kolkata")
+MAX_EMAIL_FETCH = int(os.getenv("MAX_EMAIL_FETCH", 20))
+
+_ID_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def _validate_id(account_id: str) -> str:
+    # ids end up in file names
+    if not account_id or not _ID_RE.match(account_id) or account_id in (".", ".."):
+        raise ValueError(f"Invalid account id: {account_id!r}")
+    return account_id
+
+
+def _default_token_path(account_id: str = None) -> str:
+    if not account_id or account_id == DEFAULT_ACCOUNT:
+        return DEFAULT_TOKEN_PATH
+    return os.path.join(TOKEN_DIR, f"{_validate_id(account_id)}.json")
+
+
+def token_path_for(account_id: str = None, path: str = None) -> str:
+    """The account's token_path from the accounts file, else the default location."""
+    try:
+        return get_account(account_id or DEFAULT_ACCOUNT, path)["token_path"]
+    except KeyError:
+        return _default_token_path(account_id)
+
+
+def _with_defaults(raw: Dict) -> Dict:
+    account_id = _validate_id(raw.get("id", DEFAULT_ACCOUNT))
+    return {
+        "id": account_id,
+        "token_path": raw.get("token_path") or _default_token_path(account_id),
+        "hour": int(raw.get("hour", SCHEDULE_HOUR)),
+        "minute": int(raw.get("minute", SCHEDULE_MINUTE)),
+        "timezone": raw.get("timezone", SCHEDULE_TIMEZONE),
+        "max_results": int(raw.get("max_results", MAX_EMAIL_FETCH)),
+        "enabled": bool(raw.get("enabled", True)),
+    }
+
+
+def load_accounts(path: str = None) -> List[Dict]:
+    path = path or ACCOUNTS_PATH
+    if not os.path.exists(path):
+        return [_with_defaults({"id": DEFAULT_ACCOUNT})]
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [_with_defaults(a) for a in data.get("accounts", [])]
+
+
+def get_account(account_id: str, path: str = None) -> Dict:
+    for account in load_accounts(path):
+        if account["id"] == account_id:
+            return account
+    if account_id == DEFAULT_ACCOUNT:
+        return _with_defaults({"id": DEFAULT_ACCOUNT})
+    raise KeyError(f"Unknown account: {account_id}")
@@ -0,0 +1,336 @@
+# app/services/backend_router.py
+"""
+Routes summarization prompts across LLM backends.
+
+- Per-backend circuit breaker: BACKEND_FAILURE_THRESHOLD consecutive failures
+  open it for BACKEND_COOLDOWN_SECONDS; after that one probe call is let
+  through (half-open) and either closes it again or re-opens it.
+- Per-backend timeouts (BACKEND_TIMEOUTS="Perplexity=30,Gemini=30,Local=120").
+- Latency EWMA and histogram per backend; healthy backends are tried
+  fastest first (BACKEND_ROUTING=fastest) or in configured order (ordered).
+- Hedging: if the first backend hasn't answered after
+  max(BACKEND_HEDGE_MIN_SECONDS, BACKEND_HEDGE_FACTOR x its EWMA), the next
+  one is started too and the first good answer wins. 0 disables hedging.
+- Streaming (stream()): same breakers, ordering and timeouts, no hedging;
+  time-to-first-token is tracked separately.
+"""
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.services import rate_limiter
+from app.services.rate_limiter import parse_rate_limits
+from app.services.telemetry import span, submit_in_context
+
+BACKEND_FAILURE_THRESHOLD = int(os.getenv("BACKEND_FAILURE_THRESHOLD", 3))
+BACKEND_COOLDOWN_SECONDS = float(os.getenv("BACKEND_COOLDOWN_SECONDS", 60))
+BACKEND_TIMEOUTS = os.getenv("BACKEND_TIMEOUTS", "Perplexity=30,Gemini=30,Local=120")
+BACKEND_DEFAULT_TIMEOUT = float(os.getenv("BACKEND_DEFAULT_TIMEOUT", 30))
+BACKEND_ROUTING = os.getenv("BACKEND_ROUTING", "fastest")  # fastest | ordered
+BACKEND_HEDGE_MIN_SECONDS = float(os.getenv("BACKEND_HEDGE_MIN_SECONDS", 5))
+BACKEND_HEDGE_FACTOR = float(os.getenv("BACKEND_HEDGE_FACTOR", 2))
+BACKEND_POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", 16))
+_START_POLL = 0.05  # how often complete() checks whether a rate-limited call has started
+EWMA_ALPHA = 0.3
+LATENCY_BUCKETS = [0.25, 0.5, 1, 2.5, 5, 10, 30, 60]  # seconds, histogram upper bounds
+
+Backend = Tuple[str, Callable[[str], Dict]]
+
+
+class BackendError(Exception):
+    """A backend answered, but not with something usable."""
+
+
+class BackendState:
+    """Circuit breaker + latency stats for one backend."""
+
+    def __init__(self, name: str, failure_threshold: int, cooldown: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"  # closed | open | half_open
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedged = 0
+        self.ewma = None
+        self.ttft_ewma = None
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """May a call go out now? Moves open -> half_open once the cool-down is over."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_hedge(self):
+        with self._lock:
+            self.hedged += 1
+
+    def record_success(self, latency: float, ttft: float = None):
+        with self._lock:
+            if ttft is not None:
+                self.ttft_ewma = ttft if self.ttft_ewma is None else EWMA_ALPHA * ttft + (1 - EWMA_ALPHA) * self.ttft_ewma
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = "closed"
+            self.probe_in_flight = False
+            self.ewma = latency if self.ewma is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma
+            self.histogram[_bucket(latency)] += 1
+
+    def record_failure(self, error: str, timeout: bool = False):
+        with self._lock:
+            self.failures += 1
+            self.timeouts += int(timeout)
+            self.consecutive_failures += 1
+            self.last_error = error
+            self.probe_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"🔌 {self.name} circuit open for {self.cooldown:.0f}s ({error})")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            retry_in = None
+            if self.state == "open":
+                retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "successes": self.successes,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "hedged": self.hedged,
+                "latency_ewma_ms": round(self.ewma * 1000, 1) if self.ewma is not None else None,
+                "ttft_ewma_ms": round(self.ttft_ewma * 1000, 1) if self.ttft_ewma is not None else None,
+                "latency_histogram": {
+                    (f"le_{b}s" if i < len(LATENCY_BUCKETS) else "inf"): n
+                    for i, (b, n) in enumerate(zip(LATENCY_BUCKETS + [None], self.histogram))
+                },
+                "retry_in_seconds": round(retry_in, 1) if retry_in is not None else None,
+                "last_error": self.last_error,
+            }
+
+
+def _bucket(latency: float) -> int:
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if latency <= bound:
+            return i
+    return len(LATENCY_BUCKETS)
+
+
+def response_text(res: Dict) -> str:
+    """Content of an OpenAI-style response dict; raises BackendError if empty."""
+    try:
+        content = res["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        raise BackendError("malformed response")
+    if not content or not content.strip():
+        raise BackendError("empty response")
+    return content
+
+
+class BackendRouter:
+    def __init__(
+        self,
+        failure_threshold: int = BACKEND_FAILURE_THRESHOLD,
+        cooldown: float = BACKEND_COOLDOWN_SECONDS,
+        timeouts: Dict[str, float] = None,
+        routing: str = BACKEND_ROUTING,
+        hedge_min: float = BACKEND_HEDGE_MIN_SECONDS,
+        hedge_factor: float = BACKEND_HEDGE_FACTOR,
+        max_workers: int = BACKEND_POOL_SIZE,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.timeouts = parse_rate_limits(BACKEND_TIMEOUTS) if timeouts is None else timeouts
+        self.routing = routing
+        self.hedge_min = hedge_min
+        self.hedge_factor = hedge_factor
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mailsmart-backend")
+        self._states: Dict[str, BackendState] = {}
+        self._lock = threading.Lock()
+
+    def state(self, name: str) -> BackendState:
+        with self._lock:
+            if name not in self._states:
+                self._states[name] = BackendState(name, self.failure_threshold, self.cooldown)
+            return self._states[name]
+
+    def _order(self, backends: List[Backend]) -> List[Backend]:
+        if self.routing != "fastest":
+            return list(backends)
+        # measured backends by EWMA first, unmeasured ones keep configured order
+        ranked = sorted(
+            enumerate(backends),
+            key=lambda ib: (self.state(ib[1][0]).ewma is None, self.state(ib[1][0]).ewma or 0, ib[0]),
+        )
+        return [b for _, b in ranked]
+
+    def _hedge_delay(self, name: str) -> Optional[float]:
+        if not self.hedge_factor:
+            return None
+        ewma = self.state(name).ewma
+        return max(self.hedge_min, self.hedge_factor * ewma) if ewma is not None else self.hedge_min
+
+    def _call(self, name: str, func: Callable[[str], Dict], prompt: str, started: list) -> Tuple[str, float]:
+        rate_limiter.acquire(name)
+        t0 = started[0] = time.monotonic()  # the timeout clock starts once the rate limiter lets it through
+        with span("llm", backend=name):
+            content = response_text(func(prompt))
+        return content, time.monotonic() - t0
+
+    def complete(self, prompt: str, backends: List[Backend]) -> Optional[Tuple[str, str]]:
+        """
+        (backend name, response text) from the first backend that answers,
+        or None if every healthy backend failed / all circuits are open.
+        """
+        candidates = self._order(backends)
+        pending = {}  # future -> (name, timeout, [start time, set by _call after the rate-limit wait])
+
+        def launch_next(hedge: bool = False) -> bool:
+            while candidates:
+                name, func = candidates.pop(0)
+                if not self.state(name).allow():
+                    continue
+                if hedge:
+                    self.state(name).record_hedge()
+                started = [None]
+                future = submit_in_context(self._pool, self._call, name, func, prompt, started)
+                pending[future] = (name, self.timeouts.get(name, BACKEND_DEFAULT_TIMEOUT), started)
+                return True
+            return False
+
+        def deadline(timeout: float, started: list) -> float:
+            # still waiting on the rate limiter: check back shortly instead of timing it out
+            return started[0] + timeout if started[0] is not None else time.monotonic() + _START_POLL
+
+        if not launch_next():
+            return None
+        primary = next(iter(pending.values()))[0]
+        hedge_at = self._hedge_delay(primary)
+        hedge_at = time.monotonic() + hedge_at if hedge_at is not None else None
+
+        while pending:
+            now = time.monotonic()
+            wake = min(deadline(timeout, started) for _, timeout, started in pending.values())
+            if hedge_at is not None:
+                wake = min(wake, hedge_at)
+            done, _ = wait(list(pending), timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = pending.pop(future)[0]
+                try:
+                    content, latency = future.result()
+                except Exception as e:
+                    print(f"⚠️ {name} failed: {e}")
+                    self.state(name).record_failure(str(e) or type(e).__name__)
+                    continue
+                self.state(name).record_success(latency)
+                return name, content
+
+            now = time.monotonic()
+            for future, (name, timeout, started) in list(pending.items()):
+                if started[0] is not None and now >= started[0] + timeout:
+                    del pending[future]  # the thread finishes on its own; its answer is ignored
+                    print(f"⚠️ {name} timed out")
+                    self.state(name).record_failure("timeout", timeout=True)
+
+            if hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                launch_next(hedge=True)
+            if not pending:
+                launch_next()
+        return None
+
+    def stream(self, prompt: str, backends: List[Backend]) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Stream (backend name, text delta) from the first healthy backend.
+        backends are (name, func) where func(prompt) yields text deltas.
+        If a backend fails mid-stream, (name, None) is yielded to say its
+        partial output is void, and the next backend takes over.
+        """
+        for name, func in self._order(backends):
+            state = self.state(name)
+            if not state.allow():
+                continue
+            deltas = queue.Queue()
+
+            def produce(func=func, name=name, deltas=deltas):
+                try:
+                    rate_limiter.acquire(name)
+                    deltas.put(("start", time.monotonic()))
+                    with span("llm.stream", backend=name):
+                        for delta in func(prompt):
+                            if delta:
+                                deltas.put(("delta", delta))
+                    deltas.put(("end", None))
+                except Exception as e:
+                    deltas.put(("error", e))
+
+            deadline = None  # set when produce() is past the rate limiter
+            submit_in_context(self._pool, produce)
+            t0, ttft, started = time.monotonic(), None, False
+            while True:
+                try:
+                    kind, value = deltas.get(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    print(f"⚠️ {name} timed out")
+                    state.record_failure("timeout", timeout=True)
+                    break
+                if kind == "start":
+                    t0 = value  # don't count rate-limit waits as latency or against the timeout
+                    deadline = value + self.timeouts.get(name, BACKEND_DEFAULT_TIMEOUT)
+                elif kind == "delta":
+                    if ttft is None:
+                        ttft = time.monotonic() - t0
+                    started = True
+                    yield name, value
+                elif kind == "end":
+                    if started:
+                        state.record_success(time.monotonic() - t0, ttft=ttft)
+                        return
+                    state.record_failure("empty response")
+                    break
+                else:
+                    print(f"⚠️ {name} failed: {value}")
+                    state.record_failure(str(value) or type(value).__name__)
+                    break
+            if started:
+                yield name, None
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            states = dict(self._states)
+        return {name: s.to_dict() for name, s in states.items()}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> BackendRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = BackendRouter()
+        return _router
@@ -0,0 +1,188 @@
+# app/services/chunk_planner.py
+"""
+Packs emails into as few LLM prompts as fit each backend's token budget.
+
+Budgets are per backend (PROMPT_TOKEN_BUDGETS="Perplexity=6000,Gemini=8000,Local=1024")
+and include the prompt template, so the template overhead is paid once per
+call. Emails stay whole unless a single email is larger than a whole prompt.
+
+Token counts: tiktoken's cl100k_base for Perplexity when installed (neither
+sonar-pro nor Gemini publish a tokenizer), the model's own HF tokenizer for
+the local distilbart backend, and a chars/token estimate otherwise (logged
+once per backend; token_counter_kind() says which one is in use).
+"""
+import os
+import math
+import threading
+from typing import Callable, Dict, List
+
+from dotenv import load_dotenv
+load_dotenv()
+
+PROMPT_TOKEN_BUDGETS = os.getenv("PROMPT_TOKEN_BUDGETS", "Perplexity=6000,Gemini=8000,Local=1024")
+PROMPT_OUTPUT_RESERVE = int(os.getenv("PROMPT_OUTPUT_RESERVE", 1024))  # tokens left for the answer
+PROMPT_MAX_EMAILS = int(os.getenv("PROMPT_MAX_EMAILS", 40))  # keeps the JSON answer a sane size
+HF_LOCAL_MODEL = os.getenv("HF_LOCAL_MODEL", "sshleifer/distilbart-cnn-12-6")
+EMAIL_SEPARATOR = "\n\n---\n\n"
+PLACEHOLDER = "{emails_text}"
+
+# chars per token when no tokenizer is available (English mail text)
+_CHARS_PER_TOKEN = {"Perplexity": 3.8, "Gemini": 4.0, "Local": 3.5}
+_DEFAULT_BUDGET = 6000
+_LOCAL_INPUT_TOKENS = 1024  # distilbart max positions; the output reserve doesn't apply
+
+_counters: Dict[str, Callable[[str], int]] = {}
+_counter_kinds: Dict[str, str] = {}
+_counters_lock = threading.Lock()
+
+
+def parse_budgets(spec: str) -> Dict[str, int]:
+    budgets = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        name, value = part.split("=", 1)
+        try:
+            budgets[name.strip()] = int(value)
+        except ValueError:
+            print(f"⚠️ Ignoring invalid token budget: {part}")
+    return budgets
+
+
+_budgets = parse_budgets(PROMPT_TOKEN_BUDGETS)
+
+
+def _estimate(chars_per_token: float) -> Callable[[str], int]:
+    return lambda text: math.ceil(len(text) / chars_per_token)
+
+
+def _build_counter(backend: str) -> tuple:
+    """(counter, description of what it counts with)."""
+    if backend == "Local":
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(HF_LOCAL_MODEL)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False)), f"hf:{HF_LOCAL_MODEL}"
+        except Exception as e:
+            print(f"⚠️ Local tokenizer unavailable ({e}), estimating tokens")
+    elif backend == "Perplexity":
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding("cl100k_base")
+            return lambda text: len(encoding.encode(text, disallowed_special=())), "tiktoken:cl100k_base"
+        except Exception as e:
+            print(f"⚠️ tiktoken unavailable ({e}), estimating Perplexity tokens")
+    chars_per_token = _CHARS_PER_TOKEN.get(backend, 4.0)
+    return _estimate(chars_per_token), f"estimate:{chars_per_token} chars/token"
+
+
+def get_token_counter(backend: str) -> Callable[[str], int]:
+    """Token counter for a backend, built once per process."""
+    with _counters_lock:
+        if backend not in _counters:
+            _counters[backend], _counter_kinds[backend] = _build_counter(backend)
+        return _counters[backend]
+
+
+def token_counter_kind(backend: str) -> str:
+    """What get_token_counter(backend) counts with, e.g. "tiktoken:cl100k_base"."""
+    get_token_counter(backend)
+    return _counter_kinds[backend]
+
+
+def token_budget(backend: str) -> int:
+    return _budgets.get(backend, _LOCAL_INPUT_TOKENS if backend == "Local" else _DEFAULT_BUDGET)
+
+
+def binding_backend(backends: List[str]) -> str:
+    """
+    The backend whose budget every prompt has to fit: the smallest remote one.
+    Local re-splits its input itself, so it only binds when it is the only backend.
+    """
+    remote = [b for b in backends if b != "Local"] or list(backends) or ["Perplexity"]
+    return min(remote, key=token_budget)
+
+
+def email_block(email: Dict) -> str:
+    block = f"From: {email.get('from')}\nSubject: {email.get('subject')}\n{email.get('snippet')}"
+    if email.get("similar"):
+        block += f"\n(+{email['similar']} similar messages)"  # near-duplicates collapsed by dedup.py
+    return block
+
+
+def split_to_budget(text: str, budget: int, count_tokens: Callable[[str], int]) -> List[str]:
+    """
+    Split text on word boundaries into pieces of at most ~`budget` tokens.
+    Words are counted one at a time, which slightly over-counts for BPE
+    tokenizers, so pieces err on the small side.
+    """
+    if count_tokens(text) <= budget:
+        return [text]
+    pieces, current, size = [], [], 0
+    for word in text.split():
+        cost = count_tokens(" " + word)
+        if current and size + cost > budget:
+            pieces.append(" ".join(current))
+            current, size = [], 0
+        current.append(word)
+        size += cost
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _email_parts(email: Dict, budget: int, count_tokens: Callable[[str], int]) -> List[str]:
+    block = email_block(email)
+    if count_tokens(block) <= budget:
+        return [block]
+    # oversize email: repeat the header on every part so each prompt has context
+    header = f"From: {email.get('from')}\nSubject: {email.get('subject')}"
+    body_budget = max(1, budget - count_tokens(header) - 8)
+    bodies = split_to_budget(str(email.get("snippet") or ""), body_budget, count_tokens)
+    return [f"{header} (part {i}/{len(bodies)})\n{body}" for i, body in enumerate(bodies, 1)]
+
+
+def plan_chunks(
+    emails: List[Dict],
+    prompt_template: str,
+    backend: str = "Perplexity",
+    budget: int = None,
+    count_tokens: Callable[[str], int] = None,
+    max_emails: int = None,
+) -> List[str]:
+    """
+    Pack emails into emails_text chunks for prompt_template. First-fit in mail
+    order: each block goes into the first chunk with room, so chunks stay
+    nearly full and the same mailbox always packs the same way (cache-friendly).
+    """
+    if not emails:
+        return []
+    count_tokens = count_tokens or get_token_counter(backend)
+    budget = budget if budget is not None else token_budget(backend)
+    max_emails = max_emails or PROMPT_MAX_EMAILS
+    template_tokens = count_tokens(prompt_template.replace(PLACEHOLDER, ""))
+    reserve = 0 if backend == "Local" else PROMPT_OUTPUT_RESERVE  # the summarization model's output isn't in its input window
+    available = max(1, budget - template_tokens - reserve)
+    sep_tokens = count_tokens(EMAIL_SEPARATOR)
+    # no block is smaller than a bare header, so a chunk with less room than that is closed
+    min_cost = sep_tokens + count_tokens(email_block({"from": "", "subject": "", "snippet": ""}))
+
+    chunks: List[List[str]] = []
+    used: List[int] = []
+    open_chunks: List[int] = []  # indices of chunks that can still take a block, in order
+    for email in emails:
+        for part in _email_parts(email, available, count_tokens):
+            cost = count_tokens(part)
+            for pos, i in enumerate(open_chunks):
+                if used[i] + sep_tokens + cost <= available:
+                    chunks[i].append(part)
+                    used[i] += sep_tokens + cost
+                    break
+            else:
+                chunks.append([part])
+                used.append(cost)
+                pos, i = len(open_chunks), len(chunks) - 1
+                open_chunks.append(i)
+            if len(chunks[i]) >= max_emails or used[i] + min_cost > available:
+                del open_chunks[pos]
+    return [EMAIL_SEPARATOR.join(blocks) for blocks in chunks]
@@ -0,0 +1,161 @@
+# app/services/dedup.py
+"""
+Near-duplicate clustering ahead of summarization. CI notifications,
+repeated alerts and newsletter copies collapse into one representative
+(the newest) that carries how many similar messages it stands for, so
+prompt volume follows distinct content rather than raw message count.
+Essential senders and transactional mail (triage.must_keep: payments,
+debits, orders, OTPs) are never collapsed: their amounts and ids differ
+only in the digits the hash ignores, and each one matters.
+
+Each email gets a 64-bit SimHash over word uni/bigrams of subject + snippet
+with digits masked ("Build #1234 failed" ~ "Build #1240 failed"). Candidate
+pairs come from LSH banding: with DEDUP_MAX_DISTANCE=d the hash is cut into
+d+1 bands, and any two hashes within d bits agree on at least one band. So
+each email is only compared to representatives sharing a band (and, by
+default, a sender), which keeps the whole pass near-linear.
+"""
+import os
+import re
+import hashlib
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from app.services.lexical_index import normalize_sender
+from app.services.triage import must_keep
+load_dotenv()
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", 3))  # SimHash bits that may differ
+DEDUP_SAME_SENDER = os.getenv("DEDUP_SAME_SENDER", "true").lower() in ("1", "true", "yes")
+
+_BITS = 64
+_BATCH = 8192  # emails per numpy batch (bounds the feature matrix)
+_BUCKET_LIMIT = 32  # representatives compared per bucket
+_MAX_FEATURES = 500_000  # feature table is dropped and rebuilt past this
+_WORD_RE = re.compile(r"\w+")
+_DIGITS_RE = re.compile(r"\d+")
+
+_feature_rows: Dict[str, int] = {}  # feature -> column in _feature_bits
+_feature_bits = np.zeros((_BITS, 0), dtype=np.int8)  # ±1 per hash bit; bit-major so per-email sums run along rows
+_feature_lock = threading.Lock()
+
+
+def _masked_text(email: Dict) -> str:
+    return _DIGITS_RE.sub("0", f"{email.get('subject') or ''} {email.get('snippet') or ''}".lower())
+
+
+def _features(text: str) -> List[str]:
+    words = _WORD_RE.findall(text)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _rows_for(batch_features: List[List[str]]) -> List[List[int]]:
+    """
+    Columns of the ±1 bit matrix for each email's features. Features unseen so
+    far are hashed together and appended once per batch, so the matrix is
+    copied once per batch rather than once per email.
+    """
+    global _feature_bits
+    rows = _feature_rows
+    new = list(set().union(*batch_features).difference(rows))  # column order doesn't affect the hashes
+    if new:
+        digests = np.frombuffer(b"".join([hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest() for f in new]), dtype=np.uint8)
+        bits = np.unpackbits(digests).reshape(len(new), _BITS).astype(np.int8) * 2 - 1
+        _feature_bits = np.hstack([_feature_bits, bits.T])
+        rows.update(zip(new, range(len(rows), len(rows) + len(new))))
+    return [list(map(rows.__getitem__, features)) for features in batch_features]
+
+
+def simhashes(emails: List[Dict]) -> List[int]:
+    """
+    64-bit SimHash per email (0 for an email with no text). Emails whose
+    digit-masked text is identical (the common case for floods) are hashed once.
+    """
+    texts = [_masked_text(e) for e in emails]
+    unique = list(dict.fromkeys(texts))
+    hashes: List[int] = []
+    with _feature_lock:
+        for start in range(0, len(unique), _BATCH):
+            hashes.extend(_batch_hashes(unique[start:start + _BATCH]))
+    by_text = dict(zip(unique, hashes))
+    return [by_text[t] for t in texts]
+
+
+def _batch_hashes(texts: List[str]) -> List[int]:
+    global _feature_bits
+    if len(_feature_rows) > _MAX_FEATURES:  # bound the table between batches
+        _feature_rows.clear()
+        _feature_bits = np.zeros((_BITS, 0), dtype=np.int8)
+    rows, offsets = [], []
+    for email_rows in _rows_for([_features(text) for text in texts]):
+        offsets.append(len(rows))
+        rows.extend(email_rows)
+    if not rows:
+        return [0] * len(texts)
+    counts = np.diff(np.append(offsets, len(rows)))
+    starts = np.minimum(offsets, len(rows) - 1)
+    sums = np.add.reduceat(np.take(_feature_bits, rows, axis=1), starts, axis=1, dtype=np.int32)
+    sums[:, counts == 0] = 0  # reduceat yields a single column, not zeros, for empty slices
+    values = np.ascontiguousarray(np.packbits(sums.T > 0, axis=1)).view(">u8").ravel()
+    return [int(v) for v in values]
+
+
+def _bands(h: int, n_bands: int) -> List[Tuple[int, int]]:
+    width = _BITS // n_bands
+    mask = (1 << width) - 1
+    return [(i, (h >> (i * width)) & mask) for i in range(n_bands)]
+
+
+def cluster(emails: List[Dict], max_distance: int = None, same_sender: bool = None) -> List[List[int]]:
+    """Group near-duplicate emails; returns clusters as index lists, in first-seen order."""
+    max_distance = DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+    same_sender = DEDUP_SAME_SENDER if same_sender is None else same_sender
+    n_bands = max(1, min(max_distance + 1, _BITS // 8))
+    hashes = simhashes(emails)
+    buckets: Dict[tuple, List[int]] = {}  # (sender, band, value) -> cluster ids
+    clusters: List[List[int]] = []
+    rep_hash: List[int] = []
+    for i, (e, h) in enumerate(zip(emails, hashes)):
+        if must_keep(e):
+            clusters.append([i])
+            rep_hash.append(h)
+            continue
+        sender = normalize_sender(e.get("from") or "") if same_sender else ""
+        keys = [(sender,) + band for band in _bands(h, n_bands)]
+        found = None
+        for key in keys:
+            for c in buckets.get(key, ()):
+                if (rep_hash[c] ^ h).bit_count() <= max_distance:
+                    found = c
+                    break
+            if found is not None:
+                break
+        if found is not None:
+            clusters[found].append(i)
+            continue
+        clusters.append([i])
+        rep_hash.append(h)
+        for key in keys:
+            bucket = buckets.setdefault(key, [])
+            if len(bucket) < _BUCKET_LIMIT:
+                bucket.append(len(clusters) - 1)
+    return clusters
+
+
+def collapse(emails: List[Dict], **kwargs) -> Tuple[List[Dict], Dict]:
+    """
+    One representative per cluster (the first, i.e. newest): a copy with
+    similar=<other messages in the cluster>. Returns (emails, report).
+    """
+    if not emails:
+        return emails, {"emails": 0, "distinct": 0, "collapsed": 0}
+    out = []
+    for members in cluster(emails, **kwargs):
+        rep = emails[members[0]]
+        if len(members) > 1:
+            rep = dict(rep, similar=len(members) - 1)
+        out.append(rep)
+    return out, {"emails": len(emails), "distinct": len(out), "collapsed": len(emails) - len(out)}
@@ -2,29 +2,42 @@
 from app.services.summarizer import run_rag_daily
 from app.services.formatter import format_digest
 from app.services.emailer import send_email
-from app.services.gmail_service import authenticate_gmail
+from app.services.gmail_service import authenticate_gmail, count_auth_ops
+from app.services.telemetry import span, start_run
 
-def run_and_email_digest(max_results: int = 20):
+def run_and_email_digest(max_results: int = 20, progress=None, account_id: str = None, profile: bool = None):
     """
     Full daily pipeline: fetch emails, summarize, format digest, send email.
     Always sends the digest back to the authenticated user.
+    progress(stage, **data) receives pipeline progress events (see jobs.py).
+    account_id selects the mailbox (see accounts.py); None = default token.json.
+    profile=True records a cProfile of the run (see telemetry.py).
     """
-    # 1️⃣ Authenticate Gmail (token.json + scopes)
-    service = authenticate_gmail()
+    with start_run("digest", profile=profile) as run:
+        with count_auth_ops() as auth_ops:
+            # 1️⃣ Authenticate Gmail (per-account token + scopes, cached)
+            service = authenticate_gmail(account_id=account_id)
 
-    # 2️⃣ Run RAG summarization
-    summary = run_rag_daily(max_results=max_results)
+            # 2️⃣ Run RAG summarization
+            summary = run_rag_daily(max_results=max_results, progress=progress, service=service, account_id=account_id)
+        print(f"🔐 Gmail auth this run: {auth_ops}")
 
-    # 3️⃣ Format digest text
-    digest_text = format_digest(summary)
+        # 3️⃣ Format digest text
+        digest_text = format_digest(summary)
 
-    # 4️⃣ Recipient is always self
-    user_email = service.users().getProfile(userId="me").execute()["emailAddress"]
-    recipients = [user_email]
+        # 4️⃣ Recipient is always self
+        user_email = service.users().getProfile(userId="me").execute()["emailAddress"]
+        recipients = [user_email]
 
-    # 5️⃣ Send digest
-    for recipient in recipients:
-        send_email(service, to=recipient, subject="📩 MailSmart Daily Digest", body=digest_text)
+        # 5️⃣ Send digest
+        with span("digest.send"):
+            for recipient in recipients:
+                send_email(service, to=recipient, subject="📩 MailSmart Daily Digest", body=digest_text)
 
+    if progress:
+        progress("auth", **auth_ops)
+        progress("timings", **run.timings())
+        progress("sent", recipients=len(recipients))
     print(f"✅ Digest sent to {len(recipients)} recipient (self).")
+    print(f"⏱️ Run timings: {run.timings()}")
     return summary
@@ -0,0 +1,37 @@
+# app/services/embedding_server.py
+"""
+Single shared embedding process, so uvicorn workers don't each hold a copy
+of the SentenceTransformer model:
+
+    uvicorn app.services.embedding_server:app --port 8100
+    EMBEDDINGS_SERVER_URL=http://127.0.0.1:8100 uvicorn app.main:app --workers 4
+"""
+from contextlib import asynccontextmanager
+from fastapi import Body, FastAPI
+from fastapi.concurrency import run_in_threadpool
+
+from app.services import embeddings
+
+
+@asynccontextmanager
+async def lifespan(app_: FastAPI):
+    await run_in_threadpool(embeddings.encode_local, ["warm-up"])
+    yield
+
+
+app = FastAPI(title="MailSmart Embeddings", lifespan=lifespan)
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "model": embeddings.EMB_MODEL, "loaded": embeddings._model is not None}
+
+
+@app.post("/embed")
+def embed(body: dict = Body(...)):
+    texts = body.get("texts", [])
+    if not texts:
+        return {"dim": 0, "count": 0, "data": ""}
+    # this process always encodes locally, even if the env points at a server
+    mat = embeddings.encode_local(texts, batch_size=body.get("batch_size"))
+    return {"dim": int(mat.shape[1]), "count": int(mat.shape[0]), "data": embeddings.encode_matrix(mat)}
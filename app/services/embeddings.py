@@ -1,20 +1,96 @@
 # app/services/embeddings.py
 import os
+import base64
+import threading
+from typing import List
+import numpy as np
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
+from app.services.telemetry import span
 
 load_dotenv()
 EMB_MODEL = os.getenv("EMB_MODEL", "all-MiniLM-L6-v2")
+EMB_BATCH_SIZE = int(os.getenv("EMB_BATCH_SIZE", 64))
+EMB_DIM = int(os.getenv("EMB_DIM", 384))  # output size of EMB_MODEL (384 for all-MiniLM-L6-v2)
+# e.g. http://127.0.0.1:8100 -> encode in one shared embedding process (see embedding_server.py)
+EMBEDDINGS_SERVER_URL = os.getenv("EMBEDDINGS_SERVER_URL")
+EMBEDDINGS_WARMUP = os.getenv("EMBEDDINGS_WARMUP", "false").lower() in ("1", "true", "yes")
 
-# load model once
-_model = SentenceTransformer(EMB_MODEL)
+# model is loaded on first use, not at import
+_model = None
+_model_lock = threading.Lock()
+_session = None
+
+def _get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                print(f"🧠 Loading embedding model {EMB_MODEL}...")
+                _model = SentenceTransformer(EMB_MODEL)
+    return _model
+
+def _get_session():
+    global _session
+    if _session is None:
+        import requests
+        _session = requests.Session()
+    return _session
+
+def decode_matrix(data: str, dim: int) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).reshape(-1, dim)
+
+def encode_matrix(mat: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(mat, dtype=np.float32).tobytes()).decode("ascii")
+
+def _remote_encode(texts: List[str], batch_size: int) -> np.ndarray:
+    res = _get_session().post(
+        f"{EMBEDDINGS_SERVER_URL.rstrip('/')}/embed",
+        json={"texts": texts, "batch_size": batch_size},
+        timeout=60,
+    )
+    res.raise_for_status()
+    body = res.json()
+    return decode_matrix(body["data"], body["dim"])
+
+def encode_local(texts: List[str], batch_size: int = None) -> np.ndarray:
+    """Encode with the in-process model, ignoring EMBEDDINGS_SERVER_URL."""
+    vecs = _get_model().encode(
+        texts,
+        batch_size=batch_size or EMB_BATCH_SIZE,
+        show_progress_bar=False,
+        convert_to_numpy=True,
+    )
+    return np.asarray(vecs, dtype=np.float32)
+
+def _encode(texts: List[str], batch_size: int = None) -> np.ndarray:
+    with span("embed", mode="remote" if EMBEDDINGS_SERVER_URL else "local"):
+        if EMBEDDINGS_SERVER_URL:
+            return _remote_encode(texts, batch_size or EMB_BATCH_SIZE)
+        return encode_local(texts, batch_size)
+
+def warmup():
+    """Load the model (or reach the embedding server) ahead of the first request."""
+    _encode(["warm-up"])
 
 def get_embedding(text: str):
     # returns list[float]
-    vec = _model.encode(text, show_progress_bar=False)
-    return vec.tolist()
+    return _encode([text])[0].tolist()
+
+def get_embeddings(texts: List[str], batch_size: int = None) -> np.ndarray:
+    """Encode many texts in one call; returns a (len(texts), dim) float32 matrix."""
+    if not texts:
+        # nothing to encode: don't load the model just to learn its width
+        dim = _model.get_sentence_embedding_dimension() if _model is not None and not EMBEDDINGS_SERVER_URL else EMB_DIM
+        return np.zeros((0, dim), dtype=np.float32)
+    return _encode(list(texts), batch_size=batch_size)
+
+def email_to_text(email: dict) -> str:
+    return f"From: {email.get('from','')}\nSubject: {email.get('subject','')}\nSnippet: {email.get('snippet','')}"
 
 def email_to_embedding(email: dict):
     # convert email dict to single text then embedding
-    text = f"From: {email.get('from','')}\nSubject: {email.get('subject','')}\nSnippet: {email.get('snippet','')}"
-    return get_embedding(text)
\ No newline at end of file
+    return get_embedding(email_to_text(email))
+
+def emails_to_embeddings(emails: List[dict], batch_size: int = None) -> np.ndarray:
+    return get_embeddings([email_to_text(e) for e in emails], batch_size=batch_size)
@@ -2,11 +2,20 @@
 import os
 import json
 import base64
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import parseaddr
+from typing import List, Dict, Tuple
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.errors import HttpError
 from fastapi import HTTPException
+from app.services.accounts import token_path_for, DEFAULT_ACCOUNT, DEFAULT_TOKEN_PATH
+from app.services.telemetry import span
 
 # Gmail scopes
 SCOPES = [
@@ -16,91 +25,594 @@ SCOPES = [
 
 # Local paths (for local dev / presentation)
 LOCAL_CLIENT_PATH = "credentials/client_secret.json"
-LOCAL_TOKEN_PATH = "token.json"
+LOCAL_TOKEN_PATH = DEFAULT_TOKEN_PATH
 
+# Fetch tuning
+GMAIL_FETCH_MODE = os.getenv("GMAIL_FETCH_MODE", "batch")  # batch | sequential
+GMAIL_BATCH_SIZE = min(int(os.getenv("GMAIL_BATCH_SIZE", 50)), 100)  # Gmail caps batches at 100 calls
+GMAIL_LIST_PAGE_SIZE = 500  # max page size for messages.list
+METADATA_HEADERS = ["From", "Subject"]
 
-def authenticate_gmail(force_refresh: bool = False, interactive: bool = False):
+# Thread mode: one compacted record per Gmail thread instead of one per message
+GMAIL_THREAD_MODE = os.getenv("GMAIL_THREAD_MODE", "false").lower() in ("1", "true", "yes")
+THREAD_MAX_MESSAGES = int(os.getenv("THREAD_MAX_MESSAGES", 6))  # newest messages kept in a thread record
+THREAD_SNIPPET_CHARS = int(os.getenv("THREAD_SNIPPET_CHARS", 240))  # per message, in the record's snippet
+
+# Incremental sync (historyId based)
+GMAIL_SYNC_MODE = os.getenv("GMAIL_SYNC_MODE", "incremental")  # incremental | full
+SYNC_STATE_PATH = os.getenv("GMAIL_SYNC_STATE_PATH", "data/gmail_sync_state.json")
+SYNC_WINDOW_SECONDS = 24 * 3600
+_SKIP_LABELS = {"DRAFT", "SPAM", "TRASH"}
+_sync_locks = {}  # one lock per state file, so accounts sync in parallel
+_sync_locks_guard = threading.Lock()
+
+# Credential/service cache
+AUTH_REFRESH_MARGIN = int(os.getenv("GMAIL_AUTH_REFRESH_MARGIN", 300))  # refresh this many seconds before expiry
+_creds_cache = {}  # token path -> {"creds", "generation", "mtime"}
+_creds_locks = {}
+_auth_local = threading.local()  # per-thread built services + active run counters
+_auth_stats = {"token_loads": 0, "refreshes": 0, "builds": 0, "cache_hits": 0}
+_auth_stats_lock = threading.Lock()
+
+
+def _count(kind: str):
+    with _auth_stats_lock:
+        _auth_stats[kind] += 1
+        for counts in getattr(_auth_local, "runs", ()):
+            counts[kind] += 1
+
+
+@contextmanager
+def count_auth_ops():
+    """
+    Count auth/build work done by this thread while the block runs:
+
+        with count_auth_ops() as ops:
+            run_pipeline()
+        print(ops)  # {"token_loads": 0, "refreshes": 0, "builds": 0, "cache_hits": 1}
+    """
+    counts = dict.fromkeys(_auth_stats, 0)
+    runs = getattr(_auth_local, "runs", None)
+    if runs is None:
+        runs = _auth_local.runs = []
+    runs.append(counts)
+    try:
+        yield counts
+    finally:
+        runs.remove(counts)
+
+
+def auth_stats() -> Dict:
+    """Process-wide auth/build counters plus how many accounts are cached."""
+    with _auth_stats_lock:
+        return {**_auth_stats, "cached_accounts": len(_creds_cache)}
+
+
+def _token_mtime(token_path: str):
+    try:
+        return os.path.getmtime(token_path)
+    except OSError:
+        return None
+
+
+def _expiring(creds) -> bool:
+    # google-auth keeps expiry as naive UTC
+    if not creds.expiry:
+        return False
+    return creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None) < timedelta(seconds=AUTH_REFRESH_MARGIN)
+
+
+def _save_token(creds, token_path: str):
+    os.makedirs(os.path.dirname(token_path) or ".", exist_ok=True)
+    tmp = f"{token_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(creds.to_json())
+    os.replace(tmp, token_path)
+
+
+def _load_credentials(token_path: str, is_default: bool, account_id: str, force_refresh: bool, interactive: bool):
+    # 1️⃣ Try local token first
+    if os.path.exists(token_path) and not force_refresh:
+        _count("token_loads")
+        return Credentials.from_authorized_user_file(token_path, SCOPES)
+
+    # 2️⃣ If no local token, try Base64 env (default account only)
+    if not is_default and not interactive:
+        raise HTTPException(status_code=500, detail=f"No token found for account {account_id} at {token_path}")
+    token_b64 = os.getenv("GOOGLE_TOKEN_JSON_B64")
+    client_b64 = os.getenv("GOOGLE_CLIENT_SECRET_JSON_B64")
+    if not token_b64 or not client_b64:
+        if interactive or force_refresh:
+            return None
+        raise HTTPException(
+            status_code=500,
+            detail="No local token or Base64 env variables found for Gmail auth"
+        )
+
+    _count("token_loads")
+    token_json = base64.b64decode(token_b64).decode("utf-8")
+    token_dict = json.loads(token_json)
+    return Credentials.from_authorized_user_info(info=token_dict, scopes=SCOPES)
+
+
+def _run_oauth_flow(token_path: str):
+    # Load client secret for OAuth
+    if os.path.exists(LOCAL_CLIENT_PATH):
+        with open(LOCAL_CLIENT_PATH, "r", encoding="utf-8") as f:
+            client_dict = json.load(f)
+    else:
+        client_json = base64.b64decode(os.getenv("GOOGLE_CLIENT_SECRET_JSON_B64")).decode("utf-8")
+        client_dict = json.loads(client_json)
+
+    flow = InstalledAppFlow.from_client_config(client_dict, SCOPES)
+    creds = flow.run_local_server(port=0)  # <-- opens browser
+
+    # Save token for future use
+    _save_token(creds, token_path)
+    return creds
+
+
+def _creds_lock_for(token_path: str) -> threading.Lock:
+    with _auth_stats_lock:
+        return _creds_locks.setdefault(token_path, threading.Lock())
+
+
+def _get_credentials(account_id: str, force_refresh: bool, interactive: bool):
+    """
+    Cached credentials for one account, refreshed AUTH_REFRESH_MARGIN seconds
+    before they expire. Returns (creds, generation); the generation changes
+    whenever the credentials object is replaced, so built services get rebuilt.
+    """
+    token_path = token_path_for(account_id)
+    is_default = not account_id or account_id == DEFAULT_ACCOUNT
+    with _creds_lock_for(token_path):
+        entry = _creds_cache.get(token_path)
+        mtime = _token_mtime(token_path)
+        if entry and not (force_refresh or interactive) and entry["mtime"] == mtime:
+            creds = entry["creds"]
+        else:
+            creds = _load_credentials(token_path, is_default, account_id, force_refresh, interactive)
+            entry = None
+
+        # 3️⃣ Refresh before expiry instead of failing mid-run
+        if creds is not None and not (interactive or force_refresh) and creds.refresh_token and (
+            _expiring(creds) or not creds.valid
+        ):
+            _count("refreshes")
+            creds.refresh(Request())
+            if os.path.exists(token_path):
+                _save_token(creds, token_path)
+                mtime = _token_mtime(token_path)
+
+        # 4️⃣ If interactive requested or force_refresh, run OAuth flow
+        if creds is None or interactive or force_refresh or not creds.valid:
+            creds = _run_oauth_flow(token_path)
+            mtime = _token_mtime(token_path)
+            entry = None
+
+        if entry is None:
+            entry = {"creds": creds, "generation": (_creds_cache.get(token_path) or {}).get("generation", 0) + 1}
+        else:
+            _count("cache_hits")
+        entry["mtime"] = mtime
+        _creds_cache[token_path] = entry
+        return token_path, entry["creds"], entry["generation"]
+
+
+def authenticate_gmail(force_refresh: bool = False, interactive: bool = False, account_id: str = None):
     """
     Authenticate Gmail API:
     - Local JSON files take priority (for local testing / presentation)
     - Falls back to Base64 env variables (for headless deployment)
     - If interactive=True, opens browser OAuth to change account
+    - account_id selects a per-account token (see accounts.py); None = default
+
+    Credentials are cached per account and the service is built once per
+    thread from the bundled discovery document (httplib2 connections are
+    not thread-safe, so threads don't share one).
     """
     try:
-        creds = None
+        token_path, creds, generation = _get_credentials(account_id, force_refresh, interactive)
 
-        # 1️⃣ Try local token first
-        if os.path.exists(LOCAL_TOKEN_PATH) and not force_refresh:
-            creds = Credentials.from_authorized_user_file(LOCAL_TOKEN_PATH, SCOPES)
-
-        # 2️⃣ If no local token, try Base64 env
-        else:
-            token_b64 = os.getenv("GOOGLE_TOKEN_JSON_B64")
-            client_b64 = os.getenv("GOOGLE_CLIENT_SECRET_JSON_B64")
-            if not token_b64 or not client_b64:
-                raise HTTPException(
-                    status_code=500,
-                    detail="No local token or Base64 env variables found for Gmail auth"
-                )
-
-            token_json = base64.b64decode(token_b64).decode("utf-8")
-            token_dict = json.loads(token_json)
-
-            creds = Credentials.from_authorized_user_info(info=token_dict, scopes=SCOPES)
-
-        # 3️⃣ If interactive requested or force_refresh, run OAuth flow
-        if interactive or force_refresh or not creds.valid:
-            # Load client secret for OAuth
-            if os.path.exists(LOCAL_CLIENT_PATH):
-                with open(LOCAL_CLIENT_PATH, "r", encoding="utf-8") as f:
-                    client_dict = json.load(f)
-            else:
-                client_json = base64.b64decode(os.getenv("GOOGLE_CLIENT_SECRET_JSON_B64")).decode("utf-8")
-                client_dict = json.loads(client_json)
-
-            flow = InstalledAppFlow.from_client_config(client_dict, SCOPES)
-            creds = flow.run_local_server(port=0)  # <-- opens browser
-
-            # Save token for future use
-            with open(LOCAL_TOKEN_PATH, "w", encoding="utf-8") as f:
-                f.write(creds.to_json())
-
-        # 4️⃣ Refresh if expired
-        if creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+        services = getattr(_auth_local, "services", None)
+        if services is None:
+            services = _auth_local.services = {}
+        cached = services.get(token_path)
+        if cached and cached[0] == generation:
+            return cached[1]
 
-        # Build Gmail service
-        service = build("gmail", "v1", credentials=creds)
+        # Build Gmail service (static discovery: no discovery-doc fetch)
+        _count("builds")
+        service = build("gmail", "v1", credentials=creds, static_discovery=True, cache_discovery=False)
+        services[token_path] = (generation, service)
         return service
 
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Gmail authentication failed: {str(e)}")
 
 
-def get_emails_from_last_24_hours(max_results: int = 20, debug: bool = False):
+def _list_messages(service, query: str, max_results: int) -> List[Dict]:
+    """
+    List message refs ({"id", "threadId"}) matching query, following
+    nextPageToken until max_results are collected or the mailbox runs out.
+    """
+    refs = []
+    page_token = None
+    with span("gmail.list"):
+        while len(refs) < max_results:
+            params = {"userId": "me", "q": query, "maxResults": min(max_results - len(refs), GMAIL_LIST_PAGE_SIZE)}
+            if page_token:
+                params["pageToken"] = page_token
+            results = service.users().messages().list(**params).execute()
+            refs.extend(results.get("messages", []))
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                break
+    return refs[:max_results]
+
+
+def _list_message_ids(service, query: str, max_results: int) -> List[str]:
+    return [m["id"] for m in _list_messages(service, query, max_results)]
+
+
+def _metadata_request(service, msg_id: str):
+    # only the headers the pipeline reads -> much smaller responses than format=full
+    return service.users().messages().get(
+        userId="me", id=msg_id, format="metadata", metadataHeaders=METADATA_HEADERS
+    )
+
+
+def _parse_message(msg_detail: Dict) -> Dict:
+    headers = msg_detail.get("payload", {}).get("headers", [])
+    subject = next((h["value"] for h in headers if h["name"] == "Subject"), "No Subject")
+    sender = next((h["value"] for h in headers if h["name"] == "From"), "Unknown Sender")
+    snippet = msg_detail.get("snippet", "")
+    internal_date = msg_detail.get("internalDate")
+    date = int(internal_date) // 1000 if internal_date else None  # epoch seconds, for search filters
+    return {"from": sender, "subject": subject, "snippet": snippet, "id": msg_detail.get("id"), "date": date}
+
+
+def _thread_request(service, thread_id: str):
+    # all messages of the thread in one call, headers only
+    return service.users().threads().get(
+        userId="me", id=thread_id, format="metadata", metadataHeaders=METADATA_HEADERS
+    )
+
+
+def _gone(e: Exception) -> bool:
+    # 404: the message/thread was deleted since it was listed; retrying won't help
+    return isinstance(e, HttpError) and getattr(e.resp, "status", None) == 404
+
+
+def _fetch_details_sequential(service, ids: List[str], make_request=_metadata_request,
+                              failed: List[str] = None) -> List[Dict]:
+    details = []
+    for msg_id in ids:
+        try:
+            details.append(make_request(service, msg_id).execute())
+        except Exception as e:
+            if failed is not None and not _gone(e):
+                failed.append(msg_id)
+    return details
+
+
+def _fetch_details_batched(service, ids: List[str], make_request=_metadata_request,
+                           failed: List[str] = None) -> List[Dict]:
+    """
+    Fetch message metadata (or threads, via make_request) in Gmail batch
+    requests: one HTTP round trip per GMAIL_BATCH_SIZE calls. Output keeps
+    the order of ids; failed sub-requests are skipped, same as the sequential
+    path, and their ids appended to `failed` (unless they no longer exist).
+    """
+    details, errors = {}, {}
+
+    def _on_response(request_id, response, exception):
+        if exception is None and response:
+            details[request_id] = response
+        elif exception is not None:
+            errors[request_id] = exception
+
+    for start in range(0, len(ids), GMAIL_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=_on_response)
+        for msg_id in ids[start:start + GMAIL_BATCH_SIZE]:
+            batch.add(make_request(service, msg_id), request_id=msg_id)
+        try:
+            batch.execute()
+        except Exception as e:
+            print("⚠️ Gmail batch request failed:", e)
+            for msg_id in ids[start:start + GMAIL_BATCH_SIZE]:
+                errors.setdefault(msg_id, e)
+
+    if failed is not None:
+        failed.extend(i for i in ids if i in errors and i not in details and not _gone(errors[i]))
+    return [details[msg_id] for msg_id in ids if msg_id in details]
+
+
+def _fetch_details(service, ids: List[str], mode: str = None, failed: List[str] = None) -> List[Dict]:
+    mode = mode or GMAIL_FETCH_MODE
+    with span("gmail.get", mode=mode):
+        if mode == "sequential":
+            return _fetch_details_sequential(service, ids, failed=failed)
+        return _fetch_details_batched(service, ids, failed=failed)
+
+
+def fetch_messages(service, ids: List[str], mode: str = None) -> List[Dict]:
+    """Fetch metadata for the given message IDs using the configured fetch mode."""
+    return [_parse_message(d) for d in _fetch_details(service, ids, mode=mode)]
+
+
+def _fetch_threads(service, thread_ids: List[str], mode: str = None, failed: List[str] = None) -> List[Dict]:
+    mode = mode or GMAIL_FETCH_MODE
+    with span("gmail.threads", mode=mode):
+        if mode == "sequential":
+            return _fetch_details_sequential(service, thread_ids, _thread_request, failed=failed)
+        return _fetch_details_batched(service, thread_ids, _thread_request, failed=failed)
+
+
+def _parse_thread(thread: Dict) -> Dict:
+    """
+    One email-shaped record for a whole thread, or None if nothing is left
+    after dropping drafts/spam/trash: the thread's subject, the newest
+    message's sender and date, and a snippet listing the newest
+    THREAD_MAX_MESSAGES messages as "Sender: text" lines.
+    """
+    messages = [m for m in thread.get("messages", []) if not _SKIP_LABELS.intersection(m.get("labelIds", []))]
+    if not messages:
+        return None
+    parsed = [_parse_message(m) for m in messages]
+    lines, previous = [], None
+    for m in parsed[-THREAD_MAX_MESSAGES:]:
+        text = " ".join(str(m["snippet"] or "").split())[:THREAD_SNIPPET_CHARS]
+        if text and text != previous:  # forwards and re-sends repeat the same text
+            lines.append(f"{parseaddr(m['from'])[0] or m['from']}: {text}")
+        previous = text
+    earlier = len(parsed) - THREAD_MAX_MESSAGES
+    if earlier > 0:
+        lines.insert(0, f"(+{earlier} earlier messages)")
+    latest = parsed[-1]
+    return {
+        "from": latest["from"],
+        "subject": parsed[0]["subject"],
+        "snippet": "\n".join(lines),
+        "id": thread.get("id"),
+        "date": max((m["date"] or 0) for m in parsed) or None,
+        "thread_id": thread.get("id"),
+        "messages": len(parsed),
+        "message_ids": [m["id"] for m in parsed],
+    }
+
+
+def _group_by_thread(refs: List[Dict]) -> List[str]:
+    """Thread IDs of listed messages, newest thread first, each once."""
+    return list(dict.fromkeys(r.get("threadId") or r["id"] for r in refs))
+
+
+def fetch_threads(service, thread_ids: List[str], mode: str = None) -> List[Dict]:
+    """One threads.get per thread (batched like messages); returns thread records."""
+    records = (_parse_thread(t) for t in _fetch_threads(service, thread_ids, mode=mode))
+    return [r for r in records if r]
+
+
+def get_emails_from_last_24_hours(max_results: int = 20, debug: bool = False, service=None, mode: str = None,
+                                  account_id: str = None, threads: bool = None):
     """
     Fetch emails from the last 24 hours using Gmail API.
+    - mode="batch" (default) groups metadata gets into Gmail batch requests
+    - mode="sequential" issues one get per message
+    - threads=True (GMAIL_THREAD_MODE) groups the listed messages by thread
+      and returns one record per thread, fetched with one threads.get each
     """
-    service = authenticate_gmail()
+    if service is None:
+        service = authenticate_gmail(account_id=account_id)
+    threads = GMAIL_THREAD_MODE if threads is None else threads
     query = "newer_than:1d in:all"
     try:
-        results = service.users().messages().list(userId="me", q=query, maxResults=max_results).execute()
-        messages = results.get("messages", [])
+        refs = _list_messages(service, query, max_results)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gmail API list error: {e}")
 
-    email_data = []
-    for m in messages:
-        try:
-            msg_detail = service.users().messages().get(userId="me", id=m["id"]).execute()
-            headers = msg_detail.get("payload", {}).get("headers", [])
-            subject = next((h["value"] for h in headers if h["name"] == "Subject"), "No Subject")
-            sender = next((h["value"] for h in headers if h["name"] == "From"), "Unknown Sender")
-            snippet = msg_detail.get("snippet", "")
-            email_data.append({"from": sender, "subject": subject, "snippet": snippet, "id": m["id"]})
-        except Exception:
-            continue
+    if threads:
+        email_data = fetch_threads(service, _group_by_thread(refs), mode=mode)
+    else:
+        email_data = fetch_messages(service, [r["id"] for r in refs], mode=mode)
 
     if debug:
         print(f"Fetched {len(email_data)} emails from Gmail")
     return email_data
+
+
+# === Incremental sync ===
+def sync_state_path(account_id: str = None) -> str:
+    if not account_id or account_id == DEFAULT_ACCOUNT:
+        return SYNC_STATE_PATH
+    root, ext = os.path.splitext(SYNC_STATE_PATH)
+    return f"{root}_{account_id}{ext}"
+
+
+def load_sync_state(path: str = None) -> Dict:
+    path = path or SYNC_STATE_PATH
+    if not os.path.exists(path):
+        return {"history_id": None, "messages": {}}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        state.setdefault("history_id", None)
+        state.setdefault("messages", {})
+        return state
+    except Exception:
+        return {"history_id": None, "messages": {}}
+
+
+def save_sync_state(state: Dict, path: str = None):
+    path = path or SYNC_STATE_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _history_expired(e: Exception) -> bool:
+    # Gmail answers 404 when startHistoryId is older than the retained history
+    return isinstance(e, HttpError) and getattr(e.resp, "status", None) == 404
+
+
+def _list_history_changes(service, start_history_id: str) -> Tuple[List[Dict], List[str], str]:
+    """
+    Page through users.history.list from start_history_id.
+    Returns (added message refs {"id", "threadId"}, deleted_ids, latest_history_id).
+    """
+    added, deleted = [], []
+    latest = start_history_id
+    page_token = None
+    while True:
+        params = {
+            "userId": "me",
+            "startHistoryId": start_history_id,
+            "historyTypes": ["messageAdded", "messageDeleted"],
+        }
+        if page_token:
+            params["pageToken"] = page_token
+        with span("gmail.history"):
+            results = service.users().history().list(**params).execute()
+        for record in results.get("history", []):
+            for item in record.get("messagesAdded", []):
+                msg = item.get("message", {})
+                if not _SKIP_LABELS.intersection(msg.get("labelIds", [])):
+                    added.append({"id": msg["id"], "threadId": msg.get("threadId")})
+            for item in record.get("messagesDeleted", []):
+                deleted.append(item.get("message", {}).get("id"))
+        latest = results.get("historyId", latest)
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            break
+    return added, deleted, latest
+
+
+def _sync_messages(service, known: Dict, new_ids: List[str], max_results: int,
+                   failed: List[str]) -> Tuple[List[Dict], List[Dict]]:
+    new_emails = []
+    for detail in _fetch_details(service, new_ids, failed=failed):
+        email = _parse_message(detail)
+        known[email["id"]] = {**email, "internal_date": int(detail.get("internalDate", 0) or time.time() * 1000)}
+        new_emails.append(email)
+
+    # drop messages that fell out of the window
+    cutoff_ms = (time.time() - SYNC_WINDOW_SECONDS) * 1000
+    for msg_id in [i for i, m in known.items() if m["internal_date"] < cutoff_ms]:
+        del known[msg_id]
+
+    window = sorted(known.values(), key=lambda m: m["internal_date"], reverse=True)[:max_results]
+    window_emails = [
+        {**{k: m[k] for k in ("from", "subject", "snippet", "id")}, "date": m["internal_date"] // 1000}
+        for m in window
+    ]
+    window_ids = {e["id"] for e in window_emails}
+    return window_emails, [e for e in new_emails if e["id"] in window_ids]
+
+
+def _sync_threads(service, state: Dict, new_refs: List[Dict], stale_threads: List[str],
+                  max_results: int, failed: List[str]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Thread-mode sync: every thread touched by an added or deleted message is
+    re-fetched with one threads.get and its record replaced; known messages
+    map to their thread so later deletions find it. A thread whose fetch
+    failed keeps its old record and goes to `failed`.
+    """
+    known = state["messages"]
+    records = state.setdefault("threads", {})
+    touched = list(dict.fromkeys([r.get("threadId") or r["id"] for r in new_refs] + [t for t in stale_threads if t]))
+    fetched = _fetch_threads(service, touched, failed=failed)
+    for thread_id in set(touched).difference(failed):
+        for msg_id in records.pop(thread_id, {}).get("message_ids", []):
+            known.pop(msg_id, None)
+    new_emails = []
+    for record in filter(None, map(_parse_thread, fetched)):
+        records[record["thread_id"]] = record
+        for msg_id in record["message_ids"]:
+            known[msg_id] = {"thread_id": record["thread_id"]}
+        new_emails.append(record)
+
+    # drop threads whose newest message fell out of the window
+    cutoff = time.time() - SYNC_WINDOW_SECONDS
+    for thread_id in [t for t, r in records.items() if (r.get("date") or 0) < cutoff]:
+        for msg_id in records.pop(thread_id).get("message_ids", []):
+            known.pop(msg_id, None)
+
+    window = sorted(records.values(), key=lambda r: r.get("date") or 0, reverse=True)[:max_results]
+    window_ids = {r["id"] for r in window}
+    return window, [r for r in new_emails if r["id"] in window_ids]
+
+
+def sync_mailbox(max_results: int = 20, service=None, state_path: str = None, debug: bool = False,
+                 account_id: str = None, threads: bool = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Incrementally sync the last-24h window into the local message-state store.
+    - First run (or expired history): full resync of `newer_than:1d`, fetching
+      only IDs not already in the store
+    - Later runs: pull deltas through users.history.list from the saved historyId
+    Returns (window_emails, new_emails): the newest max_results emails of the
+    window, and those among them that were fetched for the first time.
+    threads=True (GMAIL_THREAD_MODE) returns thread records instead (see
+    get_emails_from_last_24_hours); a changed thread counts as new.
+    Messages/threads whose fetch failed are kept in state["pending"] and
+    retried on the next run, since history_id moves past them.
+    """
+    threads = GMAIL_THREAD_MODE if threads is None else threads
+    unit = "threads" if threads else "messages"
+    state_path = state_path or sync_state_path(account_id)
+    with _sync_locks_guard:
+        lock = _sync_locks.setdefault(state_path, threading.Lock())
+    with lock:
+        if service is None:
+            service = authenticate_gmail(account_id=account_id)
+        state = load_sync_state(state_path)
+        if state.get("unit", "messages") != unit:
+            state = {"history_id": None, "messages": {}}  # the stores don't mix; resync in the new mode
+        state["unit"] = unit
+        known = state["messages"]
+        pending = state.get("pending", [])
+
+        new_refs, stale_threads = None, []
+        if state.get("history_id"):
+            try:
+                added, deleted, history_id = _list_history_changes(service, state["history_id"])
+                for msg_id in deleted:
+                    stale_threads.append((known.pop(msg_id, None) or {}).get("thread_id"))
+                pending = [r for r in pending if r["id"] not in deleted]
+                added = {r["id"]: r for r in added}
+                new_refs = [r for i, r in added.items() if i not in known]
+            except Exception as e:
+                if not _history_expired(e):
+                    raise HTTPException(status_code=500, detail=f"Gmail API history error: {e}")
+                print("⚠️ Gmail history expired, running full resync")
+
+        if new_refs is None:
+            # read historyId before listing so nothing added in between is missed
+            history_id = service.users().getProfile(userId="me").execute()["historyId"]
+            try:
+                listed = _list_messages(service, "newer_than:1d in:all", max_results)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Gmail API list error: {e}")
+            new_refs = [r for r in listed if r["id"] not in known]
+
+        listed_ids = {r["id"] for r in new_refs}
+        # a pending thread's id is one of its (known) message ids, so only messages are filtered by known
+        new_refs += [r for r in pending if r["id"] not in listed_ids and (threads or r["id"] not in known)]
+        failed = []
+        if threads:
+            window_emails, new_emails = _sync_threads(service, state, new_refs, stale_threads, max_results, failed)
+            state["pending"] = [{"id": t, "threadId": t} for t in failed]
+        else:
+            window_emails, new_emails = _sync_messages(service, known, [r["id"] for r in new_refs], max_results, failed)
+            refs = {r["id"]: r for r in new_refs}
+            state["pending"] = [refs[i] for i in failed]
+        if failed:
+            print(f"⚠️ {len(failed)} Gmail {unit} failed to fetch; retrying them next sync")
+
+        state["history_id"] = history_id
+        save_sync_state(state, state_path)
+
+    if debug:
+        print(f"Synced {len(new_emails)} new / {len(window_emails)} emails in window")
+    return window_emails, new_emails
@@ -0,0 +1,181 @@
+# app/services/history_store.py
+"""
+Indexed store of digest runs, so dashboard/history pages don't scan LOG_DIR.
+
+Migrate existing JSON logs explicitly with:
+
+    python -m app.services.history_store --log-dir logs
+
+(the first open of an empty store also imports them once).
+"""
+import os
+import json
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "data/history.sqlite3")
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+TS_FORMAT = "%Y%m%d_%H%M%S"
+
+
+def ts_to_epoch(ts: str) -> float:
+    try:
+        return datetime.strptime(ts, TS_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class HistoryStore:
+    def __init__(self, path: str = None):
+        path = path or HISTORY_DB_PATH
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, run_time TEXT NOT NULL, created_at REAL NOT NULL, "
+            "count INTEGER NOT NULL, summary TEXT NOT NULL, extra TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_summaries_created ON summaries(created_at)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+        self._latest = None
+        self._latest_loaded = False
+        self._data_version = None
+
+    @staticmethod
+    def _row_to_record(row) -> Dict:
+        run_time, count, summary, extra = row
+        record = {"time": run_time, "run_time": run_time, "count": count, "summary": json.loads(summary)}
+        if extra:
+            record.update(json.loads(extra))
+        return record
+
+    def add(self, run_time: str, summary: Dict, count: int, extra: Dict = None, created_at: float = None) -> int:
+        created_at = created_at if created_at is not None else ts_to_epoch(run_time)
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO summaries (run_time, created_at, count, summary, extra) VALUES (?, ?, ?, ?, ?)",
+                (run_time, created_at, count, json.dumps(summary), json.dumps(extra) if extra else None),
+            )
+            self._db.commit()
+            # only replace the cached latest if this run is actually newer
+            if self._latest_loaded and (self._latest is None or created_at >= self._latest[0]):
+                record = {"time": run_time, "run_time": run_time, "count": count, "summary": summary, **(extra or {})}
+                self._latest = (created_at, record)
+            return cur.lastrowid
+
+    def _changed_elsewhere(self) -> bool:
+        # data_version moves when another connection (worker, CLI import) commits
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        changed, self._data_version = version != self._data_version, version
+        return changed
+
+    def latest(self) -> Optional[Dict]:
+        """Newest run; served from memory until another connection writes to the store."""
+        with self._lock:
+            if self._changed_elsewhere() or not self._latest_loaded:
+                row = self._db.execute(
+                    "SELECT created_at, run_time, count, summary, extra FROM summaries ORDER BY created_at DESC, id DESC LIMIT 1"
+                ).fetchone()
+                self._latest = (row[0], self._row_to_record(row[1:])) if row else None
+                self._latest_loaded = True
+            return self._latest[1] if self._latest else None
+
+    def _range_clause(self, start: float = None, end: float = None):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("created_at >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("created_at < ?")
+            params.append(end)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def list(self, limit: int = 20, offset: int = 0, start: float = None, end: float = None) -> List[Dict]:
+        """Runs newest first; start/end are epoch seconds (end exclusive)."""
+        where, params = self._range_clause(start, end)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT run_time, count, summary, extra FROM summaries{where} "
+                "ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        return [self._row_to_record(r) for r in rows]
+
+    def count(self, start: float = None, end: float = None) -> int:
+        where, params = self._range_clause(start, end)
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM summaries{where}", params).fetchone()[0]
+
+    def import_json_logs(self, log_dir: str = None) -> int:
+        """Import summary_*.json files from LOG_DIR, skipping (run_time, account) runs already stored."""
+        log_dir = log_dir or LOG_DIR
+        if not os.path.isdir(log_dir):
+            return 0
+        with self._lock:
+            known = set(self._db.execute("SELECT run_time, json_extract(extra, '$.account') FROM summaries"))
+        imported = 0
+        for fname in sorted(os.listdir(log_dir)):
+            if not (fname.startswith("summary_") and fname.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(log_dir, fname), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception:
+                continue
+            run_time = data.get("time") or fname.replace("summary_", "").replace(".json", "")
+            key = (run_time, data.get("account"))
+            if key in known:
+                continue
+            extra = {k: v for k, v in data.items() if k not in ("time", "summary", "count")}
+            self.add(run_time, data.get("summary", {}), data.get("count", 0), extra=extra or None)
+            known.add(key)
+            imported += 1
+        return imported
+
+    def migrate_once(self, log_dir: str = None) -> int:
+        """Run the JSON import the first time this store is opened."""
+        with self._lock:
+            done = self._db.execute("SELECT value FROM meta WHERE key = 'json_logs_imported'").fetchone()
+        if done:
+            return 0
+        imported = self.import_json_logs(log_dir)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_logs_imported', '1')")
+            self._db.commit()
+        if imported:
+            print(f"📦 Imported {imported} summary logs into the history store")
+        return imported
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+            try:
+                _store.migrate_once()
+            except Exception as e:
+                print("⚠️ Summary log import failed:", e)
+        return _store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import JSON summary logs into the history store")
+    parser.add_argument("--log-dir", default=LOG_DIR)
+    parser.add_argument("--db", default=HISTORY_DB_PATH)
+    args = parser.parse_args()
+    n = HistoryStore(args.db).import_json_logs(args.log_dir)
+    print(f"Imported {n} summaries from {args.log_dir} into {args.db}")
@@ -0,0 +1,149 @@
+# app/services/jobs.py
+"""
+Background jobs for long pipeline runs (digest, summarize, raw fetch).
+Submitting returns immediately; clients poll the job or stream its progress
+events. A submit with the same key as an in-flight job returns that job;
+the default key is the kind plus the job's parameters.
+"""
+import os
+import time
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", 100))  # finished jobs kept in memory
+
+
+class Job:
+    def __init__(self, kind: str, key: str = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = "queued"  # queued | running | succeeded | failed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {}
+        self.events: List[Dict] = []
+        self.result = None
+        self.error = None
+        self._cond = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def emit(self, stage: str, **data):
+        """Progress callback handed to the pipeline: emit("embedded", count=12)."""
+        event = {"stage": stage, "time": time.time(), **data}
+        with self._cond:
+            self.progress[stage] = data
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def _set_status(self, status: str, **fields):
+        with self._cond:
+            self.status = status
+            for k, v in fields.items():
+                setattr(self, k, v)
+            self.events.append({"stage": status, "time": time.time()})
+            self._cond.notify_all()
+
+    def wait_events(self, after: int, timeout: float = 15.0) -> List[Dict]:
+        """Events with index >= after; blocks up to timeout if there are none yet."""
+        with self._cond:
+            if len(self.events) <= after and not self.done:
+                self._cond.wait(timeout)
+            return self.events[after:]
+
+    def to_dict(self, include_result: bool = True) -> Dict:
+        out = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": self.progress,
+        }
+        if self.error:
+            out["error"] = self.error
+        if include_result and self.status == "succeeded":
+            out["result"] = self.result
+        return out
+
+
+def job_key(kind: str, **params) -> str:
+    """kind plus its non-None parameters in a fixed order: digest:max_results=20&profile=False"""
+    parts = [f"{k}={params[k]}" for k in sorted(params) if params[k] is not None]
+    return f"{kind}:{'&'.join(parts)}" if parts else kind
+
+
+class JobManager:
+    def __init__(self, max_workers: int = JOB_WORKERS, retention: int = JOB_RETENTION):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mailsmart-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._inflight: Dict[str, Job] = {}
+        self._retention = retention
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, func: Callable, key: str = None, **kwargs) -> Job:
+        """
+        Run func(progress=job.emit, **kwargs) in the background.
+        Duplicate submits (same key) while a job is queued/running collapse into it;
+        runs with different parameters (max_results, account, profile) do not.
+        """
+        key = key or job_key(kind, **kwargs)
+        with self._lock:
+            current = self._inflight.get(key)
+            if current is not None and not current.done:
+                return current
+            job = Job(kind, key)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            self._trim()
+        self._pool.submit(self._run, job, func, kwargs)
+        return job
+
+    def _run(self, job: Job, func: Callable, kwargs: Dict):
+        job._set_status("running", started_at=time.time())
+        try:
+            result = func(progress=job.emit, **kwargs)
+            job._set_status("succeeded", result=result, finished_at=time.time())
+        except Exception as e:
+            traceback.print_exc()
+            detail = getattr(e, "detail", None) or str(e)
+            job._set_status("failed", error=detail, finished_at=time.time())
+        finally:
+            with self._lock:
+                if self._inflight.get(job.key) is job:
+                    del self._inflight[job.key]
+
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if j.done]
+        for job in finished[:max(0, len(finished) - self._retention)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
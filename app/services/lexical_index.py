@@ -0,0 +1,258 @@
+# app/services/lexical_index.py
+"""
+BM25 inverted index over the same from/subject/snippet text the vector store
+embeds. It catches what dense search ranks poorly: sender addresses, order
+numbers, OTP codes. Postings live in memory; documents are persisted in a
+small SQLite table and the postings are rebuilt from it on start.
+
+Sender and date filters are answered from the index itself (a sender ->
+docs map and a date-sorted list), so only matching documents get scored.
+"""
+import os
+import re
+import json
+import math
+import bisect
+import heapq
+import sqlite3
+import threading
+from functools import lru_cache
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Set
+
+from app.services.accounts import DEFAULT_ACCOUNT
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "data/lexical_index.sqlite3")
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+
+_TOKEN_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+|\w+")
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str, split_addresses: bool = True) -> List[str]:
+    """
+    Lowercased words; an email address is kept whole and (for documents) also
+    split into its parts, so "bank" finds alerts@bank.example but a query for
+    the address only matches the address.
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        tokens.append(token)
+        if split_addresses and "@" in token:
+            tokens.extend(_WORD_RE.findall(token))
+    return tokens
+
+
+@lru_cache(maxsize=8192)  # a mailbox has few distinct senders; parseaddr is slow
+def normalize_sender(value: str) -> str:
+    """'Bank <Alerts@Bank.example>' -> 'alerts@bank.example'."""
+    address = parseaddr(value or "")[1]
+    return (address or value or "").strip().lower()
+
+
+def looks_lexical(query: str) -> bool:
+    """
+    Queries that are identifiers rather than meaning: an email address,
+    a "quoted phrase", or a code/order number (4+ chars with a digit).
+    These are answered from the inverted index alone.
+    """
+    q = (query or "").strip()
+    if len(q) > 1 and q[0] == q[-1] == '"':
+        return True
+    for token in q.split():
+        if "@" in token or (len(token) >= 4 and any(c.isdigit() for c in token)):
+            return True
+    return False
+
+
+class LexicalIndex:
+    def __init__(self, path: str = None):
+        self.path = path or LEXICAL_INDEX_PATH
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "id TEXT PRIMARY KEY, content_hash TEXT, sender TEXT, date INTEGER, terms TEXT, payload TEXT, account TEXT)"
+        )
+        if "account" not in {row[1] for row in self._db.execute("PRAGMA table_info(docs)")}:
+            self._db.execute("ALTER TABLE docs ADD COLUMN account TEXT")  # indexes from before accounts: default mailbox
+        self._db.commit()
+
+        self._doc_of: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._terms: List[Optional[Dict[str, int]]] = []
+        self._lengths: List[int] = []
+        self._hashes: Dict[str, str] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._by_sender: Dict[str, Set[int]] = {}
+        self._senders: List[str] = []
+        self._by_account: Dict[str, Set[int]] = {}
+        self._accounts: List[str] = []
+        self._dates: List[tuple] = []  # (date, doc) sorted by date, rebuilt lazily after writes
+        self._dates_stale = False
+        self._doc_dates: List[Optional[int]] = []
+        self._free: List[int] = []
+        self._total_length = 0
+        for pid, h, sender, date, terms, account in self._db.execute(
+            "SELECT id, content_hash, sender, date, terms, account FROM docs"
+        ):
+            self._add(pid, h, sender, date, json.loads(terms), account)
+
+    @property
+    def count(self) -> int:
+        return len(self._doc_of)
+
+    # --- in-memory structures ---
+    def _add(self, pid: str, content_hash: str, sender: str, date: Optional[int], terms: Dict[str, int],
+             account: str = None):
+        account = account or DEFAULT_ACCOUNT
+        doc = self._free.pop() if self._free else len(self._ids)
+        if doc == len(self._ids):
+            self._ids.append(None)
+            self._terms.append(None)
+            self._lengths.append(0)
+            self._senders.append("")
+            self._accounts.append("")
+            self._doc_dates.append(None)
+        length = sum(terms.values())
+        self._doc_of[pid] = doc
+        self._ids[doc] = pid
+        self._terms[doc] = terms
+        self._lengths[doc] = length
+        self._senders[doc] = sender
+        self._accounts[doc] = account
+        self._doc_dates[doc] = date
+        self._hashes[pid] = content_hash
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc] = tf
+        self._by_sender.setdefault(sender, set()).add(doc)
+        self._by_account.setdefault(account, set()).add(doc)
+        self._dates_stale = True
+
+    def _remove(self, pid: str):
+        doc = self._doc_of.pop(pid, None)
+        if doc is None:
+            return
+        for term in self._terms[doc]:
+            posting = self._postings[term]
+            posting.pop(doc, None)
+            if not posting:
+                del self._postings[term]
+        docs = self._by_sender.get(self._senders[doc])
+        if docs is not None:
+            docs.discard(doc)
+            if not docs:
+                del self._by_sender[self._senders[doc]]
+        docs = self._by_account.get(self._accounts[doc])
+        if docs is not None:
+            docs.discard(doc)
+            if not docs:
+                del self._by_account[self._accounts[doc]]
+        self._dates_stale = True
+        self._total_length -= self._lengths[doc]
+        self._hashes.pop(pid, None)
+        self._ids[doc] = self._terms[doc] = None
+        self._free.append(doc)
+
+    # --- writes ---
+    def upsert(self, docs: List[Dict]):
+        """docs: {"id", "text", "content_hash", "sender", "date", "account", "payload"}; known ids are replaced."""
+        if not docs:
+            return
+        rows = []
+        with self._lock:
+            for d in docs:
+                terms: Dict[str, int] = {}
+                for token in tokenize(d["text"]):
+                    terms[token] = terms.get(token, 0) + 1
+                sender = normalize_sender(d.get("sender"))
+                date = d.get("date")
+                account = d.get("account") or DEFAULT_ACCOUNT
+                self._remove(d["id"])
+                self._add(d["id"], d.get("content_hash"), sender, date, terms, account)
+                rows.append((d["id"], d.get("content_hash"), sender, date, json.dumps(terms), json.dumps(d.get("payload") or {}), account))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO docs (id, content_hash, sender, date, terms, payload, account) VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            for pid in ids:
+                self._remove(pid)
+            self._db.executemany("DELETE FROM docs WHERE id = ?", [(pid,) for pid in ids])
+            self._db.commit()
+
+    # --- reads ---
+    def get_hashes(self, ids: List[str]) -> Dict[str, str]:
+        with self._lock:
+            return {pid: self._hashes[pid] for pid in ids if pid in self._hashes}
+
+    def _allowed(self, sender: str = None, after: int = None, before: int = None, account: str = None) -> Optional[Set[int]]:
+        """Docs passing the filters (None = no filter). after is inclusive, before exclusive."""
+        allowed = None
+        if account:
+            docs = self._by_account.get(account, set())
+            if len(docs) < self.count:  # a single-mailbox index needs no account filter
+                allowed = set(docs)
+        if sender:
+            by_sender = self._by_sender.get(normalize_sender(sender), set())
+            allowed = set(by_sender) if allowed is None else allowed & by_sender
+        if after is not None or before is not None:
+            if self._dates_stale:
+                self._dates = sorted(
+                    (date, doc) for doc, date in enumerate(self._doc_dates)
+                    if date is not None and self._ids[doc] is not None
+                )
+                self._dates_stale = False
+            lo = bisect.bisect_left(self._dates, (after, -1)) if after is not None else 0
+            hi = bisect.bisect_left(self._dates, (before, -1)) if before is not None else len(self._dates)
+            in_range = {doc for _, doc in self._dates[lo:hi]}
+            allowed = in_range if allowed is None else allowed & in_range
+        return allowed
+
+    def _payloads(self, ids: List[str]) -> Dict[str, Dict]:
+        if not ids:
+            return {}
+        marks = ",".join("?" * len(ids))
+        return {pid: json.loads(p) for pid, p in self._db.execute(f"SELECT id, payload FROM docs WHERE id IN ({marks})", ids)}
+
+    def search(self, query: str, top_k: int = 5, sender: str = None, after: int = None, before: int = None,
+               account: str = None) -> List[Dict]:
+        """
+        BM25 top-k within the filters. A query with no terms but some filter
+        returns the newest matching emails.
+        """
+        terms = list(dict.fromkeys(tokenize(query, split_addresses=False)))
+        with self._lock:
+            allowed = self._allowed(sender, after, before, account)
+            if not terms:
+                if allowed is None:
+                    return []
+                ranked = sorted(allowed, key=lambda d: -(self._doc_dates[d] or 0))[:top_k]
+                scored = [(d, 0.0) for d in ranked]
+            else:
+                n = self.count
+                avg_len = (self._total_length / n) if n else 1.0
+                scores: Dict[int, float] = {}
+                for term in terms:
+                    posting = self._postings.get(term)
+                    if not posting:
+                        continue
+                    idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                    if allowed is None:
+                        matches = posting.items()
+                    elif len(allowed) < len(posting):
+                        matches = [(d, posting[d]) for d in allowed if d in posting]
+                    else:
+                        matches = [(d, tf) for d, tf in posting.items() if d in allowed]
+                    for doc, tf in matches:
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc] / avg_len)
+                        scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+                scored = heapq.nlargest(top_k, scores.items(), key=lambda kv: kv[1])
+            ids = [self._ids[d] for d, _ in scored]
+            payloads = self._payloads(ids)
+        return [{"id": pid, "score": float(s), "payload": payloads.get(pid, {})} for pid, (_, s) in zip(ids, scored)]
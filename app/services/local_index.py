@@ -0,0 +1,252 @@
+# app/services/local_index.py
+"""
+In-process vector index: a float32 matrix in a memory-mapped file plus a
+small SQLite table for ids/payloads. Exact cosine top-k by default, with an
+optional HNSW approximate index (hnswlib) for large mailboxes.
+"""
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+from app.services.accounts import DEFAULT_ACCOUNT
+
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "data/vector_index")
+LOCAL_INDEX_ANN = os.getenv("LOCAL_INDEX_ANN", "none")  # none | hnsw
+LOCAL_INDEX_ANN_MIN = int(os.getenv("LOCAL_INDEX_ANN_MIN", 20000))  # rows before ANN kicks in
+_INITIAL_CAPACITY = 1024
+
+
+class LocalVectorIndex:
+    """
+    Rows are append-only in the memmap; an upsert of a known id overwrites its
+    row in place, deletes only flip the alive mask until compact() runs.
+    Vectors are L2-normalised on write so cosine similarity is a dot product.
+    """
+
+    def __init__(self, path: str = None, ann: str = None, ann_min_rows: int = None):
+        self.path = path or LOCAL_INDEX_DIR
+        os.makedirs(self.path, exist_ok=True)
+        self._vec_path = os.path.join(self.path, "vectors.f32")
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(self.path, "index.sqlite3"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS points ("
+            "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, content_hash TEXT, payload TEXT, alive INTEGER NOT NULL)"
+        )
+        self._db.commit()
+
+        dim = self._db.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim = int(dim[0]) if dim else None
+        rows = self._db.execute(
+            "SELECT row, id, alive, json_extract(payload, '$.account') FROM points ORDER BY row"
+        ).fetchall()
+        self._ids = [r[1] for r in rows]
+        self._accounts = [r[3] or DEFAULT_ACCOUNT for r in rows]  # per row, so account scoping needs no SQL
+        self._row_of = {r[1]: r[0] for r in rows}
+        self._alive = np.array([bool(r[2]) for r in rows], dtype=bool)
+        self._matrix = None
+        if self.dim:
+            self._open_matrix()
+
+        self._ann_kind = (ann or LOCAL_INDEX_ANN).lower()
+        self._ann_min_rows = LOCAL_INDEX_ANN_MIN if ann_min_rows is None else ann_min_rows
+        self._ann = None
+
+    # --- storage ---
+    def _open_matrix(self, capacity: int = None):
+        existing = os.path.getsize(self._vec_path) // (4 * self.dim) if os.path.exists(self._vec_path) else 0
+        capacity = max(capacity or 0, existing, _INITIAL_CAPACITY)
+        if existing < capacity:
+            with open(self._vec_path, "ab") as f:
+                f.truncate(capacity * self.dim * 4)
+        self._matrix = np.memmap(self._vec_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows: int):
+        if self._matrix is None:
+            self._open_matrix(rows)
+        elif rows > self._matrix.shape[0]:
+            self._matrix.flush()
+            self._matrix = None
+            self._open_matrix(max(rows, 2 * len(self._ids)))
+
+    @property
+    def count(self) -> int:
+        return int(self._alive.sum())
+
+    # --- writes ---
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict]):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(ids):
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+
+            new_ids = [i for i in dict.fromkeys(ids) if i not in self._row_of]
+            start = len(self._ids)
+            self._ensure_capacity(start + len(new_ids))
+            for offset, pid in enumerate(new_ids):
+                self._row_of[pid] = start + offset
+                self._ids.append(pid)
+                self._accounts.append(DEFAULT_ACCOUNT)
+            self._alive = np.concatenate([self._alive, np.zeros(len(new_ids), dtype=bool)])
+
+            rows = np.array([self._row_of[pid] for pid in ids])
+            for r, p in zip(rows, payloads):
+                self._accounts[r] = (p or {}).get("account") or DEFAULT_ACCOUNT
+            self._matrix[rows] = vectors
+            self._alive[rows] = True
+            self._matrix.flush()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO points (row, id, content_hash, payload, alive) VALUES (?, ?, ?, ?, 1)",
+                [(int(r), pid, (p or {}).get("content_hash"), json.dumps(p or {})) for r, pid, p in zip(rows, ids, payloads)],
+            )
+            self._db.commit()
+            if self._ann is not None:
+                if self._ann.get_max_elements() < len(self._ids):
+                    self._ann.resize_index(2 * len(self._ids))
+                self._ann.add_items(vectors, rows)
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            rows = [self._row_of[pid] for pid in ids if pid in self._row_of]
+            if not rows:
+                return
+            self._alive[rows] = False
+            self._db.executemany("UPDATE points SET alive = 0 WHERE row = ?", [(int(r),) for r in rows])
+            self._db.commit()
+            if self._ann is not None:
+                for r in rows:
+                    try:
+                        self._ann.mark_deleted(int(r))
+                    except RuntimeError:
+                        pass
+
+    def compact(self):
+        """Rewrite the matrix without deleted rows."""
+        with self._lock:
+            if self._alive.all():
+                return
+            keep = np.flatnonzero(self._alive)
+            kept_vectors = np.array(self._matrix[keep]) if len(keep) else np.zeros((0, self.dim or 0), np.float32)
+            records = {r[0]: r for r in self._db.execute("SELECT row, id, content_hash, payload FROM points WHERE alive = 1")}
+            self._db.execute("DELETE FROM points")
+            self._db.executemany(
+                "INSERT INTO points (row, id, content_hash, payload, alive) VALUES (?, ?, ?, ?, 1)",
+                [(new_row, records[old][1], records[old][2], records[old][3]) for new_row, old in enumerate(keep)],
+            )
+            self._db.commit()
+            self._ids = [records[old][1] for old in keep]
+            self._accounts = [self._accounts[old] for old in keep]
+            self._row_of = {pid: i for i, pid in enumerate(self._ids)}
+            self._alive = np.ones(len(keep), dtype=bool)
+            if self._matrix is not None:
+                self._matrix[:len(keep)] = kept_vectors
+                self._matrix.flush()
+            self._ann = None
+
+    # --- reads ---
+    def get_hashes(self, ids: List[str]) -> Dict[str, str]:
+        out = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                marks = ",".join("?" * len(part))
+                for pid, h in self._db.execute(
+                    f"SELECT id, content_hash FROM points WHERE alive = 1 AND id IN ({marks})", part
+                ):
+                    out[pid] = h
+        return out
+
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            rows = [(pid, self._row_of[pid]) for pid in ids if pid in self._row_of and self._alive[self._row_of[pid]]]
+            return {pid: np.array(self._matrix[r]) for pid, r in rows}
+
+    def _payloads(self, rows: List[int]) -> Dict[int, Dict]:
+        marks = ",".join("?" * len(rows))
+        return {
+            r: json.loads(p)
+            for r, p in self._db.execute(f"SELECT row, payload FROM points WHERE row IN ({marks})", [int(r) for r in rows])
+        }
+
+    def _ann_index(self):
+        """Lazily build the HNSW index once the index is large enough (None = exact search)."""
+        if self._ann_kind != "hnsw" or len(self._ids) < self._ann_min_rows:
+            return None
+        if self._ann is None:
+            try:
+                import hnswlib
+            except ImportError:
+                print("⚠️ hnswlib not installed, using exact search")
+                self._ann_kind = "none"
+                return None
+            n = len(self._ids)
+            index = hnswlib.Index(space="ip", dim=self.dim)
+            index.init_index(max_elements=max(2 * n, _INITIAL_CAPACITY), ef_construction=200, M=16, allow_replace_deleted=True)
+            alive_rows = np.flatnonzero(self._alive)
+            index.add_items(np.asarray(self._matrix[alive_rows]), alive_rows)
+            index.set_ef(64)
+            self._ann = index
+        return self._ann
+
+    def _filter_mask(self, filters: Dict) -> np.ndarray:
+        """Alive rows whose payload passes filters ({"sender", "after", "before", "account"})."""
+        mask = self._alive.copy()
+        if filters.get("account"):
+            mask &= np.array([a == filters["account"] for a in self._accounts], dtype=bool)
+        if not any(filters.get(k) is not None for k in ("sender", "after", "before")):
+            return mask
+        clauses, params = ["alive = 1"], []
+        if filters.get("sender"):
+            clauses.append("json_extract(payload, '$.sender') = ?")
+            params.append(filters["sender"])
+        if filters.get("after") is not None:
+            clauses.append("json_extract(payload, '$.date') >= ?")
+            params.append(filters["after"])
+        if filters.get("before") is not None:
+            clauses.append("json_extract(payload, '$.date') < ?")
+            params.append(filters["before"])
+        matched = np.zeros(len(self._ids), dtype=bool)
+        matched[[r for (r,) in self._db.execute(f"SELECT row FROM points WHERE {' AND '.join(clauses)}", params)]] = True
+        return mask & matched
+
+    def search(self, vector, top_k: int = 5, filters: Dict = None) -> List[Dict]:
+        """Cosine top-k; with filters the search is exact over the matching rows only."""
+        with self._lock:
+            if self._matrix is None or self.count == 0:
+                return []
+            mask = self._filter_mask(filters) if filters else self._alive
+            n_alive = int(mask.sum())
+            filtered = n_alive < self.count  # filters that keep every row (one mailbox) don't force exact search
+            if n_alive == 0:
+                return []
+            q = np.asarray(vector, dtype=np.float32)
+            q = q / (np.linalg.norm(q) or 1.0)
+            k = min(top_k, n_alive)
+
+            ann = None if filtered else self._ann_index()
+            if ann is not None:
+                labels, dists = ann.knn_query(q, k=k)
+                rows, scores = labels[0], 1.0 - dists[0]
+            else:
+                n = len(self._ids)
+                scores_all = np.asarray(self._matrix[:n]) @ q
+                scores_all[~mask] = -np.inf
+                rows = np.argpartition(-scores_all, k - 1)[:k]
+                rows = rows[np.argsort(-scores_all[rows])]
+                scores = scores_all[rows]
+
+            payloads = self._payloads(list(rows))
+            return [
+                {"id": self._ids[r], "score": float(s), "payload": payloads.get(int(r), {})}
+                for r, s in zip(rows, scores)
+            ]
@@ -0,0 +1,75 @@
+# app/services/rate_limiter.py
+import os
+import time
+import threading
+from typing import Dict
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# requests/second per backend, e.g. "Perplexity=2,Gemini=1"; missing or 0 = unlimited
+BACKEND_RATE_LIMITS = os.getenv("BACKEND_RATE_LIMITS", "Perplexity=2,Gemini=1")
+
+
+class TokenBucket:
+    """
+    Classic token bucket: refills `rate` tokens per second up to `capacity`.
+    acquire() blocks until a token is available (or timeout expires).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+def parse_rate_limits(spec: str) -> Dict[str, float]:
+    limits = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        name, rate = part.split("=", 1)
+        try:
+            limits[name.strip()] = float(rate)
+        except ValueError:
+            print(f"⚠️ Ignoring invalid rate limit: {part}")
+    return limits
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(name: str):
+    """Shared bucket for a backend, or None when it has no limit configured."""
+    with _buckets_lock:
+        if name not in _buckets:
+            rate = parse_rate_limits(BACKEND_RATE_LIMITS).get(name, 0)
+            _buckets[name] = TokenBucket(rate) if rate > 0 else None
+        return _buckets[name]
+
+
+def acquire(name: str):
+    bucket = get_bucket(name)
+    if bucket:
+        bucket.acquire()
@@ -0,0 +1,123 @@
+# app/services/reducer.py
+"""
+Local helpers for map-reduce summarization (summarizer.reduce_summaries).
+
+Chunk digests are merged in rounds of up to REDUCE_FANIN digests per LLM
+call, so n chunks take about n/(f-1) reduce calls spread over log_f(n)
+parallel rounds. Everything here is LLM-free: grouping partial digests to
+fit the prompt budget, rendering them for the reduce prompt, and a
+deterministic merge (dedupe, rank, truncate) that bounds every reduce
+answer and stands in for a reduce call that failed.
+"""
+import os
+import re
+from typing import Callable, Dict, List
+
+from dotenv import load_dotenv
+load_dotenv()
+
+DIGEST_MAX_POINTS = int(os.getenv("DIGEST_MAX_POINTS", 30))
+DIGEST_MAX_ACTIONS = int(os.getenv("DIGEST_MAX_ACTIONS", 15))
+REDUCE_FANIN = max(2, int(os.getenv("REDUCE_FANIN", 8)))  # partial digests per reduce call
+
+_SKIP_POINTS = {"Error producing summary", "No summary available"}
+_KEY_RE = re.compile(r"[^\w@]+")
+_CATEGORY_RE = re.compile(r"^\W*([A-Za-z ]+?)\s*:")
+# ties on support go to the categories the prompt treats as important
+_CATEGORY_RANK = {c: i for i, c in enumerate(
+    ["Banking", "Finance", "Work", "Travel", "Family", "Other", "Gaming", "Social", "Promotions", "Spam"]
+)}
+
+
+def point_key(text: str) -> str:
+    """Case/punctuation/whitespace-insensitive identity of a summary point."""
+    return _KEY_RE.sub(" ", str(text).lower()).strip()
+
+
+def action_key(action) -> str:
+    if isinstance(action, dict):
+        return point_key(f"{action.get('name', '')} {action.get('action', '')}")
+    return point_key(action)
+
+
+def _category_rank(text: str) -> int:
+    m = _CATEGORY_RE.match(str(text))
+    return _CATEGORY_RANK.get(m.group(1).strip().title(), len(_CATEGORY_RANK)) if m else len(_CATEGORY_RANK)
+
+
+def _merge_items(lists: List[list], key: Callable, limit: int, rank: bool, category: Callable = None) -> list:
+    seen: Dict[str, list] = {}  # key -> [support, best position in a source, order, item]
+    order = 0
+    for items in lists:
+        for pos, item in enumerate(items or []):
+            k = key(item)
+            if not k or (isinstance(item, str) and item in _SKIP_POINTS):
+                continue
+            if k in seen:
+                seen[k][0] += 1
+                seen[k][1] = min(seen[k][1], pos)
+            else:
+                seen[k] = [1, pos, order, item]
+                order += 1
+    entries = list(seen.values())
+    if rank:
+        # mentioned by more digests first, then ranked higher within one, then by category
+        entries.sort(key=lambda e: (-e[0], e[1], category(e[3]) if category else 0, e[2]))
+    return [e[3] for e in entries[:limit]]
+
+
+def merge_partials(partials: List[Dict], max_points: int = None, max_actions: int = None, rank: bool = True) -> Dict:
+    """
+    Merge digests locally: exact-ish duplicates collapse, the rest is ranked
+    (rank=True) or kept in first-seen order, then cut to the digest bounds.
+    """
+    max_points = max_points or DIGEST_MAX_POINTS
+    max_actions = max_actions or DIGEST_MAX_ACTIONS
+    return {
+        "summary_of_emails": _merge_items([p.get("summary_of_emails") for p in partials], point_key, max_points, rank, _category_rank),
+        "actions": _merge_items([p.get("actions") for p in partials], action_key, max_actions, rank),
+    }
+
+
+def render_partial(partial: Dict, number: int) -> str:
+    lines = [f"Digest {number}:"]
+    lines += [f"- {p}" for p in partial.get("summary_of_emails", [])]
+    actions = partial.get("actions", [])
+    if actions:
+        lines.append("Actions:")
+        for a in actions:
+            lines.append(f"- {a.get('name', '')}: {a.get('action', '')}" if isinstance(a, dict) else f"- {a}")
+    return "\n".join(lines)
+
+
+def fit_partial(partial: Dict, budget: int, count_tokens: Callable[[str], int]) -> Dict:
+    """Drop the lowest-ranked points/actions until the rendered digest fits `budget` tokens."""
+    points, actions = list(partial.get("summary_of_emails", [])), list(partial.get("actions", []))
+    while count_tokens(render_partial({"summary_of_emails": points, "actions": actions}, 0)) > budget and (points or actions):
+        if len(actions) > len(points) // 2:
+            actions.pop()
+        else:
+            points.pop()
+    return {"summary_of_emails": points, "actions": actions}
+
+
+def group_partials(partials: List[Dict], available: int, count_tokens: Callable[[str], int], fanin: int = None) -> List[List[Dict]]:
+    """
+    Consecutive groups of at most `fanin` digests whose rendered text fits
+    `available` tokens. Every digest is first trimmed to half the budget, so
+    each group holds at least two and every round at least halves the count.
+    """
+    fanin = fanin or REDUCE_FANIN
+    sep = count_tokens("\n\n")
+    groups, current, used = [], [], 0
+    for p in partials:
+        p = fit_partial(p, max(1, available // 2 - sep), count_tokens)
+        cost = count_tokens(render_partial(p, len(current) + 1)) + sep
+        if current and (len(current) >= fanin or used + cost > available):
+            groups.append(current)
+            current, used = [], 0
+        current.append(p)
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
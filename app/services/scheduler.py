@@ -1,34 +1,88 @@
 # app/services/scheduler.py
 import os
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor as PoolExecutor
+from typing import Dict, List
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
 from dotenv import load_dotenv
-from app.services.summarizer import run_rag_daily
 from app.services.digest_runner import run_and_email_digest
+from app.services.accounts import load_accounts, DEFAULT_ACCOUNT
 
 load_dotenv()
 
-SCHEDULE_HOUR = int(os.getenv("SCHEDULE_HOUR", 7))
-SCHEDULE_MINUTE = int(os.getenv("SCHEDULE_MINUTE", 0))
-MAX_EMAIL_FETCH = int(os.getenv("MAX_EMAIL_FETCH", 20))  # use env value
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", 4))  # concurrent digest runs
+SCHEDULER_EXECUTOR = os.getenv("SCHEDULER_EXECUTOR", "thread")  # thread | process
+SCHEDULE_JITTER = int(os.getenv("SCHEDULE_JITTER_SECONDS", 300))  # spread runs after the cron time
 
 _scheduler = None
 
-def _job_wrapper():
+def _job_wrapper(account_id: str = None, max_results: int = None):
+    label = account_id or DEFAULT_ACCOUNT
     try:
-        print("⏰ Running scheduled MailSmart job...")
-        # fetch & summarize respecting MAX_EMAIL_FETCH
-        summary = run_and_email_digest(max_results=MAX_EMAIL_FETCH)
-        print("✅ Digest email sent successfully.")
+        print(f"⏰ Running scheduled MailSmart job for {label}...")
+        # fetch & summarize respecting the account's max_results
+        summary = run_and_email_digest(
+            max_results=max_results,
+            account_id=None if account_id == DEFAULT_ACCOUNT else account_id
+        )
+        print(f"✅ Digest email sent successfully ({label}).")
         print(f"📩 Summarized {len(summary.get('summary_of_emails', []))} emails.")
+        return summary
     except Exception as e:
-        print("⚠️ Scheduled job error:", e)
+        print(f"⚠️ Scheduled job error ({label}):", e)
 
-def start_scheduler():
+def _executors() -> Dict:
+    if SCHEDULER_EXECUTOR == "process":
+        return {"default": ProcessPoolExecutor(SCHEDULER_WORKERS)}
+    return {"default": ThreadPoolExecutor(SCHEDULER_WORKERS)}
+
+def start_scheduler(accounts: List[Dict] = None):
+    """
+    One cron job per enabled account at its own hour:minute in its own
+    timezone, with random jitter so runs don't all start on the hour.
+    Runs execute on a bounded pool of SCHEDULER_WORKERS.
+    """
     global _scheduler
     if _scheduler:
-        return
-    _scheduler = BackgroundScheduler(timezone="Asia/Kolkata")
-    # daily at configured hour:minute
-    _scheduler.add_job(_job_wrapper, "cron", hour=SCHEDULE_HOUR, minute=SCHEDULE_MINUTE)
+        return _scheduler
+    accounts = load_accounts() if accounts is None else accounts
+    _scheduler = BackgroundScheduler(
+        executors=_executors(),
+        job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 3600}
+    )
+    for account in accounts:
+        if not account["enabled"]:
+            continue
+        _scheduler.add_job(
+            _job_wrapper, "cron",
+            hour=account["hour"], minute=account["minute"], timezone=account["timezone"],
+            jitter=SCHEDULE_JITTER or None,
+            id=f"digest:{account['id']}", replace_existing=True,
+            kwargs={"account_id": account["id"], "max_results": account["max_results"]}
+        )
+        print(f"🚀 Scheduled {account['id']} - daily at {account['hour']:02d}:{account['minute']:02d} ({account['timezone']})")
     _scheduler.start()
-    print(f"🚀 Scheduler started - daily at {SCHEDULE_HOUR:02d}:{SCHEDULE_MINUTE:02d} (Asia/Kolkata)")
+    return _scheduler
+
+def stop_scheduler():
+    global _scheduler
+    if _scheduler:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+
+def run_all_accounts(accounts: List[Dict] = None, workers: int = None, jitter: float = 0.0) -> Dict[str, Dict]:
+    """
+    Run every enabled account's digest now on a bounded thread pool.
+    Each run starts after a random delay in [0, jitter] seconds.
+    """
+    accounts = [a for a in (load_accounts() if accounts is None else accounts) if a["enabled"]]
+
+    def _run(account):
+        if jitter:
+            time.sleep(random.uniform(0, jitter))
+        return account["id"], _job_wrapper(account["id"], account["max_results"])
+
+    with PoolExecutor(max_workers=workers or SCHEDULER_WORKERS) as pool:
+        return dict(pool.map(_run, accounts))
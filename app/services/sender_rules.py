@@ -0,0 +1,150 @@
+# app/services/sender_rules.py
+"""
+Essential-sender rules (config/essential.json) compiled into an Aho-Corasick
+automaton, so matching a From header costs one pass over the header no
+matter how many rules there are. A rule keeps the old meaning: a
+case-insensitive substring of the From header, so "alerts@bank.com",
+"@bank.com" and "nptel" all work.
+
+The compiled matcher is cached and rebuilt only when the file's mtime/size
+changes or invalidate_sender_rules() is called (the /api/essentials routes
+do). Headers repeat a lot in a mailbox, so results are memoized per header.
+"""
+import os
+import json
+import threading
+from collections import deque
+from typing import Dict, List, Tuple
+
+ESSENTIAL_PATH = os.getenv("ESSENTIAL_PATH", "config/essential.json")
+_MEMO_LIMIT = 100_000  # distinct From headers remembered per matcher
+
+
+class SenderMatcher:
+    def __init__(self, rules: List[str]):
+        self.rules = [r for r in dict.fromkeys(rules) if isinstance(r, str) and r.strip()]
+        # trie: per-node transition dict, failure link and the rules ending there
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        for i, rule in enumerate(self.rules):
+            node = 0
+            for c in rule.strip().lower():
+                nxt = self._goto[node].get(c)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][c] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] += (i,)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for c, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and c not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(c, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+        self._memo: Dict[str, Tuple[int, ...]] = {}
+        self._memo_lock = threading.Lock()
+
+    def _scan(self, text: str) -> Tuple[int, ...]:
+        goto, fail, out = self._goto, self._fail, self._out
+        node, found = 0, set()
+        for c in text:
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            if out[node]:
+                found.update(out[node])
+        return tuple(sorted(found))
+
+    def match(self, sender: str) -> List[str]:
+        """Rules matching a From header (case-insensitive substring)."""
+        if not self.rules or not sender:
+            return []
+        hit = self._memo.get(sender)
+        if hit is None:
+            hit = self._scan(sender.lower())
+            with self._memo_lock:
+                if len(self._memo) >= _MEMO_LIMIT:
+                    self._memo.clear()
+                self._memo[sender] = hit
+        return [self.rules[i] for i in hit]
+
+    def is_essential(self, sender: str) -> bool:
+        return bool(self.match(sender))
+
+
+_matcher = None
+_matcher_key = None
+_matcher_lock = threading.Lock()
+
+
+def _file_key(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def load_rules(path: str = None) -> List[str]:
+    path = path or ESSENTIAL_PATH
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("senders", [])
+    except Exception as e:
+        print("⚠️ Failed to read essential senders:", e)
+        return []
+
+
+def get_sender_matcher(path: str = None) -> SenderMatcher:
+    """The compiled matcher for the rules file, recompiled only when it changed."""
+    global _matcher, _matcher_key
+    path = path or ESSENTIAL_PATH
+    key = _file_key(path)
+    if _matcher is not None and key == _matcher_key:
+        return _matcher
+    with _matcher_lock:
+        if _matcher is None or key != _matcher_key:
+            _matcher = SenderMatcher(load_rules(path))
+            _matcher_key = key
+        return _matcher
+
+
+def invalidate_sender_rules():
+    """Force a recompile on next use (after the rules file was written)."""
+    global _matcher, _matcher_key
+    with _matcher_lock:
+        _matcher, _matcher_key = None, None
+
+
+def tag_essential(emails: List[Dict], key=None) -> Tuple[List[Dict], int]:
+    """
+    One pass over emails: drop duplicates (by `key`, default the Gmail id)
+    and mark emails from essential senders with essential=True (a copy, the
+    input dicts aren't touched). Returns (emails, essential_count).
+    """
+    matcher = get_sender_matcher()
+    key = key or (lambda e: e.get("id"))
+    seen = set()
+    out = []
+    essential = 0
+    for e in emails:
+        k = key(e)
+        if k in seen:
+            continue
+        seen.add(k)
+        if matcher.rules and matcher.is_essential(e.get("from") or ""):
+            e = dict(e, essential=True)
+            essential += 1
+        out.append(e)
+    return out, essential
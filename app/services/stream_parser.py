@@ -0,0 +1,115 @@
+# app/services/stream_parser.py
+"""
+Incremental parser for the summarizer's JSON answer:
+
+    {"summary_of_emails": ["...", ...], "actions": [{"name": ..., "action": ...}, ...]}
+
+Feed it text deltas as they stream in; each summary point / action is
+returned as soon as its closing quote / brace arrives. Text before the
+first "{" (```json fences, preambles) is skipped. Each character is
+scanned once, so the whole answer costs O(n).
+"""
+import json
+from typing import Dict, List, Tuple
+
+SUMMARY_KEY = "summary_of_emails"
+ACTIONS_KEY = "actions"
+
+
+class SummaryStreamParser:
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._started = False
+        self._closed = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None  # last string seen at the top level (a key candidate)
+        self._key = None
+        self._array = None  # which top-level array we're inside
+        self._element_start = 0
+        self.summary: List[str] = []
+        self.actions: List[Dict] = []
+
+    def feed(self, delta: str) -> List[Tuple[str, object]]:
+        """Add text; returns the items completed by it as ("summary", str) / ("action", dict)."""
+        self.text += delta
+        events = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            if self._closed:
+                break
+            c = text[i]
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._stack.append("{")
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._end_string(text, i, events)
+                continue
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                self._stack.append(c)
+                if len(self._stack) == 2 and c == "[" and self._key in (SUMMARY_KEY, ACTIONS_KEY):
+                    self._array = self._key
+                elif len(self._stack) == 3 and c == "{" and self._array == ACTIONS_KEY:
+                    self._element_start = i
+            elif c in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if len(self._stack) == 2 and c == "}" and self._array == ACTIONS_KEY:
+                    self._emit_action(text[self._element_start:i + 1], events)
+                elif len(self._stack) == 1 and c == "]":
+                    self._array = None
+                elif not self._stack:
+                    self._closed = True
+            elif c == ":" and len(self._stack) == 1:
+                self._key = self._last_string
+        self._pos = len(text)
+        return events
+
+    def _end_string(self, text: str, end: int, events: List):
+        literal = text[self._string_start:end + 1]
+        if len(self._stack) == 1:
+            self._last_string = self._decode(literal)
+        elif len(self._stack) == 2 and self._array == SUMMARY_KEY:
+            point = self._decode(literal)
+            if point:
+                self.summary.append(point)
+                events.append(("summary", point))
+
+    @staticmethod
+    def _decode(literal: str):
+        try:
+            return json.loads(literal)
+        except ValueError:
+            return None
+
+    def _emit_action(self, raw: str, events: List):
+        try:
+            action = json.loads(raw)
+        except ValueError:
+            return
+        if isinstance(action, dict):
+            self.actions.append(action)
+            events.append(("action", action))
+
+    @property
+    def complete(self) -> bool:
+        """True once the top-level object has been closed."""
+        return self._closed
+
+    def result(self) -> Dict:
+        """Everything parsed so far, in the summarizer's usual shape."""
+        return {"summary_of_emails": list(self.summary), "actions": list(self.actions)}
@@ -1,33 +1,75 @@
 # app/services/summarizer.py
 import os
 import json
+import math
 import re
-import traceback
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import List, Dict
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from app.services.vector_store import upsert_emails
-from app.services.gmail_service import get_emails_from_last_24_hours
+from app.services.vector_store import upsert_emails, get_email_vectors
+from app.services.summary_cache import get_summary_cache, make_key
+from app.services.backend_router import get_router, BackendError, response_text
+from app.services.stream_parser import SummaryStreamParser
+from app.services.telemetry import span, start_run, submit_in_context, get_registry
+from app.services.chunk_planner import (
+    plan_chunks, binding_backend, email_block, split_to_budget, get_token_counter, token_budget, EMAIL_SEPARATOR,
+    PLACEHOLDER, PROMPT_OUTPUT_RESERVE
+)
+from app.services.reducer import (
+    merge_partials, group_partials, render_partial, DIGEST_MAX_POINTS, DIGEST_MAX_ACTIONS, REDUCE_FANIN
+)
+from app.services.history_store import get_history_store
+from app.services.sender_rules import get_sender_matcher, tag_essential
+from app.services.triage import triage, templated_summary, TRIAGE_ENABLED
+from app.services.dedup import collapse, DEDUP_ENABLED
+from app.services.gmail_service import get_emails_from_last_24_hours, sync_mailbox, GMAIL_SYNC_MODE
 
-# Perplexity client
-from perplexity import Perplexity
-PERPLEXITY_CLIENT = Perplexity(api_key=os.environ.get("PERPLEXITY_API_KEY"))
+# Perplexity client (created on first use, so a missing key only fails that backend)
+_perplexity_client = None
+_perplexity_lock = threading.Lock()
+
+def get_perplexity_client():
+    global _perplexity_client
+    with _perplexity_lock:
+        if _perplexity_client is None:
+            from perplexity import Perplexity
+            _perplexity_client = Perplexity(
+                api_key=os.environ.get("PERPLEXITY_API_KEY"),
+                base_url=os.environ.get("PERPLEXITY_BASE_URL") or None
+            )
+        return _perplexity_client
 
 # Config
 PROMPT_PATH = os.getenv("PROMPT_PATH", "prompts/summarizer_prompt.txt")
+REDUCE_PROMPT_PATH = os.getenv("REDUCE_PROMPT_PATH", "prompts/reduce_prompt.txt")
 LOG_DIR = os.getenv("LOG_DIR", "logs")
 CHUNK_SIZE = int(os.getenv("EMAIL_CHUNK_SIZE", 5) or 5)
-ESSENTIAL_PATH = "config/essential.json"
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "tokens")  # tokens (budget-packed) | fixed (CHUNK_SIZE emails)
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", 4) or 1)
 MAX_EMAIL_FETCH = int(os.getenv("MAX_EMAIL_FETCH", 20))
+# concat: every chunk's points back to back | mapreduce: merge chunk digests into one
+# bounded, ranked digest (reducer.py) | auto: mapreduce above SUMMARY_REDUCE_MIN_CHUNKS chunks
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "auto")
+SUMMARY_REDUCE_MIN_CHUNKS = int(os.getenv("SUMMARY_REDUCE_MIN_CHUNKS", 16))
 
 # Gemini API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 # Local fallback
 HF_LOCAL_MODEL = os.getenv("HF_LOCAL_MODEL", "sshleifer/distilbart-cnn-12-6")
+HF_LOCAL_QUANTIZE = os.getenv("HF_LOCAL_QUANTIZE", "none")  # none | int8 | onnx
+HF_LOCAL_BATCH_SIZE = int(os.getenv("HF_LOCAL_BATCH_SIZE", 8))
+
+# Backend order, e.g. "Local,Perplexity,Gemini" to run the local model first
+SUMMARY_BACKENDS = os.getenv("SUMMARY_BACKENDS", "Perplexity,Gemini,Local")
+# Stream completions and emit summary points as they arrive (when someone is listening)
+SUMMARY_STREAMING = os.getenv("SUMMARY_STREAMING", "true").lower() == "true"
 
 # === Utilities ===
 def load_prompt() -> str:
@@ -36,19 +78,19 @@ def load_prompt() -> str:
     with open(PROMPT_PATH, "r", encoding="utf-8") as f:
         return f.read()
 
+def load_reduce_prompt() -> str:
+    if not os.path.exists(REDUCE_PROMPT_PATH):
+        raise FileNotFoundError("Prompt file missing: " + REDUCE_PROMPT_PATH)
+    with open(REDUCE_PROMPT_PATH, "r", encoding="utf-8") as f:
+        template = f.read()
+    return template.replace("{max_points}", str(DIGEST_MAX_POINTS)).replace("{max_actions}", str(DIGEST_MAX_ACTIONS))
+
 def load_essential_senders() -> List[str]:
-    if not os.path.exists(ESSENTIAL_PATH):
-        return []
-    try:
-        with open(ESSENTIAL_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data.get("senders", [])
-    except Exception:
-        return []
+    return get_sender_matcher().rules
 
 def ensure_essential(emails: List[Dict]) -> List[Dict]:
-    essential = load_essential_senders()
-    return [e for e in emails if any(s.lower() in e.get("from", "").lower() for s in essential)]
+    matcher = get_sender_matcher()
+    return [e for e in emails if matcher.is_essential(e.get("from", ""))]
 
 def get_email_unique_key(email: Dict) -> str:
     return f"{email.get('id')}_{email.get('from')}_{email.get('subject')}"
@@ -71,7 +113,7 @@ def safe_parse_json_from_text(text: str) -> Dict:
         clean = line.strip()
         if len(clean) > 10:
             summary_points.append(clean[:300])
-    return {"summary_of_emails": summary_points or ["No summary available"], "actions": actions}
+    return {"summary_of_emails": summary_points or [NO_SUMMARY], "actions": actions}
 
 def chunk_text(text: str, chunk_words: int = 600) -> List[str]:
     words = text.split()
@@ -79,90 +121,296 @@ def chunk_text(text: str, chunk_words: int = 600) -> List[str]:
 
 # === API Calls ===
 def call_perplexity(prompt: str) -> Dict:
-    """Call Perplexity API via official client."""
-    try:
-        completion = PERPLEXITY_CLIENT.chat.completions.create(
-            model="sonar-pro",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        text = completion.choices[0].message.content
-        return {"choices": [{"message": {"content": text}}]}
-    except Exception as e:
-        print("⚠️ Perplexity API call failed:", e)
-        traceback.print_exc()
-        return {"choices": [{"message": {"content": "Perplexity failed"}}]}
+    """Call Perplexity API via official client. Errors propagate to the router."""
+    completion = get_perplexity_client().chat.completions.create(
+        model="sonar-pro",
+        messages=[{"role": "user", "content": prompt}]
+    )
+    text = completion.choices[0].message.content
+    return {"choices": [{"message": {"content": text}}]}
 
 def call_gemini(prompt: str) -> Dict:
     if not GEMINI_API_KEY:
-        return {"choices": [{"message": {"content": "Gemini API key missing"}}]}
+        raise BackendError("Gemini API key missing")
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    try:
+        model = genai.GenerativeModel("gemini-flash-latest")
+    except Exception:
+        model = genai.GenerativeModel("gemini-pro-latest")
+    resp = model.generate_content(prompt)
+    text = getattr(resp, "text", str(resp))
+    return {"choices": [{"message": {"content": text}}]}
+
+def stream_perplexity(prompt: str):
+    """Yield completion text deltas from Perplexity."""
+    stream = get_perplexity_client().chat.completions.create(
+        model="sonar-pro",
+        messages=[{"role": "user", "content": prompt}],
+        stream=True
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def stream_gemini(prompt: str):
+    """Yield completion text deltas from Gemini."""
+    if not GEMINI_API_KEY:
+        raise BackendError("Gemini API key missing")
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=GEMINI_API_KEY)
+        model = genai.GenerativeModel("gemini-flash-latest")
+    except Exception:
+        model = genai.GenerativeModel("gemini-pro-latest")
+    for chunk in model.generate_content(prompt, stream=True):
+        text = getattr(chunk, "text", "")
+        if text:
+            yield text
+
+_local_pipelines = {}
+_local_pipeline_lock = threading.Lock()
+
+def _build_local_pipeline(model_name: str, quantize: str):
+    from transformers import pipeline
+    if quantize == "onnx":
         try:
-            model = genai.GenerativeModel("gemini-flash-latest")
-        except Exception:
-            model = genai.GenerativeModel("gemini-pro-latest")
-        resp = model.generate_content(prompt)
-        text = getattr(resp, "text", str(resp))
-        return {"choices": [{"message": {"content": text}}]}
-    except Exception as e:
-        print("⚠️ Gemini call failed:", e)
-        traceback.print_exc()
-        return {"choices": [{"message": {"content": "Gemini failed"}}]}
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+            from transformers import AutoTokenizer
+            model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            return pipeline("summarization", model=model, tokenizer=tokenizer, device=-1)
+        except ImportError:
+            print("⚠️ optimum[onnxruntime] not installed, using the PyTorch model")
+    summarizer = pipeline("summarization", model=model_name, device=-1)
+    if quantize == "int8":
+        import torch
+        summarizer.model = torch.quantization.quantize_dynamic(summarizer.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return summarizer
+
+def get_local_pipeline(model_name: str = None, quantize: str = None):
+    """One cached summarization pipeline per (model, quantization) per process."""
+    key = (model_name or HF_LOCAL_MODEL, quantize or HF_LOCAL_QUANTIZE)
+    with _local_pipeline_lock:
+        if key not in _local_pipelines:
+            print(f"🧠 Loading local summarizer {key[0]} (quantize={key[1]})...")
+            _local_pipelines[key] = {"pipeline": _build_local_pipeline(*key), "lock": threading.Lock()}
+        return _local_pipelines[key]
+
+def summarize_local_batch(texts: List[str]) -> List[str]:
+    """Summarize many texts in one batched pipeline call."""
+    if not texts:
+        return []
+    entry = get_local_pipeline()
+    # one inference at a time per model; the batch already uses all cores
+    with entry["lock"]:
+        outs = entry["pipeline"](texts, max_length=200, min_length=30, truncation=True, batch_size=HF_LOCAL_BATCH_SIZE)
+    return [
+        (out[0] if isinstance(out, list) else out).get("summary_text", str(out))
+        for out in outs
+    ]
 
 def call_transformers_local(text: str) -> Dict:
-    try:
-        from transformers import pipeline
-        summarizer = pipeline(
-            "summarization",
-            model=HF_LOCAL_MODEL,
-            device=-1
-        )
-        pieces = []
-        for chunk in chunk_text(text):
-            out = summarizer(chunk, max_length=200, min_length=30, truncation=True)
-            pieces.append(out[0].get("summary_text", str(out)))
-        return {"choices": [{"message": {"content": "\n\n".join(pieces)}}]}
-    except Exception as e:
-        print("⚠️ Local summarizer failed:", e)
-        traceback.print_exc()
-        return {"choices": [{"message": {"content": "Local summarizer failed"}}]}
+    # pieces sized to the local model's own context window
+    pieces = summarize_local_batch(split_to_budget(text, token_budget("Local"), get_token_counter("Local")))
+    return {"choices": [{"message": {"content": "\n\n".join(pieces)}}]}
 
 # === Backend Controller ===
+BACKEND_FUNCS = {
+    "Perplexity": call_perplexity,
+    "Gemini": call_gemini,
+    "Local": call_transformers_local
+}
+BACKENDS = [
+    (name.strip(), BACKEND_FUNCS[name.strip()])
+    for name in SUMMARY_BACKENDS.split(",") if name.strip() in BACKEND_FUNCS
+]
+STREAM_FUNCS = {
+    "Perplexity": stream_perplexity,
+    "Gemini": stream_gemini,
+}
+ERROR_SUMMARY = "Error producing summary"
+NO_SUMMARY = "No summary available"  # safe_parse_json_from_text found nothing usable
+# backend that produced the current chunk's answer (set by summarize_with_backends / stream_with_backends)
+_answered_by: contextvars.ContextVar = contextvars.ContextVar("summary_backend", default=None)
+
+def _as_stream(func):
+    def stream(prompt: str):
+        yield response_text(func(prompt))
+    return stream
+
+def _stream_backends() -> List:
+    """BACKENDS as streaming callables; non-streaming ones yield their whole answer once."""
+    return [
+        (name, STREAM_FUNCS[name] if name in STREAM_FUNCS and BACKEND_FUNCS.get(name) is func else _as_stream(func))
+        for name, func in BACKENDS
+    ]
+
+def _item_key(kind: str, item) -> str:
+    return kind + json.dumps(item, sort_keys=True)
+
+def stream_with_backends(prompt: str, on_item) -> Dict:
+    """
+    Like summarize_with_backends, but streams the completion and calls
+    on_item("summary", text) / on_item("action", dict) as each one completes.
+    If a backend dies mid-answer, on_item("reset", {"summary_of_emails": [...],
+    "actions": [...]}) retracts the items it had produced.
+    """
+    parser, backend, emitted = SummaryStreamParser(), None, {}
+    for name, delta in get_router().stream(prompt, _stream_backends()):
+        if delta is None:  # backend died mid-answer; its output is void and the next one starts over
+            if emitted:
+                items = list(emitted.values())
+                on_item("reset", {"summary_of_emails": [i for k, i in items if k == "summary"],
+                                  "actions": [i for k, i in items if k == "action"]})
+            parser, backend, emitted = SummaryStreamParser(), None, {}
+            continue
+        backend = name
+        for kind, item in parser.feed(delta):
+            key = _item_key(kind, item)
+            if key not in emitted:
+                emitted[key] = (kind, item)
+                on_item(kind, item)
+    if backend is None:
+        return {"summary_of_emails": [ERROR_SUMMARY], "actions": []}
+    _answered_by.set(backend)
+    print(f"✅ {backend} streamed usable summary")
+    # a well-formed answer is already fully parsed; otherwise fall back to the lenient parser
+    result = parser.result() if parser.complete else safe_parse_json_from_text(parser.text)
+    for kind, items in (("summary", result.get("summary_of_emails", [])), ("action", result.get("actions", []))):
+        for item in items:
+            if _item_key(kind, item) not in emitted:
+                on_item(kind, item)
+    return result
+
 def summarize_with_backends(prompt: str) -> Dict:
-    for name, func in [
-        ("Perplexity", call_perplexity),
-        ("Gemini", call_gemini),
-        ("Local", call_transformers_local)
-    ]:
-        try:
-            res = func(prompt)
-            content = res["choices"][0]["message"]["content"]
-            if not content or "failed" in content.lower():
-                continue
-            print(f"✅ {name} produced usable summary on attempt 1")
-            return safe_parse_json_from_text(content)
-        except Exception as e:
-            print(f"⚠️ {name} exception:", e)
-            traceback.print_exc()
-    return {"summary_of_emails": ["Error producing summary"], "actions": []}
+    """
+    First usable answer from BACKENDS via the backend router (circuit
+    breakers, timeouts, fastest-first, hedging; see backend_router.py).
+    """
+    answer = get_router().complete(prompt, BACKENDS)
+    if answer is None:
+        return {"summary_of_emails": [ERROR_SUMMARY], "actions": []}
+    name, content = answer
+    _answered_by.set(name)
+    print(f"✅ {name} produced usable summary")
+    return safe_parse_json_from_text(content)
+
+def _replay(result: Dict, on_item):
+    for point in result.get("summary_of_emails", []):
+        on_item("summary", point)
+    for action in result.get("actions", []):
+        on_item("action", action)
+
+def _cacheable(result: Dict, primary: str) -> bool:
+    """Only clean answers from the primary backend; fallbacks are degraded and retried next run."""
+    return (
+        _answered_by.get() == primary and primary != "Local"
+        and result.get("summary_of_emails") not in ([ERROR_SUMMARY], [NO_SUMMARY])
+    )
+
+def summarize_chunk(prompt_template: str, text_chunk: str, on_item=None) -> Dict:
+    """
+    Summarize one prompt chunk, served from the summary cache when possible.
+    on_item(kind, item) gets each summary point/action as soon as it exists
+    (streamed from the backend when SUMMARY_STREAMING is on).
+    """
+    primary = BACKENDS[0][0] if BACKENDS else None
+    cache = get_summary_cache() if primary else None
+    key = make_key(prompt_template, primary, text_chunk) if cache else None
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            if on_item:
+                _replay(cached, on_item)
+            return cached
+    prompt = prompt_template.replace("{emails_text}", text_chunk)
+    _answered_by.set(None)
+    with span("summarize.chunk"):
+        if on_item and SUMMARY_STREAMING:
+            result = stream_with_backends(prompt, on_item)
+        else:
+            result = summarize_with_backends(prompt)
+            if on_item:
+                _replay(result, on_item)
+    if cache and _cacheable(result, primary):
+        cache.set(key, result)
+    return result
+
+def _no_progress(stage: str, **data):
+    pass
 
 # === Summarize Emails ===
-def summarize_emails(emails: List[Dict]) -> Dict:
+def plan_text_chunks(emails: List[Dict], prompt_template: str, strategy: str = None) -> List[str]:
+    """emails_text for each LLM call (see chunk_planner.py)."""
+    if (strategy or CHUNK_STRATEGY) == "fixed":
+        text_chunks = []
+        for i in range(0, len(emails), CHUNK_SIZE):
+            chunk = emails[i:i+CHUNK_SIZE]
+            text_chunks.extend(chunk_text(EMAIL_SEPARATOR.join(email_block(e) for e in chunk)))
+        return text_chunks
+    backend = binding_backend([name for name, _ in BACKENDS])
+    return plan_chunks(emails, prompt_template, backend=backend)
+
+def _use_reduce(n_chunks: int, mode: str = None) -> bool:
+    mode = mode or SUMMARY_MODE
+    return mode == "mapreduce" or (mode == "auto" and n_chunks > SUMMARY_REDUCE_MIN_CHUNKS)
+
+def _map_in_pool(func, items: List, concurrency: int) -> List:
+    if concurrency > 1 and len(items) > 1:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(items))) as pool:
+            futures = [submit_in_context(pool, func, item) for item in items]
+            return [f.result() for f in futures]
+    return [func(item) for item in items]
+
+def summarize_emails(emails: List[Dict], concurrency: int = None, progress=None, mode: str = None,
+                     text_chunks: List[str] = None) -> Dict:
+    """
+    Summarize emails chunk by chunk. Chunks are fanned out over a thread pool
+    of `concurrency` workers (SUMMARY_CONCURRENCY); results keep chunk order.
+    progress(stage, **data) is called as each chunk finishes, and with
+    "summary_point"/"action" events as soon as each item is produced
+    ("reset" retracts items from a backend that died mid-answer).
+    In map-reduce mode (SUMMARY_MODE) the chunk digests are merged by
+    reduce_summaries and only the final digest's items are emitted.
+    text_chunks: plan_text_chunks(emails, ...) when the caller already has it.
+    """
     if not emails:
         return {"summary_of_emails": [], "actions": []}
     prompt_template = load_prompt()
-    summaries = []
-
-    for i in range(0, len(emails), CHUNK_SIZE):
-        chunk = emails[i:i+CHUNK_SIZE]
-        emails_text = "\n\n---\n\n".join([
-            f"From: {e.get('from')}\nSubject: {e.get('subject')}\n{e.get('snippet')}"
-            for e in chunk
-        ])
-        for text_chunk in chunk_text(emails_text):
-            prompt = prompt_template.replace("{emails_text}", text_chunk)
-            summaries.append(summarize_with_backends(prompt))
+    concurrency = concurrency or SUMMARY_CONCURRENCY
+    on_item = None
+    if progress:
+        def on_item(kind: str, item):
+            if kind == "summary":
+                progress("summary_point", text=item)
+            elif kind == "reset":  # a backend died mid-answer: these points/actions are void
+                progress("reset", **item)
+            else:
+                progress("action", action=item)
+    progress = progress or _no_progress
+
+    if text_chunks is None:
+        text_chunks = plan_text_chunks(emails, prompt_template)
+    reduce = _use_reduce(len(text_chunks), mode)
+    map_on_item = None if reduce else on_item  # chunk points would be superseded by the merged digest
+
+    done = [0]
+    done_lock = threading.Lock()
+
+    def _run(text_chunk: str) -> Dict:
+        result = summarize_chunk(prompt_template, text_chunk, on_item=map_on_item)
+        with done_lock:
+            done[0] += 1
+            progress("summarized", chunk=done[0], total=len(text_chunks))
+        return result
+
+    summaries = _map_in_pool(_run, text_chunks, concurrency)
+    if reduce:
+        result = reduce_summaries(summaries, concurrency=concurrency, progress=progress)
+        if on_item:
+            _replay(result, on_item)
+        return result
 
     merged = {"summary_of_emails": [], "actions": []}
     for s in summaries:
@@ -170,38 +418,183 @@ def summarize_emails(emails: List[Dict]) -> Dict:
         merged["actions"].extend(s.get("actions", []))
     return merged
 
+def _reduce_group(reduce_template: str, group: List[Dict]) -> Dict:
+    """One reduce call; a failed call falls back to the local merge of its inputs."""
+    if len(group) == 1:
+        return group[0]
+    text = "\n\n".join(render_partial(p, i) for i, p in enumerate(group, 1))
+    with span("summarize.reduce"):
+        result = summarize_chunk(reduce_template, text)
+    merged = merge_partials([result], rank=False)  # trust the model's order, enforce the bounds
+    if not merged["summary_of_emails"] or result.get("summary_of_emails") in ([ERROR_SUMMARY], [NO_SUMMARY]):
+        # failed or unparseable answer: never let it swallow the group's digests
+        print("⚠️ Reduce call failed, merging its digests locally")
+        return merge_partials(group)
+    return merged
+
+def reduce_summaries(partials: List[Dict], concurrency: int = None, progress=None) -> Dict:
+    """
+    Merge chunk digests into one bounded, ranked digest. Each round packs up
+    to REDUCE_FANIN digests per reduce call (within the prompt token budget)
+    and runs the calls in parallel, so reduce calls grow ~n/(fanin-1) and
+    rounds ~log_fanin(n).
+    """
+    concurrency = concurrency or SUMMARY_CONCURRENCY
+    progress = progress or _no_progress
+    level = [p for p in partials if p.get("summary_of_emails") not in ([ERROR_SUMMARY], [NO_SUMMARY])] or partials
+    if len(level) <= 1:
+        return merge_partials(level, rank=False)
+    reduce_template = load_reduce_prompt()
+    backend = binding_backend([name for name, _ in BACKENDS])
+    count = get_token_counter(backend)
+    reserve = 0 if backend == "Local" else PROMPT_OUTPUT_RESERVE
+    available = max(64, token_budget(backend) - count(reduce_template.replace(PLACEHOLDER, "")) - reserve)
+    rounds = calls = 0
+    while len(level) > 1:
+        groups = group_partials(level, available, count, REDUCE_FANIN)
+        level = _map_in_pool(lambda group: _reduce_group(reduce_template, group), groups, concurrency)
+        rounds += 1
+        calls += sum(1 for g in groups if len(g) > 1)
+        progress("reduced", round=rounds, calls=calls, remaining=len(level))
+    get_registry().inc("reduce_calls", calls)
+    print(f"🧩 Merged {len(partials)} chunk digests in {rounds} reduce rounds ({calls} LLM calls)")
+    return level[0]
+
 # === Direct Summarize from payload ===
-def summarize_emails_direct(emails: list):
-    return summarize_emails(emails)
+def summarize_emails_direct(emails: list, progress=None):
+    return summarize_emails(emails, progress=progress)
+
+# === Near-duplicates ===
+def _dedup_stage(emails: List[Dict], progress) -> tuple:
+    """Collapse near-duplicates (dedup.py) into one representative each; returns (emails, report or None)."""
+    if not DEDUP_ENABLED or not emails:
+        return emails, None
+    with span("dedup"):
+        distinct, report = collapse(emails)
+    if report["collapsed"]:
+        get_registry().inc("collapsed_emails", report["collapsed"])
+        print(f"🧬 Collapsed {report['collapsed']} near-duplicate emails ({report['distinct']} distinct of {report['emails']})")
+    progress("dedup", **report)
+    return distinct, report
+
+# === Triage ===
+def _reduce_calls(n_chunks: int) -> int:
+    """Reduce calls reduce_summaries makes for n chunk digests, assuming REDUCE_FANIN digests fit per call."""
+    if not _use_reduce(n_chunks):
+        return 0
+    calls = 0
+    while n_chunks > 1:
+        groups = math.ceil(n_chunks / REDUCE_FANIN)
+        calls += groups - (n_chunks % REDUCE_FANIN == 1)  # a lone trailing digest passes through
+        n_chunks = groups
+    return calls
+
+def _plan_cost(chunks: List[str], prompt_template: str) -> Dict:
+    """LLM calls (map + reduce) and map prompt tokens summarize_emails would spend on planned chunks."""
+    count = get_token_counter(binding_backend([name for name, _ in BACKENDS]))
+    template_tokens = count(prompt_template.replace(PLACEHOLDER, ""))
+    return {"calls": len(chunks) + _reduce_calls(len(chunks)),
+            "tokens": sum(count(c) for c in chunks) + template_tokens * len(chunks)}
+
+def _triage_stage(emails: List[Dict], progress) -> tuple:
+    """
+    Pre-triage (triage.py): returns (emails for the LLM, templated summary
+    lines for the rest, savings report or None when disabled, the LLM
+    emails' planned chunks or None when not planned here).
+    """
+    if not TRIAGE_ENABLED or not emails:
+        return emails, [], None, None
+    with span("triage"):
+        keep, skipped = triage(emails, get_email_vectors(emails))
+        if not skipped:
+            return emails, [], {"triaged": 0, "llm_calls_saved": 0, "tokens_saved": 0}, None
+        prompt_template = load_prompt()
+        keep_chunks = plan_text_chunks(keep, prompt_template) if keep else []
+        before = _plan_cost(plan_text_chunks(emails, prompt_template), prompt_template)
+        after = _plan_cost(keep_chunks, prompt_template)
+    report = {
+        "triaged": len(emails) - len(keep),
+        "by_category": {category: len(group) for category, group in skipped.items()},
+        "llm_calls": after["calls"],
+        "llm_calls_saved": before["calls"] - after["calls"],
+        "tokens_saved": before["tokens"] - after["tokens"],
+    }
+    get_registry().inc("triaged_emails", report["triaged"])
+    get_registry().inc("llm_calls_saved", report["llm_calls_saved"])
+    get_registry().inc("prompt_tokens_saved", report["tokens_saved"])
+    print(f"🗂️ Triaged {report['triaged']} low-value emails locally: "
+          f"saved {report['llm_calls_saved']} LLM calls, ~{report['tokens_saved']} prompt tokens")
+    progress("triage", **report)
+    return keep, templated_summary(skipped), report, keep_chunks
+
+def _add_triage_lines(summary: Dict, triage_lines: List[str]) -> Dict:
+    """Templated triage lines only fill the room left under DIGEST_MAX_POINTS."""
+    points = summary["summary_of_emails"]
+    room = max(0, DIGEST_MAX_POINTS - len(points))
+    if len(triage_lines) > room:
+        print(f"✂️ Dropped {len(triage_lines) - room} triage lines to keep the digest within {DIGEST_MAX_POINTS} points")
+    points.extend(triage_lines[:room])
+    return summary
 
 # === Full Daily Pipeline ===
-def run_rag_daily(max_results: int = None) -> Dict:
+def run_rag_daily(max_results: int = None, progress=None, service=None, account_id: str = None,
+                  profile: bool = None) -> Dict:
+    """
+    Fetch → embed → summarize → log. service/account_id select the mailbox
+    (default: the single token.json account). The run's per-stage timings
+    are saved with its log; profile=True also records a cProfile (telemetry.py).
+    """
+    with start_run("summarize", profile=profile) as run:
+        return _run_rag_daily(max_results, progress, service, account_id, run)
+
+def _run_rag_daily(max_results, progress, service, account_id, run) -> Dict:
     if max_results is None:
         max_results = MAX_EMAIL_FETCH  # fallback to env value
-    emails = get_emails_from_last_24_hours(max_results=max_results)
+    progress = progress or _no_progress
+    if GMAIL_SYNC_MODE == "incremental":
+        # only messages not seen by an earlier run need embedding
+        emails, new_emails = sync_mailbox(max_results=max_results, service=service, account_id=account_id)
+    else:
+        emails = get_emails_from_last_24_hours(max_results=max_results, service=service, account_id=account_id)
+        new_emails = emails
+    progress("fetched", count=len(emails), new=len(new_emails))
     if not emails:
         return {"summary_of_emails": [], "actions": []}
 
-    essential_emails = ensure_essential(emails)
-    combined = emails + essential_emails
-    unique_dict = {get_email_unique_key(e): e for e in combined}
-    all_emails = list(unique_dict.values())
+    all_emails, essential_count = tag_essential(emails, key=get_email_unique_key)
+    if essential_count:
+        print(f"⭐ {essential_count} emails from essential senders")
 
     try:
-        upsert_emails(all_emails)
+        embedded = upsert_emails(new_emails, account_id=account_id) if new_emails else 0
+        progress("embedded", count=embedded)
     except Exception as e:
         print("⚠️ Qdrant upsert failed:", e)
 
-    summary = summarize_emails(all_emails)
+    distinct_emails, dedup_report = _dedup_stage(all_emails, progress)
+    llm_emails, triage_lines, triage_report, llm_chunks = _triage_stage(distinct_emails, progress)
+    summary = summarize_emails(llm_emails, progress=progress, text_chunks=llm_chunks)
+    _add_triage_lines(summary, triage_lines)
 
     os.makedirs(LOG_DIR, exist_ok=True)
     ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-    out_path = os.path.join(LOG_DIR, f"summary_{ts}.json")
+    suffix = f"_{account_id}" if account_id else ""
+    out_path = os.path.join(LOG_DIR, f"summary_{ts}{suffix}.json")
+    extra = {"account": account_id} if account_id else {}
+    if dedup_report:
+        extra["dedup"] = dedup_report
+    if triage_report:
+        extra["triage"] = triage_report
+    extra["timings"] = run.timings()
     try:
         with open(out_path, "w", encoding="utf-8") as f:
-            json.dump({"time": ts, "summary": summary, "count": len(all_emails)}, f, indent=2)
+            json.dump({"time": ts, "summary": summary, "count": len(all_emails), **extra}, f, indent=2)
     except Exception as e:
         print("⚠️ Failed to save summary log:", e)
+    try:
+        get_history_store().add(ts, summary, len(all_emails), extra=extra)
+    except Exception as e:
+        print("⚠️ Failed to record summary history:", e)
 
     return summary
 
@@ -0,0 +1,185 @@
+# app/services/summary_cache.py
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+SUMMARY_CACHE_BACKEND = os.getenv("SUMMARY_CACHE_BACKEND", "sqlite")  # sqlite | memory | none
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", "data/summary_cache.sqlite3")
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", 7 * 24 * 3600))  # seconds
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", 5000))
+
+
+def make_key(prompt_template: str, backend: str, chunk_text: str) -> str:
+    """Content address of a chunk summary: sha256 over (template, backend, chunk)."""
+    h = hashlib.sha256()
+    for part in (prompt_template, backend, chunk_text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+# === Storage backends ===
+class MemoryCacheBackend:
+    """Process-local store; entries are kept in LRU order."""
+
+    def __init__(self):
+        self._data = OrderedDict()
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is not None:
+            self._data.move_to_end(key)
+        return item
+
+    def set(self, key: str, value: str, created_at: float):
+        self._data[key] = (value, created_at)
+        self._data.move_to_end(key)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def count(self) -> int:
+        return len(self._data)
+
+    def evict(self, n: int):
+        for _ in range(min(n, len(self._data))):
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+class SQLiteCacheBackend:
+    """On-disk store; LRU order tracked through an indexed accessed_at column."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summary_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_summary_cache_accessed ON summary_cache(accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        row = self._conn.execute("SELECT value, created_at FROM summary_cache WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("UPDATE summary_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return row
+
+    def set(self, key: str, value: str, created_at: float):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO summary_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, value, created_at, time.time()),
+        )
+        self._conn.commit()
+
+    def delete(self, key: str):
+        self._conn.execute("DELETE FROM summary_cache WHERE key = ?", (key,))
+        self._conn.commit()
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM summary_cache").fetchone()[0]
+
+    def evict(self, n: int):
+        self._conn.execute(
+            "DELETE FROM summary_cache WHERE key IN "
+            "(SELECT key FROM summary_cache ORDER BY accessed_at ASC LIMIT ?)",
+            (n,),
+        )
+        self._conn.commit()
+
+    def clear(self):
+        self._conn.execute("DELETE FROM summary_cache")
+        self._conn.commit()
+
+
+CACHE_BACKENDS = {
+    "memory": lambda path: MemoryCacheBackend(),
+    "sqlite": lambda path: SQLiteCacheBackend(path),
+}
+
+
+# === Cache ===
+class SummaryCache:
+    """
+    TTL + size-bounded LRU cache of parsed chunk summaries.
+    Thread-safe; hit/miss counters are kept per process.
+    """
+
+    def __init__(self, backend, ttl: int = SUMMARY_CACHE_TTL, max_entries: int = SUMMARY_CACHE_MAX_ENTRIES):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._count = backend.count()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            item = self.backend.get(key)
+            if item is not None and self.ttl and time.time() - item[1] > self.ttl:
+                self.backend.delete(key)
+                self._count -= 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(item[0])
+
+    def set(self, key: str, value: Dict):
+        with self._lock:
+            if self.backend.get(key) is None:
+                self._count += 1
+            self.backend.set(key, json.dumps(value), time.time())
+            if self._count > self.max_entries:
+                self.backend.evict(self._count - self.max_entries)
+                self._count = self.max_entries
+
+    def clear(self):
+        with self._lock:
+            self.backend.clear()
+            self._count = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "entries": self._count,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache() -> Optional[SummaryCache]:
+    """Process-wide cache for the configured backend (None when disabled)."""
+    global _cache
+    if SUMMARY_CACHE_BACKEND == "none":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = SummaryCache(CACHE_BACKENDS[SUMMARY_CACHE_BACKEND](SUMMARY_CACHE_PATH))
+            except Exception as e:
+                print("⚠️ Summary cache unavailable, falling back to memory:", e)
+                _cache = SummaryCache(MemoryCacheBackend())
+        return _cache
@@ -0,0 +1,221 @@
+# app/services/telemetry.py
+"""
+Spans and timings for the pipeline.
+
+    with span("gmail.list"):
+        ...
+    with span("llm", backend="Perplexity"):
+        ...
+
+Every span feeds a process-wide histogram, served at /metrics in the
+Prometheus text format. While a pipeline run is active (start_run()), spans
+also add up into that run's timing breakdown, which is saved with its
+summary log. The run travels in a contextvar: hand work to a thread pool
+with submit_in_context() so worker spans are counted too.
+
+A run started with profile=True (or PROFILE_RUNS=true) also records a
+cProfile of the calling thread into PROFILE_DIR/profile_<kind>_<ts>.prof
+(plus a .txt with the top functions by cumulative time). Worker threads
+aren't profiled; set SUMMARY_CONCURRENCY=1 to keep the LLM calls on it.
+"""
+import os
+import time
+import cProfile
+import pstats
+import io
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+PROFILE_RUNS = os.getenv("PROFILE_RUNS", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.getenv("LOG_DIR", "logs"))
+METRICS_PREFIX = "mailsmart"
+SPAN_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]  # seconds
+
+_current_run: contextvars.ContextVar = contextvars.ContextVar("mailsmart_run", default=None)
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(SPAN_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool):
+        self.count += 1
+        self.sum += seconds
+        self.errors += int(error)
+        for i, bound in enumerate(SPAN_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._spans: Dict[tuple, _Histogram] = {}
+        self._counters: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, labels: Dict[str, str], seconds: float, error: bool = False):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._spans.get(key)
+            if hist is None:
+                hist = self._spans[key] = _Histogram()
+            hist.observe(seconds, error)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        def fmt(labels):
+            return ",".join(f'{k}="{str(v)}"' for k, v in labels)
+
+        metric = f"{METRICS_PREFIX}_span_seconds"
+        lines = [
+            f"# HELP {metric} Duration of pipeline spans.",
+            f"# TYPE {metric} histogram",
+        ]
+        with self._lock:
+            spans = sorted(self._spans.items())
+            counters = sorted(self._counters.items())
+            for (name, labels), hist in spans:
+                base = fmt((("span", name),) + labels)
+                for bound, n in zip(SPAN_BUCKETS, hist.buckets):
+                    lines.append(f'{metric}_bucket{{{base},le="{bound}"}} {n}')
+                lines.append(f'{metric}_bucket{{{base},le="+Inf"}} {hist.count}')
+                lines.append(f"{metric}_sum{{{base}}} {hist.sum:.6f}")
+                lines.append(f"{metric}_count{{{base}}} {hist.count}")
+            lines.append(f"# HELP {METRICS_PREFIX}_span_errors_total Spans that raised.")
+            lines.append(f"# TYPE {METRICS_PREFIX}_span_errors_total counter")
+            for (name, labels), hist in spans:
+                lines.append(f"{METRICS_PREFIX}_span_errors_total{{{fmt((('span', name),) + labels)}}} {hist.errors}")
+            for (name, labels), value in counters:
+                label_text = f"{{{fmt(labels)}}}" if labels else ""
+                lines.append(f"{METRICS_PREFIX}_{name}_total{label_text} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    return _registry
+
+
+class Run:
+    """Timing breakdown of one pipeline run: span key -> count/total/max ms."""
+
+    def __init__(self, kind: str, profile: bool = False):
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.wall_ms = None
+        self.spans: Dict[str, Dict] = {}
+        self.profiler = cProfile.Profile() if profile else None
+        self.profile_path = None
+        if profile:
+            ts = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
+            self.profile_path = os.path.join(PROFILE_DIR, f"profile_{kind}_{ts}.prof")
+        self._lock = threading.Lock()
+
+    def add(self, key: str, ms: float):
+        with self._lock:
+            entry = self.spans.setdefault(key, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+
+    def timings(self) -> Dict:
+        """Breakdown so far (wall time up to now if the run is still going)."""
+        wall = self.wall_ms if self.wall_ms is not None else (time.perf_counter() - self.started) * 1000
+        with self._lock:
+            spans = {
+                k: {"count": v["count"], "total_ms": round(v["total_ms"], 1), "max_ms": round(v["max_ms"], 1)}
+                for k, v in sorted(self.spans.items(), key=lambda kv: -kv[1]["total_ms"])
+            }
+        out = {"kind": self.kind, "wall_ms": round(wall, 1), "spans": spans}
+        if self.profile_path:
+            out["profile"] = self.profile_path
+        return out
+
+    def save_profile(self, top: int = 25) -> Optional[str]:
+        if not self.profiler:
+            return None
+        path = self.profile_path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(top)
+        with open(path + ".txt", "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        return path
+
+
+def current_run() -> Optional[Run]:
+    return _current_run.get()
+
+
+@contextmanager
+def start_run(kind: str, profile: bool = None):
+    """
+    Make a Run current for this context. Nested calls reuse the outer run,
+    so run_and_email_digest -> run_rag_daily is a single breakdown.
+    """
+    outer = _current_run.get()
+    if outer is not None:
+        yield outer
+        return
+    run = Run(kind, profile=PROFILE_RUNS if profile is None else profile)
+    token = _current_run.set(run)
+    if run.profiler:
+        run.profiler.enable()
+    try:
+        with span(f"run.{kind}"):
+            yield run
+    finally:
+        if run.profiler:
+            run.profiler.disable()
+            try:
+                print(f"🔬 Profile saved to {run.save_profile()}")
+            except Exception as e:
+                print("⚠️ Failed to save profile:", e)
+        run.wall_ms = (time.perf_counter() - run.started) * 1000
+        _current_run.reset(token)
+        _registry.inc("runs", kind=kind)
+
+
+def _span_key(name: str, labels: Dict[str, str]) -> str:
+    if not labels:
+        return name
+    return f"{name}[{','.join(str(v) for _, v in sorted(labels.items()))}]"
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Time a block: into the /metrics histogram and the current run's breakdown."""
+    t0 = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        seconds = time.perf_counter() - t0
+        _registry.observe(name, labels, seconds, error)
+        run = _current_run.get()
+        if run is not None:
+            run.add(_span_key(name, labels), seconds * 1000)
+
+
+def submit_in_context(pool, fn, *args, **kwargs):
+    """pool.submit that carries the current run (and other contextvars) into the worker."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -0,0 +1,174 @@
+# app/services/triage.py
+"""
+Local pre-triage ahead of the LLM. Promotions and social notifications are
+recognised from the From/Subject headers and from the MiniLM embeddings
+upsert_emails already stored (compared against a few prototype texts per
+category). They get a templated one-line summary instead of an LLM call.
+
+The embedding check works in both directions: content that looks like a
+payment, meeting, code or delivery keeps a promo-looking sender in the LLM
+path, and a clearly promotional email is caught without a header match.
+Emails tagged essential (sender_rules.py) always go to the LLM.
+"""
+import os
+import re
+import threading
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from app.services.lexical_index import normalize_sender
+load_dotenv()
+
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "true").lower() in ("1", "true", "yes")
+TRIAGE_CATEGORIES = [c.strip() for c in os.getenv("TRIAGE_CATEGORIES", "Promotions,Social").split(",") if c.strip()]
+TRIAGE_EMBED_MARGIN = float(os.getenv("TRIAGE_EMBED_MARGIN", 0.08))  # cosine gap needed to override / decide
+
+_SENDER_RULES = {
+    "Promotions": re.compile(r"^(newsletters?|news|promo(tions)?|offers?|deals?|marketing|sales|shop|store)@"),
+    "Social": re.compile(r"@(\w+\.)*(facebookmail\.com|linkedin\.com|twitter\.com|x\.com|instagram\.com|pinterest\.com|reddit\.com|quora\.com)$"),
+}
+_SUBJECT_RULES = {
+    "Promotions": re.compile(
+        r"\d{1,2}\s?% off|\b(sale|deals?|discount|coupon|promo code|free shipping|limited time|shop now|"
+        r"black friday|cyber monday|new arrivals|last chance)\b"
+    ),
+    "Social": re.compile(
+        r"\b(liked your|commented on|mentioned you|followed you|new followers?|friend request|"
+        r"connection request|tagged you|reacted to|people you may know)\b"
+    ),
+}
+# never triaged, whatever the sender looks like
+_KEEP_SUBJECT = re.compile(
+    r"\b(otp|verification code|security (alert|code)|password|invoice|payment|statement|receipt|refund|"
+    r"debit(ed)?|credit(ed)?|transaction|withdrawal|"
+    r"order|shipped|delivery|interview|meeting|deadline|due|booking|itinerary)\b"
+)
+
+_PROTOTYPES = {
+    "Promotions": [
+        "Huge sale this weekend: 50% off everything, shop now",
+        "Exclusive offer just for you, use this coupon code at checkout",
+        "Our weekly newsletter with new arrivals and the best deals",
+    ],
+    "Social": [
+        "Someone liked your post and commented on your photo",
+        "You have a new follower and 3 new notifications",
+        "You have a new connection request and people you may know",
+    ],
+    "keep": [
+        "Your payment is due and your bank statement is ready",
+        "Meeting tomorrow about the project deadline",
+        "Your one-time verification code to sign in",
+        "Your order has shipped and will be delivered today",
+        "Interview schedule and next steps for your application",
+        "Flight booking confirmation and travel itinerary",
+    ],
+}
+
+_prototypes = None  # (labels per row, normalised matrix), encoded once per process
+_prototypes_lock = threading.Lock()
+
+
+def _prototype_matrix() -> Tuple[List[str], np.ndarray]:
+    global _prototypes
+    if _prototypes is None:
+        with _prototypes_lock:
+            if _prototypes is None:
+                from app.services.embeddings import get_embeddings
+                labels = [label for label, texts in _PROTOTYPES.items() for _ in texts]
+                mat = get_embeddings([t for texts in _PROTOTYPES.values() for t in texts])
+                mat = mat / np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12)
+                _prototypes = (labels, mat)
+    return _prototypes
+
+
+def header_category(email: Dict) -> Optional[str]:
+    address = normalize_sender(email.get("from") or "")
+    subject = (email.get("subject") or "").lower()
+    if _KEEP_SUBJECT.search(subject):
+        return None
+    for category in TRIAGE_CATEGORIES:
+        sender_rule, subject_rule = _SENDER_RULES.get(category), _SUBJECT_RULES.get(category)
+        if (sender_rule and sender_rule.search(address)) or (subject_rule and subject_rule.search(subject)):
+            return category
+    return None
+
+
+def _embedding_scores(vectors: List[Optional[np.ndarray]]) -> List[Optional[Dict[str, float]]]:
+    """Best prototype similarity per label for each vector (None where no vector)."""
+    present = [i for i, v in enumerate(vectors) if v is not None]
+    scores: List[Optional[Dict[str, float]]] = [None] * len(vectors)
+    if not present:
+        return scores
+    labels, protos = _prototype_matrix()
+    mat = np.asarray([vectors[i] for i in present], dtype=np.float32)
+    if mat.shape[1] != protos.shape[1]:
+        return scores
+    mat = mat / np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12)
+    sims = mat @ protos.T
+    for row, i in enumerate(present):
+        best: Dict[str, float] = {}
+        for label, sim in zip(labels, sims[row]):
+            best[label] = max(best.get(label, -1.0), float(sim))
+        scores[i] = best
+    return scores
+
+
+def must_keep(email: Dict) -> bool:
+    """Essential senders and transactional subjects (payments, orders, OTPs) always reach the LLM as they are."""
+    return bool(email.get("essential") or _KEEP_SUBJECT.search((email.get("subject") or "").lower()))
+
+
+def classify(email: Dict, scores: Dict[str, float] = None) -> Optional[str]:
+    """Low-value category for an email, or None if it should go to the LLM."""
+    if must_keep(email):
+        return None
+    category = header_category(email)
+    if not scores:
+        return category
+    keep = scores.get("keep", -1.0)
+    if category is not None:
+        # header says promo/social, content says otherwise -> let the LLM read it
+        return None if keep - scores.get(category, -1.0) >= TRIAGE_EMBED_MARGIN else category
+    candidates = [(scores.get(c, -1.0), c) for c in TRIAGE_CATEGORIES if c in scores]
+    if candidates:
+        best, best_category = max(candidates)
+        if best - keep >= TRIAGE_EMBED_MARGIN:
+            return best_category
+    return None
+
+
+def triage(emails: List[Dict], vectors: List[Optional[np.ndarray]] = None) -> Tuple[List[Dict], Dict[str, List[Dict]]]:
+    """Split emails into (for the LLM, {category: skipped emails})."""
+    scores = _embedding_scores(vectors) if vectors is not None else [None] * len(emails)
+    keep, skipped = [], {}
+    for email, s in zip(emails, scores):
+        category = classify(email, s)
+        if category is None:
+            keep.append(email)
+        else:
+            skipped.setdefault(category, []).append(email)
+    return keep, skipped
+
+
+def _sender_name(sender: str) -> str:
+    name, address = parseaddr(sender or "")
+    return name or address or "Unknown Sender"
+
+
+def templated_summary(skipped: Dict[str, List[Dict]], max_subjects: int = 2) -> List[str]:
+    """One summary line per (category, sender), in the LLM's "📂 Category: ..." format."""
+    lines = []
+    for category, emails in skipped.items():
+        by_sender: Dict[str, List[Dict]] = {}
+        for e in emails:
+            by_sender.setdefault(_sender_name(e.get("from")), []).append(e)
+        for sender, group in by_sender.items():
+            subjects = "; ".join(str(e.get("subject") or "No Subject") for e in group[:max_subjects])
+            more = f" (+{len(group) - max_subjects} more)" if len(group) > max_subjects else ""
+            total = sum(1 + (e.get("similar") or 0) for e in group)  # near-duplicates collapsed by dedup.py
+            count = f"{total} emails" if total > 1 else "1 email"
+            lines.append(f"📂 {category}: {count} from {sender}: {subjects}{more}")
+    return lines
@@ -1,68 +1,534 @@
 # app/services/vector_store.py
 import os
 import uuid
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+import numpy as np
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.http import models
-from app.services.embeddings import get_embedding
+from app.services.embeddings import get_embedding, get_embeddings, EMB_DIM
+from app.services.telemetry import span
+from app.services.lexical_index import LexicalIndex, looks_lexical, normalize_sender
+from app.services.accounts import DEFAULT_ACCOUNT
 
 load_dotenv()
 
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", None)
 COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "mailsmart_emails")
+UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH", 256))
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() in ("1", "true", "yes")
+QDRANT_ASYNC = os.getenv("QDRANT_ASYNC", "false").lower() in ("1", "true", "yes")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")  # qdrant | local
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")  # hybrid | vector | lexical
+SEARCH_RRF_K = int(os.getenv("SEARCH_RRF_K", 60))
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", 50))  # per engine, before fusion
+SEARCH_MODES = ("hybrid", "vector", "lexical")
+VECTOR_CACHE_SIZE = int(os.getenv("VECTOR_CACHE_SIZE", 20000))  # recent embeddings kept for reuse (triage)
+
+# process-wide clients, created on first use
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+_collection_ready = False
+
+
+def _client_kwargs() -> dict:
+    kwargs = {"url": QDRANT_URL, "prefer_grpc": QDRANT_PREFER_GRPC}
+    if QDRANT_API_KEY:
+        kwargs["api_key"] = QDRANT_API_KEY
+    return kwargs
 
 
 # init client
 def _get_client():
-    if QDRANT_API_KEY:
-        return QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-    return QdrantClient(url=QDRANT_URL)
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = QdrantClient(**_client_kwargs())
+    return _client
+
+
+def _get_async_client():
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncQdrantClient(**_client_kwargs())
+    return _async_client
+
+
+def close_clients():
+    """Drop pooled clients (app shutdown / tests). Next call reconnects."""
+    global _client, _async_client, _collection_ready, _backend, _lexical
+    with _client_lock:
+        if _client is not None:
+            try:
+                _client.close()
+            except Exception:
+                pass
+        _client, _async_client, _collection_ready, _backend, _lexical = None, None, False, None, None
+
+
+def _vectors_config():
+    return models.VectorParams(size=EMB_DIM, distance=models.Distance.COSINE)
+
+
+# payload fields search filters run on
+_PAYLOAD_INDEXES = {
+    "sender": models.PayloadSchemaType.KEYWORD,
+    "date": models.PayloadSchemaType.INTEGER,
+    "account": models.PayloadSchemaType.KEYWORD,
+}
 
 
 def ensure_collection():
+    """Create the collection if needed; the check runs once per process."""
+    global _collection_ready
+    if _collection_ready:
+        return
     client = _get_client()
     try:
         client.get_collection(COLLECTION_NAME)
     except Exception:
-        # create with vector size 384 for all-MiniLM-L6-v2
-        client.recreate_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=models.VectorParams(size=384, distance=models.Distance.COSINE)
-        )
+        client.recreate_collection(collection_name=COLLECTION_NAME, vectors_config=_vectors_config())
+    for field, schema in _PAYLOAD_INDEXES.items():
+        try:
+            client.create_payload_index(COLLECTION_NAME, field_name=field, field_schema=schema)
+        except Exception as e:
+            print(f"⚠️ Could not create payload index on {field}: {e}")
+    _collection_ready = True
 
 
-def upsert_emails(emails: list):
-    """Insert or update emails into Qdrant with deterministic UUIDs"""
-    client = _get_client()
-    ensure_collection()
-    points = []
+async def ensure_collection_async():
+    global _collection_ready
+    if _collection_ready:
+        return
+    client = _get_async_client()
+    try:
+        await client.get_collection(COLLECTION_NAME)
+    except Exception:
+        await client.recreate_collection(collection_name=COLLECTION_NAME, vectors_config=_vectors_config())
+    for field, schema in _PAYLOAD_INDEXES.items():
+        try:
+            await client.create_payload_index(COLLECTION_NAME, field_name=field, field_schema=schema)
+        except Exception as e:
+            print(f"⚠️ Could not create payload index on {field}: {e}")
+    _collection_ready = True
+
+
+def _email_doc_text(e: dict) -> str:
+    return f"{e.get('from','')}\n{e.get('subject','')}\n{e.get('snippet','')}"
+
+
+def _point_id(e: dict, idx: int) -> str:
+    # ✅ Convert Gmail ID (string) → deterministic UUID
+    raw_id = str(e.get("id", idx))
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, raw_id))
+
+
+def _content_hash(doc_text: str, date=None) -> str:
+    # the date is part of the hash so points written before payloads carried it get rewritten once
+    return hashlib.sha256(f"{doc_text}\n{date}".encode("utf-8")).hexdigest()
+
+
+def to_epoch(value):
+    """Epoch seconds from an int/float, a digit string or an ISO date/datetime (naive = UTC)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).strip())
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def make_filters(sender: str = None, after=None, before=None, account: str = None):
+    """
+    Search filters ({"sender", "after", "before", "account"}). Searches are
+    always scoped to one mailbox account (DEFAULT_ACCOUNT when not given).
+    """
+    return {
+        "sender": normalize_sender(sender) if sender else None,
+        "after": to_epoch(after),
+        "before": to_epoch(before),
+        "account": account or DEFAULT_ACCOUNT,
+    }
+
+
+def _qdrant_filter(filters):
+    if not filters:
+        return None
+    must = []
+    account = filters.get("account")
+    if account == DEFAULT_ACCOUNT:
+        # points written before payloads carried an account belong to the default mailbox
+        must.append(models.Filter(should=[
+            models.FieldCondition(key="account", match=models.MatchValue(value=account)),
+            models.IsEmptyCondition(is_empty=models.PayloadField(key="account")),
+        ]))
+    elif account:
+        must.append(models.FieldCondition(key="account", match=models.MatchValue(value=account)))
+    if filters.get("sender"):
+        must.append(models.FieldCondition(key="sender", match=models.MatchValue(value=filters["sender"])))
+    if filters.get("after") is not None or filters.get("before") is not None:
+        must.append(models.FieldCondition(key="date", range=models.Range(gte=filters.get("after"), lt=filters.get("before"))))
+    return models.Filter(must=must)
+
+
+# === Backends ===
+class QdrantBackend:
+    """Remote Qdrant collection (pooled client, see _get_client)."""
+
+    def get_hashes(self, point_ids: list, batch_size: int = UPSERT_BATCH_SIZE) -> dict:
+        """Bulk-fetch stored content hashes for point ids (missing ids are absent)."""
+        client = _get_client()
+        ensure_collection()
+        hashes = {}
+        for start in range(0, len(point_ids), batch_size):
+            records = client.retrieve(
+                collection_name=COLLECTION_NAME,
+                ids=point_ids[start:start + batch_size],
+                with_payload=["content_hash"],
+                with_vectors=False
+            )
+            for r in records:
+                hashes[str(r.id)] = (r.payload or {}).get("content_hash")
+        return hashes
+
+    def get_vectors(self, point_ids: list, batch_size: int = UPSERT_BATCH_SIZE) -> dict:
+        client = _get_client()
+        ensure_collection()
+        vectors = {}
+        for start in range(0, len(point_ids), batch_size):
+            records = client.retrieve(
+                collection_name=COLLECTION_NAME,
+                ids=point_ids[start:start + batch_size],
+                with_payload=False,
+                with_vectors=True
+            )
+            for r in records:
+                if r.vector is not None:
+                    vectors[str(r.id)] = np.asarray(r.vector, dtype=np.float32)
+        return vectors
+
+    def upsert(self, point_ids: list, vectors, payloads: list, batch_size: int = UPSERT_BATCH_SIZE):
+        client = _get_client()
+        ensure_collection()
+        points = [
+            models.PointStruct(id=pid, vector=vec.tolist(), payload=payload)
+            for pid, vec, payload in zip(point_ids, vectors, payloads)
+        ]
+        for start in range(0, len(points), batch_size):
+            client.upsert(collection_name=COLLECTION_NAME, points=points[start:start + batch_size])
+
+    def delete(self, point_ids: list):
+        client = _get_client()
+        ensure_collection()
+        client.delete(collection_name=COLLECTION_NAME, points_selector=models.PointIdsList(points=point_ids))
+
+    def search(self, q_vec, top_k: int, filters: dict = None) -> list:
+        global _collection_ready
+        client = _get_client()
+        ensure_collection()
+        try:
+            results = client.search(
+                collection_name=COLLECTION_NAME,
+                query_vector=list(q_vec),
+                query_filter=_qdrant_filter(filters),
+                limit=top_k,
+                with_payload=True
+            )
+        except Exception:
+            # collection may have been dropped server-side; re-check next time
+            _collection_ready = False
+            raise
+        return _format_results(results)
+
+    async def search_async(self, q_vec, top_k: int, filters: dict = None) -> list:
+        global _collection_ready
+        client = _get_async_client()
+        await ensure_collection_async()
+        try:
+            results = await client.search(
+                collection_name=COLLECTION_NAME,
+                query_vector=list(q_vec),
+                query_filter=_qdrant_filter(filters),
+                limit=top_k,
+                with_payload=True
+            )
+        except Exception:
+            _collection_ready = False
+            raise
+        return _format_results(results)
+
+
+class LocalBackend:
+    """In-process memmap index (app/services/local_index.py); no network hops."""
+
+    def __init__(self, path: str = None):
+        from app.services.local_index import LocalVectorIndex
+        self.index = LocalVectorIndex(path)
+
+    def get_hashes(self, point_ids: list, batch_size: int = UPSERT_BATCH_SIZE) -> dict:
+        return self.index.get_hashes(point_ids)
+
+    def get_vectors(self, point_ids: list, batch_size: int = UPSERT_BATCH_SIZE) -> dict:
+        return self.index.get_vectors(point_ids)
+
+    def upsert(self, point_ids: list, vectors, payloads: list, batch_size: int = UPSERT_BATCH_SIZE):
+        for start in range(0, len(point_ids), batch_size):
+            end = start + batch_size
+            self.index.upsert(point_ids[start:end], vectors[start:end], payloads[start:end])
+
+    def delete(self, point_ids: list):
+        self.index.delete(point_ids)
+
+    def search(self, q_vec, top_k: int, filters: dict = None) -> list:
+        return self.index.search(q_vec, top_k, filters=filters)
+
+    async def search_async(self, q_vec, top_k: int, filters: dict = None) -> list:
+        return await asyncio.to_thread(self.search, q_vec, top_k, filters)
+
+
+VECTOR_BACKENDS = {
+    "qdrant": QdrantBackend,
+    "local": LocalBackend,
+}
+_backend = None
+
+
+def get_backend():
+    """Process-wide vector store backend selected by VECTOR_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _client_lock:
+            if _backend is None:
+                _backend = VECTOR_BACKENDS[VECTOR_BACKEND]()
+    return _backend
+
+
+_lexical = None
+_recent_vectors = OrderedDict()  # point id -> (content hash, vector), LRU
+_recent_lock = threading.Lock()
+
+
+def get_lexical_index() -> LexicalIndex:
+    """Process-wide BM25 index (LEXICAL_INDEX_PATH), loaded on first use."""
+    global _lexical
+    if _lexical is None:
+        with _client_lock:
+            if _lexical is None:
+                _lexical = LexicalIndex()
+    return _lexical
+
+
+def _format_results(results) -> list:
+    return [{"id": str(r.id), "score": r.score, "payload": r.payload} for r in results]
+
+
+# === Public API ===
+def _payload(e: dict, content_hash: str, account: str = None) -> dict:
+    payload = {
+        "from": e.get("from"),
+        "subject": e.get("subject"),
+        "snippet": e.get("snippet"),
+        "sender": normalize_sender(e.get("from")),
+        "date": e.get("date"),
+        "account": account or DEFAULT_ACCOUNT,
+        "content_hash": content_hash
+    }
+    if e.get("thread_id"):  # thread record (gmail_service thread mode)
+        payload["thread_id"] = e["thread_id"]
+        payload["messages"] = e.get("messages")
+    return payload
+
+
+def _upsert_lexical(docs: dict, account: str = None):
+    """Index new/changed emails for BM25; independent of the vector skip, so it also backfills."""
+    lexical = get_lexical_index()
+    stored = lexical.get_hashes(list(docs))
+    account = account or DEFAULT_ACCOUNT
+    changed = [
+        {"id": pid, "text": text, "content_hash": h, "sender": e.get("from"), "date": e.get("date"),
+         "account": account, "payload": _payload(e, h, account)}
+        for pid, (e, text, h) in docs.items() if stored.get(pid) != h
+    ]
+    if changed:
+        with span("lexical.upsert"):
+            lexical.upsert(changed)
+
+
+def upsert_emails(emails: list, batch_size: int = None, account_id: str = None) -> int:
+    """
+    Insert or update emails in the vector store with deterministic UUIDs.
+    Emails whose point already exists with the same content hash are skipped;
+    the rest are embedded in one batched encode and written in fixed-size
+    upsert batches. The BM25 index is updated alongside. Points are tagged
+    with account_id (DEFAULT_ACCOUNT when None) so searches stay per mailbox.
+    Returns the number of points written.
+    """
+    if not emails:
+        return 0
+    backend = get_backend()
+    batch_size = batch_size or UPSERT_BATCH_SIZE
+
+    # last occurrence wins if the same Gmail id shows up twice
+    docs = {}
     for idx, e in enumerate(emails):
-        doc_text = f"{e.get('from','')}\n{e.get('subject','')}\n{e.get('snippet','')}"
-        vec = get_embedding(doc_text)
-        payload = {
-            "from": e.get("from"),
-            "subject": e.get("subject"),
-            "snippet": e.get("snippet")
-        }
-        # ✅ Convert Gmail ID (string) → deterministic UUID
-        raw_id = str(e.get("id", idx))
-        safe_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, raw_id))
-        points.append(models.PointStruct(id=safe_id, vector=vec, payload=payload))
-    client.upsert(collection_name=COLLECTION_NAME, points=points)
-
-
-def search_emails(query: str, top_k: int = 5):
-    client = _get_client()
-    ensure_collection()
+        doc_text = _email_doc_text(e)
+        docs[_point_id(e, idx)] = (e, doc_text, _content_hash(doc_text, e.get("date")))
+
+    _upsert_lexical(docs, account_id)
+    with span("vector.lookup", backend=VECTOR_BACKEND):
+        stored = backend.get_hashes(list(docs), batch_size=batch_size)
+    changed = [(pid, e, text, h) for pid, (e, text, h) in docs.items() if stored.get(pid) != h]
+    if not changed:
+        print(f"⏭️ All {len(docs)} emails already indexed, nothing to embed")
+        return 0
+
+    vectors = get_embeddings([text for _, _, text, _ in changed])
+    _remember_vectors([(pid, h) for pid, _, _, h in changed], vectors)
+    payloads = [_payload(e, h, account_id) for _, e, _, h in changed]
+    with span("vector.upsert", backend=VECTOR_BACKEND):
+        backend.upsert([pid for pid, _, _, _ in changed], vectors, payloads, batch_size=batch_size)
+    print(f"🧠 Embedded {len(changed)} new/changed emails, skipped {len(docs) - len(changed)} unchanged")
+    return len(changed)
+
+
+def _remember_vectors(keys: list, vectors):
+    if VECTOR_CACHE_SIZE <= 0:
+        return
+    with _recent_lock:
+        for (pid, h), vec in zip(keys, vectors):
+            _recent_vectors[pid] = (h, vec)
+            _recent_vectors.move_to_end(pid)
+        while len(_recent_vectors) > VECTOR_CACHE_SIZE:
+            _recent_vectors.popitem(last=False)
+
+
+def get_email_vectors(emails: list) -> list:
+    """
+    Embeddings upsert_emails already computed for these emails, aligned with
+    the list (None where unknown): recent ones from memory, older ones read
+    back from the store. Never runs the embedding model.
+    """
+    keys = []
+    for idx, e in enumerate(emails):
+        keys.append((_point_id(e, idx), _content_hash(_email_doc_text(e), e.get("date"))))
+    found = {}
+    with _recent_lock:
+        for pid, h in keys:
+            hit = _recent_vectors.get(pid)
+            if hit is not None and hit[0] == h:
+                found[pid] = hit[1]
+    missing = list(dict.fromkeys(pid for pid, _ in keys if pid not in found))
+    if missing:
+        try:
+            found.update(get_backend().get_vectors(missing))
+        except Exception as e:
+            print("⚠️ Could not read stored vectors:", e)
+    return [found.get(pid) for pid, _ in keys]
+
+
+def delete_emails(gmail_ids: list):
+    """Remove emails (by Gmail id) from the vector store and the BM25 index."""
+    if gmail_ids:
+        point_ids = [_point_id({"id": gid}, 0) for gid in gmail_ids]
+        get_backend().delete(point_ids)
+        get_lexical_index().delete(point_ids)
+
+
+def fuse_results(result_lists: list, top_k: int, k: int = None) -> list:
+    """
+    Reciprocal rank fusion: score = sum of 1 / (k + rank) over the lists a
+    hit appears in. Only ranks matter, so BM25 and cosine scores need no
+    calibration against each other.
+    """
+    k = k or SEARCH_RRF_K
+    fused = {}
+    for results in result_lists:
+        for rank, r in enumerate(results, 1):
+            entry = fused.setdefault(r["id"], {"id": r["id"], "score": 0.0, "payload": r["payload"]})
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda r: -r["score"])[:top_k]
+
+
+def _search_plan(query: str, top_k: int, mode: str):
+    mode = mode or SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode} (expected one of {', '.join(SEARCH_MODES)})")
+    routed = mode == "hybrid" and (not (query or "").strip() or looks_lexical(query))
+    if routed:
+        mode = "lexical"  # identifiers: skip the embedding model entirely
+    candidates = top_k if mode != "hybrid" else max(top_k, SEARCH_CANDIDATES)
+    return mode, candidates, routed
+
+
+def _lexical_search(query: str, candidates: int, filters) -> list:
+    with span("lexical.search"):
+        return get_lexical_index().search(query, candidates, **(filters or {}))
+
+
+def _browse(filters, top_k: int, sender, after, before) -> list:
+    # nothing to match or embed: without a sender/date filter there is nothing to return
+    if sender is None and after is None and before is None:
+        return []
+    return _lexical_search("", top_k, filters)[:top_k]
+
+
+def search_emails(query: str, top_k: int = 5, sender: str = None, after=None, before=None, mode: str = None,
+                  account: str = None):
+    """
+    Search indexed emails. mode (SEARCH_MODE by default):
+      - hybrid: BM25 and vector top candidates fused by reciprocal rank;
+        identifier-like queries (addresses, codes) go lexical-only
+      - vector / lexical: one engine only
+    sender / after / before (epoch seconds or ISO dates, before exclusive)
+    are pushed down into both the BM25 index and the vector store, as is
+    the mailbox account (DEFAULT_ACCOUNT when None). An empty query only
+    browses the filtered emails, newest first, and never embeds.
+    """
+    mode, candidates, routed = _search_plan(query, top_k, mode)
+    filters = make_filters(sender, after, before, account)
+    if not (query or "").strip():
+        return _browse(filters, top_k, sender, after, before)
+    lexical = []
+    if mode != "vector":
+        lexical = _lexical_search(query, candidates, filters)
+        if mode == "lexical":
+            if lexical or not routed:
+                return lexical[:top_k]
+            mode = "vector"  # no exact match for the identifier, fall back to meaning
     q_vec = get_embedding(query)
-    results = client.search(
-        collection_name=COLLECTION_NAME,
-        query_vector=q_vec,
-        limit=top_k,
-        with_payload=True
-    )
-    out = []
-    for r in results:
-        out.append({"id": r.id, "score": r.score, "payload": r.payload})
-    return out
\ No newline at end of file
+    with span("vector.search", backend=VECTOR_BACKEND):
+        dense = get_backend().search(q_vec, candidates, filters=filters)
+    return dense[:top_k] if mode == "vector" else fuse_results([dense, lexical], top_k)
+
+
+async def search_emails_async(query: str, top_k: int = 5, sender: str = None, after=None, before=None, mode: str = None,
+                              account: str = None):
+    """search_emails for async handlers: encode off the event loop, then an async search."""
+    mode, candidates, routed = _search_plan(query, top_k, mode)
+    filters = make_filters(sender, after, before, account)
+    if not (query or "").strip():
+        return await asyncio.to_thread(_browse, filters, top_k, sender, after, before)
+    lexical = []
+    if mode != "vector":
+        lexical = await asyncio.to_thread(_lexical_search, query, candidates, filters)
+        if mode == "lexical":
+            if lexical or not routed:
+                return lexical[:top_k]
+            mode = "vector"  # no exact match for the identifier, fall back to meaning
+    q_vec = await asyncio.to_thread(get_embedding, query)
+    with span("vector.search", backend=VECTOR_BACKEND):
+        dense = await get_backend().search_async(q_vec, candidates, filters=filters)
+    return dense[:top_k] if mode == "vector" else fuse_results([dense, lexical], top_k)
@@ -0,0 +1,55 @@
+# benchmarks/bench_chunking.py
+"""
+Prompt planning before/after: fixed CHUNK_SIZE chunks vs token-budget
+packing, on synthetic mailboxes. Counts calls and prompt tokens only; no
+backend is called.
+
+    python -m benchmarks.bench_chunking --emails 20 100 500 --backend Perplexity
+"""
+import argparse
+import random
+
+from app.services import summarizer
+from app.services.chunk_planner import get_token_counter, token_budget, token_counter_kind, PLACEHOLDER
+
+WORDS = "invoice meeting update payment order shipped account review team report offer travel booking flight".split()
+
+
+def synthetic_mailbox(n: int, seed: int = 0):
+    """Mostly Gmail-snippet sized mail, with a tail of long bodies (forwarded threads, newsletters)."""
+    rng = random.Random(seed)
+    emails = []
+    for i in range(n):
+        length = rng.choice([5, 20, 30, 40, 40, 40]) if rng.random() < 0.9 else rng.randint(400, 2500)
+        emails.append({
+            "id": f"m{i:06d}",
+            "from": f"sender{rng.randint(0, 50)}@example.com",
+            "subject": " ".join(rng.choices(WORDS, k=rng.randint(2, 8))),
+            "snippet": " ".join(rng.choices(WORDS, k=length)),
+        })
+    return emails
+
+
+def run(sizes, backend: str):
+    template = summarizer.load_prompt()
+    count = get_token_counter(backend)
+    budget = token_budget(backend)
+    summarizer.BACKENDS = [(backend, None)]
+    print(f"backend={backend} counter={token_counter_kind(backend)} budget={budget} tokens "
+          f"template={count(template.replace(PLACEHOLDER, ''))} tokens")
+    for n in sizes:
+        emails = synthetic_mailbox(n)
+        for strategy in ("fixed", "tokens"):
+            chunks = summarizer.plan_text_chunks(emails, template, strategy=strategy)
+            prompt_tokens = [count(template.replace(PLACEHOLDER, c)) for c in chunks]
+            over = sum(1 for t in prompt_tokens if t > budget)
+            print(f"emails={n:<5} {strategy:<6} calls={len(chunks):<5} tokens_sent={sum(prompt_tokens):<8} "
+                  f"max_prompt={max(prompt_tokens):<6} over_budget={over}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--backend", default="Perplexity", choices=["Perplexity", "Gemini", "Local"])
+    args = parser.parse_args()
+    run(args.emails, args.backend)
@@ -0,0 +1,38 @@
+# benchmarks/bench_embeddings.py
+"""
+Per-item vs batched SentenceTransformer encoding on CPU.
+
+    python -m benchmarks.bench_embeddings --emails 1000 --batch-size 64
+"""
+import argparse
+import time
+
+from app.services import embeddings
+from tests.fakes import make_mailbox
+
+
+def run(n: int, batch_size: int):
+    texts = [embeddings.email_to_text(e) for e in make_mailbox(n)]
+    embeddings.get_embedding("warm-up")
+
+    t0 = time.perf_counter()
+    for t in texts:
+        embeddings.get_embedding(t)
+    per_item = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    mat = embeddings.get_embeddings(texts, batch_size=batch_size)
+    batched = time.perf_counter() - t0
+
+    print(f"model={embeddings.EMB_MODEL} emails={n} dim={mat.shape[1]}")
+    print(f"per-item : {per_item:7.2f}s  ({n / per_item:8.1f} emails/s)")
+    print(f"batched  : {batched:7.2f}s  ({n / batched:8.1f} emails/s)  batch_size={batch_size}")
+    print(f"speedup  : {per_item / batched:5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=embeddings.EMB_BATCH_SIZE)
+    args = parser.parse_args()
+    run(args.emails, args.batch_size)
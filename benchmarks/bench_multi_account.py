@@ -0,0 +1,95 @@
+# benchmarks/bench_multi_account.py
+"""
+Load test for multi-account digests: hundreds of accounts, each with its own
+fake Gmail mailbox, stub LLM backend with latency, no embeddings (upserts
+are counted, not encoded; the vector store is a FakeQdrantClient), all state
+in a temp dir. warnings= counts the "⚠️" lines the runs printed.
+
+    python -m benchmarks.bench_multi_account --accounts 300 --workers 4 16 32
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import tempfile
+import time
+
+from app.services import digest_runner, gmail_service, scheduler, summarizer, vector_store
+from app.services.accounts import _with_defaults
+from app.services.history_store import HistoryStore
+from app.services.lexical_index import LexicalIndex
+from benchmarks.bench_pipeline import percentile
+from tests.fakes import FakeGmailService, FakeQdrantClient, make_mailbox
+
+
+def stub_backend(latency: float):
+    def call(prompt: str):
+        time.sleep(latency)
+        return {"choices": [{"message": {"content": '{"summary_of_emails": ["📂 Other: stub"], "actions": []}'}}]}
+    return call
+
+
+def run(n_accounts: int, emails: int, gmail_latency: float, llm_latency: float, workers_levels, jitter: float):
+    tmp = tempfile.mkdtemp(prefix="mailsmart-bench-")
+    summarizer.BACKENDS = [("Stub", stub_backend(llm_latency))]
+    summarizer.get_summary_cache = lambda: None
+    summarizer.upsert_emails = lambda new_emails, batch_size=None, account_id=None: len(new_emails)
+    # offline vector store, as in bench_pipeline.fresh_vector_store (triage reads stored vectors)
+    client = FakeQdrantClient()
+    vector_store.VECTOR_BACKEND = "qdrant"
+    vector_store._backend = None
+    vector_store._get_client = lambda: client
+    vector_store.ensure_collection = lambda: None
+    vector_store._lexical = LexicalIndex(f"{tmp}/lexical.sqlite3")
+    summarizer.LOG_DIR = tmp
+    store = HistoryStore(f"{tmp}/history.sqlite3")
+    summarizer.get_history_store = lambda: store
+
+    timings = []
+    job_wrapper = scheduler._job_wrapper
+
+    def timed_wrapper(account_id=None, max_results=None):
+        t0 = time.perf_counter()
+        try:
+            return job_wrapper(account_id, max_results)
+        finally:
+            timings.append(time.perf_counter() - t0)
+
+    scheduler._job_wrapper = timed_wrapper
+
+    for workers in workers_levels:
+        gmail_service.SYNC_STATE_PATH = f"{tmp}/sync_w{workers}.json"  # fresh full sync per level
+        services = {
+            f"acct{i:04d}": FakeGmailService(make_mailbox(emails), latency=gmail_latency)
+            for i in range(n_accounts)
+        }
+        digest_runner.authenticate_gmail = lambda account_id=None, **kw: services[account_id]
+        accounts = [_with_defaults({"id": account_id, "max_results": emails}) for account_id in services]
+        timings.clear()
+
+        t0 = time.perf_counter()
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            results = scheduler.run_all_accounts(accounts, workers=workers, jitter=jitter)
+        elapsed = time.perf_counter() - t0
+        warnings = log.getvalue().count("⚠️")
+
+        ok = sum(1 for r in results.values() if r)
+        trips = sum(s.round_trips for s in services.values())
+        p50 = statistics.median(timings)
+        p99 = percentile(timings, 99)
+        print(f"workers={workers:<3} accounts={n_accounts} ok={ok} wall={elapsed:6.2f}s "
+              f"runs/s={n_accounts / elapsed:7.1f} run_p50={p50 * 1000:7.1f}ms run_p99={p99 * 1000:7.1f}ms "
+              f"gmail_round_trips={trips} warnings={warnings}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=300)
+    parser.add_argument("--emails", type=int, default=20, help="emails per mailbox")
+    parser.add_argument("--gmail-latency", type=float, default=0.02, help="seconds per Gmail round trip")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="seconds per LLM call")
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 16, 32])
+    parser.add_argument("--jitter", type=float, default=0.0, help="max random start delay per run (s)")
+    args = parser.parse_args()
+    run(args.accounts, args.emails, args.gmail_latency, args.llm_latency, args.workers, args.jitter)
@@ -0,0 +1,226 @@
+# benchmarks/bench_pipeline.py
+"""
+End-to-end offline benchmark: drives get_emails_from_last_24_hours,
+upsert_emails, search_emails, summarize_emails and run_rag_daily against
+in-process fakes (synthetic mailbox, FakeGmailService, stub Qdrant or the
+local index, FakeEmbeddingModel, latency-configurable LLM stub). The BM25
+index lives in the run's temp dir.
+
+    python -m benchmarks.bench_pipeline --scales 10 100 1000 10000 --output bench_pipeline.json
+    python -m benchmarks.bench_pipeline --scales 100000 --repeat 1 --output big.json
+    python -m benchmarks.bench_pipeline --scales 1000 --compare bench_pipeline.json
+
+Each scale runs in its own interpreter (unless --no-isolate) so peak RSS is
+per scale. Reports emails/sec and p50/p99 latency per stage; the JSON also
+carries the run's span breakdown (telemetry.py) and the settings used.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+STAGES = ["fetch", "upsert", "search", "summarize", "end_to_end"]
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def stage_stats(samples, items_per_sample: int) -> dict:
+    median = statistics.median(samples)
+    return {
+        "samples": len(samples),
+        "p50_ms": round(median * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+        "per_sec": round(items_per_sample / median, 1) if median else None,
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def stub_backend(latency: float):
+    def call(prompt: str):
+        time.sleep(latency)
+        return {"choices": [{"message": {"content": '{"summary_of_emails": ["📂 Other: stub"], "actions": []}'}}]}
+    return call
+
+
+def run_scale(n: int, args) -> dict:
+    from app.services import embeddings, gmail_service, summarizer, vector_store
+    from app.services.history_store import HistoryStore
+    from app.services.lexical_index import LexicalIndex
+    from tests.fakes import FakeEmbeddingModel, FakeGmailService, FakeQdrantClient, make_mailbox
+
+    tmp = tempfile.mkdtemp(prefix="mailsmart-bench-")
+    summarizer.BACKENDS = [("Stub", stub_backend(args.llm_latency))]
+    summarizer.get_summary_cache = lambda: None
+    summarizer.SUMMARY_CONCURRENCY = args.concurrency
+    summarizer.SUMMARY_MODE = args.summary_mode
+    summarizer.LOG_DIR = tmp
+    store = HistoryStore(os.path.join(tmp, "history.sqlite3"))
+    summarizer.get_history_store = lambda: store
+    embeddings._model = FakeEmbeddingModel(dim=args.dim, latency_per_text=args.embed_latency)
+    vector_store.ensure_collection = lambda: None
+
+    def fresh_vector_store(i: int):
+        vector_store._lexical = LexicalIndex(os.path.join(tmp, f"lexical{i}.sqlite3"))
+        if args.vector_backend == "local":
+            vector_store.VECTOR_BACKEND = "local"
+            vector_store._backend = vector_store.LocalBackend(os.path.join(tmp, f"index{i}"))
+        else:
+            client = FakeQdrantClient(latency=args.qdrant_latency)
+            vector_store.VECTOR_BACKEND = "qdrant"
+            vector_store._backend = None
+            vector_store._get_client = lambda: client
+
+    mailbox = make_mailbox(n)
+    samples = {stage: [] for stage in STAGES}
+    emails = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(args.repeat):
+            service = FakeGmailService(mailbox, latency=args.gmail_latency, page_size=500)
+            t0 = time.perf_counter()
+            emails = gmail_service.get_emails_from_last_24_hours(max_results=n, service=service)
+            samples["fetch"].append(time.perf_counter() - t0)
+
+            fresh_vector_store(i)
+            t0 = time.perf_counter()
+            vector_store.upsert_emails(emails)
+            samples["upsert"].append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            summarizer.summarize_emails(emails)
+            samples["summarize"].append(time.perf_counter() - t0)
+
+        for q in range(args.queries):
+            t0 = time.perf_counter()
+            vector_store.search_emails(f"payment invoice {q}", top_k=5, mode=args.search_mode)
+            samples["search"].append(time.perf_counter() - t0)
+
+        for i in range(args.repeat):
+            service = FakeGmailService(mailbox, latency=args.gmail_latency, page_size=500)
+            gmail_service.SYNC_STATE_PATH = os.path.join(tmp, f"sync{i}.json")  # first (full) sync every time
+            fresh_vector_store(args.repeat + i)
+            t0 = time.perf_counter()
+            summarizer.run_rag_daily(max_results=n, service=service)
+            samples["end_to_end"].append(time.perf_counter() - t0)
+
+    latest = store.latest() or {}
+    return {
+        "emails": n,
+        "fetched": len(emails),
+        "stages": {
+            stage: stage_stats(s, 1 if stage == "search" else n)
+            for stage, s in samples.items() if s
+        },
+        "breakdown": latest.get("timings"),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_isolated(n: int, argv) -> dict:
+    cmd = [sys.executable, "-m", "benchmarks.bench_pipeline", *argv, "--scales", str(n), "--no-isolate", "--output", "-"]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)["results"][0]
+
+
+def print_result(r: dict):
+    print(f"\nemails={r['emails']}  peak_rss={r['peak_rss_mb']} MB")
+    for stage, st in r["stages"].items():
+        unit = "queries/s" if stage == "search" else "emails/s"
+        print(f"  {stage:<11} p50={st['p50_ms']:>10.2f}ms p99={st['p99_ms']:>10.2f}ms {unit}={st['per_sec']}")
+
+
+def compare(results, baseline_path: str):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["emails"]: r for r in json.load(f)["results"]}
+    print(f"\nvs {baseline_path} (p50, negative = faster):")
+    for r in results:
+        old = baseline.get(r["emails"])
+        if not old:
+            continue
+        for stage, st in r["stages"].items():
+            before = old["stages"].get(stage, {}).get("p50_ms")
+            if before:
+                print(f"  emails={r['emails']:<7} {stage:<11} {before:>10.2f} -> {st['p50_ms']:>10.2f}ms "
+                      f"({(st['p50_ms'] - before) / before * 100:+.1f}%)")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except Exception:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3, help="samples per stage (search: --queries)")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per LLM call")
+    parser.add_argument("--gmail-latency", type=float, default=0.0, help="seconds per Gmail round trip")
+    parser.add_argument("--qdrant-latency", type=float, default=0.0, help="seconds per Qdrant call")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds per embedded text")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--vector-backend", choices=["qdrant", "local"], default="qdrant")
+    parser.add_argument("--search-mode", choices=["hybrid", "vector", "lexical"], default="hybrid")
+    parser.add_argument("--summary-mode", choices=["auto", "concat", "mapreduce"], default="auto")
+    parser.add_argument("--no-isolate", action="store_true", help="run all scales in this process")
+    parser.add_argument("--output", help="write JSON results here ('-' for stdout)")
+    parser.add_argument("--compare", help="earlier JSON output to diff against")
+    args = parser.parse_args()
+
+    passthrough = [a for a in sys.argv[1:]]
+    for flag in ("--scales", "--output", "--compare"):
+        if flag in passthrough:
+            i = passthrough.index(flag)
+            j = i + 1
+            while j < len(passthrough) and not passthrough[j].startswith("--"):
+                j += 1
+            del passthrough[i:j]
+    passthrough = [a for a in passthrough if a != "--no-isolate"]
+
+    results = []
+    for n in args.scales:
+        result = run_scale(n, args) if args.no_isolate else run_isolated(n, passthrough)
+        results.append(result)
+        if args.output != "-":
+            print_result(result)
+
+    report = {
+        "benchmark": "pipeline",
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "no_isolate")},
+        "results": results,
+    }
+    if args.output == "-":
+        print(json.dumps(report))
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
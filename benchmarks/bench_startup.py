@@ -0,0 +1,52 @@
+# benchmarks/bench_startup.py
+"""
+Cold import time of app.main, measured in fresh interpreters.
+
+    python -m benchmarks.bench_startup --runs 5 --output bench_startup.json
+
+Also records whether heavy ML modules got imported, so a regression back to
+import-time model loading shows up in the JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = (
+    "import json, sys, time\n"
+    "t0 = time.perf_counter()\n"
+    "import app.main\n"
+    "elapsed = time.perf_counter() - t0\n"
+    "heavy = [m for m in ('sentence_transformers', 'torch', 'transformers') if m in sys.modules]\n"
+    "print(json.dumps({'seconds': elapsed, 'heavy_modules': heavy}))\n"
+)
+
+
+def measure(runs: int) -> dict:
+    samples, heavy = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True, env=os.environ.copy())
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        heavy.update(result["heavy_modules"])
+    return {
+        "runs": runs,
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+        "max_s": max(samples),
+        "heavy_modules": sorted(heavy),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    report = measure(args.runs)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
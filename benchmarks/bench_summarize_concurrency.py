@@ -0,0 +1,50 @@
+# benchmarks/bench_summarize_concurrency.py
+"""
+Serial vs concurrent chunk summarization against a stub LLM backend with
+artificial latency. No network, no cache. Chunks are fixed-size
+(CHUNK_SIZE emails) by default so there are enough calls to overlap.
+
+    python -m benchmarks.bench_summarize_concurrency --emails 100 --latency 0.2
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from app.services import summarizer
+from tests.fakes import make_mailbox
+
+
+def stub_backend(latency: float):
+    def call(prompt: str):
+        time.sleep(latency)
+        return {"choices": [{"message": {"content": '{"summary_of_emails": ["📂 Other: stub"], "actions": []}'}}]}
+    return call
+
+
+def run(emails: int, latency: float, concurrency_levels, strategy: str = "fixed"):
+    summarizer.CHUNK_STRATEGY = strategy
+    summarizer.BACKENDS = [("Stub", stub_backend(latency))]
+    summarizer.get_summary_cache = lambda: None
+    mailbox = make_mailbox(emails)
+    chunks = len(summarizer.plan_text_chunks(mailbox, summarizer.load_prompt()))
+    print(f"emails={emails} chunks={chunks} strategy={summarizer.CHUNK_STRATEGY}")
+
+    baseline = None
+    for concurrency in concurrency_levels:
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            summarizer.summarize_emails(mailbox, concurrency=concurrency)
+        elapsed = time.perf_counter() - t0
+        baseline = baseline or elapsed
+        print(f"concurrency={concurrency:<3} time={elapsed:6.2f}s speedup={baseline / elapsed:5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per backend call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--strategy", choices=["fixed", "tokens"], default="fixed", help="CHUNK_STRATEGY")
+    args = parser.parse_args()
+    run(args.emails, args.latency, args.concurrency, args.strategy)
@@ -0,0 +1,10 @@
+import pytest
+from app.services import history_store, lexical_index, vector_store
+
+@pytest.fixture(autouse=True)
+def _isolated_stores(tmp_path, monkeypatch):
+    # keep the BM25 index and the run history out of the developer's data/ dir
+    monkeypatch.setattr(lexical_index, "LEXICAL_INDEX_PATH", str(tmp_path / "lexical_index.sqlite3"))
+    monkeypatch.setattr(history_store, "HISTORY_DB_PATH", str(tmp_path / "history.sqlite3"))
+    monkeypatch.setattr(vector_store, "_lexical", None)
+    monkeypatch.setattr(history_store, "_store", None)
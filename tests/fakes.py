@@ -0,0 +1,423 @@
+# tests/fakes.py
+"""
+In-process stand-ins for external services, used by tests and benchmarks.
+Each fake counts HTTP round trips and can add artificial latency per trip.
+"""
+import json
+import time
+import threading
+import http.server
+
+
+def make_mailbox(n: int, start_id: int = 0, now: float = None):
+    """
+    Synthetic Gmail messages with From/Subject headers and a snippet,
+    newest first (as messages.list returns them).
+    """
+    senders = ["alerts@bank.example", "team@work.example", "news@shop.example", "friend@mail.example"]
+    now_ms = int((now or time.time()) * 1000)
+    return [
+        {
+            "id": f"m{i:06d}",
+            "from": senders[i % len(senders)],
+            "subject": f"Subject {i}",
+            "snippet": f"Body snippet for message {i}",
+            "internalDate": str(now_ms - (i - start_id) * 1000),
+        }
+        for i in range(start_id, start_id + n)
+    ]
+
+
+class _Request:
+    def __init__(self, service, fn):
+        self._service = service
+        self._fn = fn
+
+    def execute(self):
+        self._service._round_trip()
+        return self._fn()
+
+
+class _Batch:
+    def __init__(self, service, callback=None):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self._requests.append((request, callback or self._callback, request_id or str(len(self._requests))))
+
+    def execute(self):
+        # whole batch costs a single round trip
+        self._service._round_trip()
+        self._service.batch_calls += 1
+        if self._service.fail_batches:
+            self._service.fail_batches -= 1
+            raise ConnectionError("batch request failed")
+        for request, callback, request_id in self._requests:
+            try:
+                response, exc = request._fn(), None
+            except Exception as e:
+                response, exc = None, e
+            if callback:
+                callback(request_id, response, exc)
+
+
+class _Messages:
+    def __init__(self, service):
+        self._s = service
+
+    def list(self, userId, q=None, maxResults=100, pageToken=None):
+        def fn():
+            start = int(pageToken or 0)
+            size = min(maxResults, self._s.page_size)
+            page = self._s.messages[start:start + size]
+            out = {"messages": [{"id": m["id"], "threadId": m.get("threadId", m["id"])} for m in page]}
+            if start + size < len(self._s.messages):
+                out["nextPageToken"] = str(start + size)
+            self._s.list_calls += 1
+            return out
+        return _Request(self._s, fn)
+
+    def get(self, userId, id, format="full", metadataHeaders=None):
+        def fn():
+            self._s.get_calls += 1
+            self._s._check(id)
+            return _message_resource(self._s.by_id[id], metadataHeaders)
+        return _Request(self._s, fn)
+
+
+    def send(self, userId, body):
+        def fn():
+            self._s.sent.append(body)
+            return {"id": f"sent{len(self._s.sent)}"}
+        return _Request(self._s, fn)
+
+
+def _message_resource(m, metadata_headers=None):
+    headers = [{"name": "From", "value": m["from"]}, {"name": "Subject", "value": m["subject"]}]
+    if metadata_headers is not None:
+        headers = [h for h in headers if h["name"] in metadata_headers]
+    return {
+        "id": m["id"],
+        "snippet": m["snippet"],
+        "internalDate": m.get("internalDate", "0"),
+        "payload": {"headers": headers},
+    }
+
+
+class _Threads:
+    def __init__(self, service):
+        self._s = service
+
+    def get(self, userId, id, format="full", metadataHeaders=None):
+        def fn():
+            from googleapiclient.errors import HttpError
+            import httplib2
+            self._s.thread_calls += 1
+            self._s._check(id)
+            messages = [m for m in self._s.messages if m.get("threadId", m["id"]) == id]
+            if not messages:
+                raise HttpError(httplib2.Response({"status": 404}), b"Thread not found")
+            # oldest first, like Gmail
+            messages.sort(key=lambda m: int(m.get("internalDate", "0")))
+            return {"id": id, "messages": [dict(_message_resource(m, metadataHeaders), threadId=id) for m in messages]}
+        return _Request(self._s, fn)
+
+
+class _History:
+    def __init__(self, service):
+        self._s = service
+
+    def list(self, userId, startHistoryId, historyTypes=None, pageToken=None):
+        def fn():
+            from googleapiclient.errors import HttpError
+            import httplib2
+            self._s.history_calls += 1
+            if int(startHistoryId) < self._s.min_history_id:
+                raise HttpError(httplib2.Response({"status": 404}), b"History expired")
+            records = [r for r in self._s.history if r["id"] > int(startHistoryId)]
+            start = int(pageToken or 0)
+            page = records[start:start + self._s.page_size]
+            out = {"history": page, "historyId": str(self._s.history_id)}
+            if start + self._s.page_size < len(records):
+                out["nextPageToken"] = str(start + self._s.page_size)
+            return out
+        return _Request(self._s, fn)
+
+
+class _Users:
+    def __init__(self, service):
+        self._s = service
+
+    def messages(self):
+        return _Messages(self._s)
+
+    def history(self):
+        return _History(self._s)
+
+    def threads(self):
+        return _Threads(self._s)
+
+    def getProfile(self, userId):
+        return _Request(self._s, lambda: {"emailAddress": "me@example.com", "historyId": str(self._s.history_id)})
+
+
+class FakeGmailService:
+    """Minimal fake of the googleapiclient Gmail service used by gmail_service."""
+
+    def __init__(self, messages=None, latency: float = 0.0, page_size: int = 100):
+        self.messages = list(messages or [])
+        self.by_id = {m["id"]: m for m in self.messages}
+        self.latency = latency
+        self.page_size = page_size
+        self.round_trips = 0
+        self.batch_calls = 0
+        self.list_calls = 0
+        self.get_calls = 0
+        self.history_calls = 0
+        self.thread_calls = 0
+        self.sent = []
+        self.history = []
+        self.history_id = 1000
+        self.min_history_id = 0
+        self.fail_batches = 0  # the next n batch requests fail as a whole
+        self.fail_ids = set()  # messages.get / threads.get of these ids fail with a 500
+        self._lock = threading.Lock()
+
+    def add_messages(self, messages):
+        """Deliver new messages: newest first in the mailbox, one history record each."""
+        for m in messages:
+            self.history_id += 1
+            self.history.append({"id": self.history_id, "messagesAdded": [
+                {"message": {"id": m["id"], "threadId": m.get("threadId", m["id"]), "labelIds": ["INBOX"]}}
+            ]})
+            self.by_id[m["id"]] = m
+        self.messages = list(reversed(messages)) + self.messages
+
+    def expire_history(self):
+        """Make every previously issued historyId invalid (404 on history.list)."""
+        self.min_history_id = self.history_id + 1
+
+    def _check(self, id):
+        from googleapiclient.errors import HttpError
+        import httplib2
+        if id in self.fail_ids:
+            raise HttpError(httplib2.Response({"status": 500}), b"Backend Error")
+        if id not in self.by_id and not any(m.get("threadId") == id for m in self.messages):
+            raise HttpError(httplib2.Response({"status": 404}), b"Not Found")
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def users(self):
+        return _Users(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback=callback)
+
+
+class FakeQdrantClient:
+    """In-memory stand-in for QdrantClient (points keyed by id, cosine search)."""
+
+    def __init__(self, latency: float = 0.0):
+        self.points = {}
+        self.latency = latency
+        self.calls = {}
+        self.collections = set()
+        self._matrix = None  # (ids, normalised vectors), rebuilt after writes
+
+    def _call(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_collection(self, collection_name):
+        self._call("get_collection")
+        if collection_name not in self.collections:
+            raise ValueError(f"Collection {collection_name} not found")
+        return {"name": collection_name}
+
+    def recreate_collection(self, collection_name, vectors_config=None):
+        self._call("recreate_collection")
+        self.collections.add(collection_name)
+        self.points = {}
+        self._matrix = None
+
+    def create_payload_index(self, collection_name, field_name, field_schema=None):
+        self._call("create_payload_index")
+
+    def upsert(self, collection_name, points):
+        self._call("upsert")
+        for p in points:
+            self.points[str(p.id)] = p
+        self._matrix = None
+
+    def retrieve(self, collection_name, ids, with_payload=True, with_vectors=False):
+        from types import SimpleNamespace
+        self._call("retrieve")
+        out = []
+        for pid in ids:
+            p = self.points.get(str(pid))
+            if p is not None:
+                out.append(SimpleNamespace(id=str(pid), payload=p.payload, vector=p.vector if with_vectors else None))
+        return out
+
+    @staticmethod
+    def _matches(payload, query_filter):
+        # FieldCondition with match.value or range.gte/lt in `must`; nested Filter with `should`; IsEmptyCondition
+        from qdrant_client.http import models
+        for cond in query_filter.must or []:
+            if isinstance(cond, models.Filter):
+                if not any(FakeQdrantClient._matches(payload, models.Filter(must=[c])) for c in cond.should or []):
+                    return False
+                continue
+            if isinstance(cond, models.IsEmptyCondition):
+                if (payload or {}).get(cond.is_empty.key) is not None:
+                    return False
+                continue
+            value = (payload or {}).get(cond.key)
+            if cond.match is not None and value != cond.match.value:
+                return False
+            if cond.range is not None:
+                if value is None:
+                    return False
+                if cond.range.gte is not None and value < cond.range.gte:
+                    return False
+                if cond.range.lt is not None and value >= cond.range.lt:
+                    return False
+        return True
+
+    def search(self, collection_name, query_vector, query_filter=None, limit=10, with_payload=True):
+        import numpy as np
+        from types import SimpleNamespace
+        self._call("search")
+        if not self.points:
+            return []
+        if self._matrix is None:
+            ids = list(self.points)
+            mat = np.asarray([self.points[i].vector for i in ids], dtype=np.float32)
+            norms = np.linalg.norm(mat, axis=1, keepdims=True)
+            self._matrix = (ids, mat / np.where(norms == 0, 1, norms))
+        ids, mat = self._matrix
+        q = np.asarray(query_vector, dtype=np.float32)
+        scores = mat @ (q / (np.linalg.norm(q) or 1.0))
+        if query_filter is not None:
+            keep = np.array([self._matches(self.points[i].payload, query_filter) for i in ids], dtype=bool)
+            scores = np.where(keep, scores, -np.inf)
+            limit = min(limit, int(keep.sum()))
+        top = np.argsort(-scores)[:limit]
+        return [SimpleNamespace(id=ids[i], score=float(scores[i]), payload=self.points[ids[i]].payload) for i in top]
+
+
+class FakeEmbeddingModel:
+    """
+    SentenceTransformer stand-in: deterministic pseudo-random unit vectors per
+    text, with optional latency per encoded text.
+    """
+
+    def __init__(self, dim: int = 384, latency_per_text: float = 0.0):
+        self.dim = dim
+        self.latency_per_text = latency_per_text
+        self.calls = 0
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True, **kwargs):
+        import zlib
+        import numpy as np
+        self.calls += 1
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if self.latency_per_text:
+            time.sleep(self.latency_per_text * len(texts))
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            out[i] = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dim)
+        out /= np.linalg.norm(out, axis=1, keepdims=True)
+        return out[0] if single else out
+
+
+class FakeAsyncQdrantClient:
+    """Async facade over a FakeQdrantClient (same points, same counters)."""
+
+    def __init__(self, sync_client: FakeQdrantClient):
+        self._sync = sync_client
+
+    async def get_collection(self, collection_name):
+        return self._sync.get_collection(collection_name)
+
+    async def recreate_collection(self, collection_name, vectors_config=None):
+        return self._sync.recreate_collection(collection_name, vectors_config)
+
+    async def create_payload_index(self, collection_name, field_name, field_schema=None):
+        return self._sync.create_payload_index(collection_name, field_name, field_schema)
+
+    async def search(self, collection_name, query_vector, query_filter=None, limit=10, with_payload=True):
+        return self._sync.search(collection_name, query_vector, query_filter=query_filter, limit=limit, with_payload=with_payload)
+
+
+class FakeStreamingLLMServer:
+    """
+    Local HTTP server speaking the OpenAI-style streaming chat API
+    (POST /chat/completions with stream=true -> SSE chunks). Sends `answer`
+    in `pieces` deltas, sleeping `delay` seconds before each. With
+    fail_after=n the connection drops after n deltas, mid-answer.
+
+        with FakeStreamingLLMServer(answer, pieces=10, delay=0.05) as server:
+            client = Perplexity(api_key="x", base_url=server.url)
+    """
+
+    def __init__(self, answer: str, pieces: int = 10, delay: float = 0.0, fail_after: int = None):
+        self.answer = answer
+        self.requests = []
+        outer = self
+        step = max(1, -(-len(answer) // pieces))
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                outer.requests.append(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                if fail_after is not None:
+                    self.send_header("Content-Length", "1000000")  # the body ends early: a dropped connection
+                self.end_headers()
+                for n, i in enumerate(range(0, len(outer.answer), step)):
+                    if n == fail_after:
+                        self.close_connection = True
+                        return
+                    time.sleep(delay)
+                    message = {"role": "assistant", "content": outer.answer[i:i + step]}
+                    chunk = {"id": "fake", "created": 0, "model": body.get("model", "fake"), "object": "chat.completion.chunk",
+                             "choices": [{"index": 0, "delta": message, "message": message}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
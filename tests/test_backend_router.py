@@ -0,0 +1,117 @@
+import time
+import pytest
+from app.services.backend_router import BackendRouter, BackendError
+
+
+def ok(text, delay=0.0):
+    def call(prompt):
+        time.sleep(delay)
+        return {"choices": [{"message": {"content": text}}]}
+    return call
+
+
+def failing(counter):
+    def call(prompt):
+        counter.append(prompt)
+        raise BackendError("down")
+    return call
+
+
+@pytest.fixture
+def router():
+    return BackendRouter(failure_threshold=2, cooldown=0.2, timeouts={}, hedge_factor=0, routing="ordered")
+
+
+def test_falls_back_and_opens_circuit(router):
+    calls = []
+    backends = [("A", failing(calls)), ("B", ok("from b"))]
+    for _ in range(4):
+        assert router.complete("p", backends) == ("B", "from b")
+    # A was only tried until its breaker opened
+    assert len(calls) == 2
+    assert router.snapshot()["A"]["state"] == "open"
+
+    time.sleep(0.25)  # cool-down over: one probe goes through
+    assert router.complete("p", backends) == ("B", "from b")
+    assert len(calls) == 3
+    assert router.snapshot()["A"]["state"] == "open"
+
+
+def test_half_open_probe_closes_on_success(router):
+    flaky = {"up": False}
+
+    def a(prompt):
+        if not flaky["up"]:
+            raise BackendError("down")
+        return {"choices": [{"message": {"content": "from a"}}]}
+
+    backends = [("A", a), ("B", ok("from b"))]
+    router.complete("p", backends)
+    router.complete("p", backends)
+    assert router.snapshot()["A"]["state"] == "open"
+    flaky["up"] = True
+    time.sleep(0.25)
+    assert router.complete("p", backends) == ("A", "from a")
+    assert router.snapshot()["A"]["state"] == "closed"
+
+
+def test_timeout_counts_as_failure():
+    router = BackendRouter(timeouts={"Slow": 0.05}, hedge_factor=0, routing="ordered")
+    backends = [("Slow", ok("late", delay=0.5)), ("Fast", ok("fast"))]
+    t0 = time.monotonic()
+    assert router.complete("p", backends) == ("Fast", "fast")
+    assert time.monotonic() - t0 < 0.4
+    assert router.snapshot()["Slow"]["timeouts"] == 1
+
+
+def test_rate_limit_wait_does_not_count_toward_timeout(monkeypatch):
+    from app.services import rate_limiter
+    monkeypatch.setattr(rate_limiter, "acquire", lambda name: time.sleep(0.2))
+    router = BackendRouter(timeouts={"Limited": 0.1}, hedge_factor=0, routing="ordered")
+    assert router.complete("p", [("Limited", ok("answer"))]) == ("Limited", "answer")
+
+    def tokens(prompt):
+        yield "streamed"
+    assert list(router.stream("p", [("Limited", tokens)])) == [("Limited", "streamed")]
+    assert router.snapshot()["Limited"]["timeouts"] == 0
+
+
+def test_hedge_takes_first_answer():
+    router = BackendRouter(timeouts={}, hedge_min=0.05, hedge_factor=1, routing="ordered")
+    backends = [("Slow", ok("slow", delay=0.5)), ("Fast", ok("fast"))]
+    t0 = time.monotonic()
+    assert router.complete("p", backends) == ("Fast", "fast")
+    assert time.monotonic() - t0 < 0.4
+    assert router.snapshot()["Fast"]["hedged"] == 1
+
+
+def test_fastest_routing_prefers_lower_ewma():
+    router = BackendRouter(timeouts={}, hedge_factor=0, routing="fastest")
+    router.state("A").record_success(2.0)
+    router.state("B").record_success(0.1)
+    assert router.complete("p", [("A", ok("a")), ("B", ok("b"))]) == ("B", "b")
+    stats = router.snapshot()["B"]
+    assert stats["latency_histogram"]["le_0.25s"] == 2
+    assert stats["latency_ewma_ms"] is not None
+
+
+def test_empty_answer_is_failure(router):
+    assert router.complete("p", [("A", ok("  "))]) is None
+    assert router.snapshot()["A"]["failures"] == 1
+
+
+def test_stream_falls_back_after_mid_stream_failure():
+    router = BackendRouter(timeouts={}, hedge_factor=0, routing="ordered")
+
+    def broken(prompt):
+        yield "partial"
+        raise BackendError("connection reset")
+
+    def good(prompt):
+        yield "hello "
+        yield "world"
+
+    out = list(router.stream("p", [("A", broken), ("B", good)]))
+    assert out == [("A", "partial"), ("A", None), ("B", "hello "), ("B", "world")]
+    assert router.snapshot()["A"]["failures"] == 1
+    assert router.snapshot()["B"]["ttft_ewma_ms"] is not None
@@ -0,0 +1,48 @@
+from app.services import chunk_planner
+from app.services.chunk_planner import plan_chunks, split_to_budget, EMAIL_SEPARATOR
+
+TEMPLATE = "Summarize these:\n{emails_text}"
+
+
+def words(text):
+    return len(text.split())
+
+
+def make_emails(n, snippet_words=10):
+    return [{"id": str(i), "from": f"s{i}@x.com", "subject": f"subj {i}", "snippet": " ".join(["w"] * snippet_words)}
+            for i in range(n)]
+
+
+def test_packs_whole_emails_within_budget(monkeypatch):
+    monkeypatch.setattr(chunk_planner, "PROMPT_OUTPUT_RESERVE", 0)
+    emails = make_emails(20)
+    chunks = plan_chunks(emails, TEMPLATE, budget=100, count_tokens=words)
+    assert all(words(TEMPLATE.replace("{emails_text}", c)) <= 100 for c in chunks)
+    blocks = [b for c in chunks for b in c.split(EMAIL_SEPARATOR)]
+    assert len(blocks) == 20  # nothing split
+    assert sorted(b.split("\n")[0] for b in blocks) == sorted(f"From: s{i}@x.com" for i in range(20))
+    # 15 words per email + separator: six fit in the 98 words left after the template
+    assert len(chunks) == 4
+
+
+def test_fewer_calls_than_fixed_chunks():
+    emails = make_emails(50)
+    assert len(plan_chunks(emails, TEMPLATE, budget=6000)) == 2  # capped by PROMPT_MAX_EMAILS=40
+
+
+def test_oversize_email_is_split_with_header(monkeypatch):
+    monkeypatch.setattr(chunk_planner, "PROMPT_OUTPUT_RESERVE", 0)
+    emails = make_emails(1, snippet_words=250)
+    chunks = plan_chunks(emails, TEMPLATE, budget=100, count_tokens=words)
+    assert len(chunks) == 3
+    assert all(c.startswith("From: s0@x.com\nSubject: subj 0 (part") for c in chunks)
+    assert all(words(TEMPLATE.replace("{emails_text}", c)) <= 100 for c in chunks)
+
+
+def test_split_to_budget():
+    assert split_to_budget("a b c d e", 2, words) == ["a b", "c d", "e"]
+    assert split_to_budget("a b", 5, words) == ["a b"]
+
+def test_token_counter_kind_names_the_fallback_estimate():
+    assert chunk_planner.token_counter_kind("Gemini") == "estimate:4.0 chars/token"
+    assert chunk_planner.token_counter_kind("Perplexity").startswith(("tiktoken:", "estimate:"))
@@ -0,0 +1,79 @@
+import random
+import time
+from itertools import accumulate
+from app.services.chunk_planner import email_block
+from app.services.dedup import cluster, collapse
+
+def _ci(i, sender="ci@builds.dev"):
+    return {"id": str(i), "from": sender, "subject": f"Build #{1200 + i} failed on main",
+            "snippet": f"Pipeline {i} failed at step test after {i * 7} seconds. View logs at ci/runs/{i}"}
+
+def test_ci_notifications_collapse_with_count():
+    emails = [_ci(i) for i in range(5)] + [{"id": "x", "from": "boss@work.com", "subject": "Quarterly plan", "snippet": "Draft attached"}]
+    out, report = collapse(emails)
+    assert report == {"emails": 6, "distinct": 2, "collapsed": 4}
+    assert out[0]["id"] == "0" and out[0]["similar"] == 4
+    assert "similar" not in emails[0]
+    assert email_block(out[0]).endswith("(+4 similar messages)")
+    assert "similar" not in email_block(out[1])
+
+def test_same_sender_and_essential():
+    emails = [_ci(0), _ci(1, sender="other@builds.dev"), _ci(2), dict(_ci(3), essential=True)]
+    assert cluster(emails, same_sender=True) == [[0, 2], [1], [3]]
+    assert cluster(emails, same_sender=False) == [[0, 1, 2], [3]]
+    out, _ = collapse(emails)
+    assert out[0]["similar"] == 1 and out[2]["essential"] is True and "similar" not in out[2]
+
+def test_transactional_mail_is_never_collapsed():
+    alerts = [
+        {"id": "1", "from": "alerts@bank.example", "subject": "Account debited",
+         "snippet": "Rs 50000 debited from a/c XX1234 on 12-03. Avl bal Rs 8200"},
+        {"id": "2", "from": "alerts@bank.example", "subject": "Account debited",
+         "snippet": "Rs 120 debited from a/c XX1234 on 12-03. Avl bal Rs 58080"},
+        {"id": "3", "from": "ship@shop.example", "subject": "Order 88213 shipped", "snippet": "Arriving Friday"},
+        {"id": "4", "from": "ship@shop.example", "subject": "Order 99120 shipped", "snippet": "Arriving Friday"},
+    ]
+    out, report = collapse(alerts)
+    assert [e["id"] for e in out] == ["1", "2", "3", "4"] and report["collapsed"] == 0
+    assert not any("similar" in e for e in out)
+
+def test_distinct_and_empty_emails():
+    emails = [
+        {"id": "1", "from": "a@x.com", "subject": "Invoice for March", "snippet": "Your invoice is attached"},
+        {"id": "2", "from": "a@x.com", "subject": "Team offsite", "snippet": "Venue and agenda for Friday"},
+        {"id": "3", "from": "a@x.com"},
+    ]
+    assert cluster(emails) == [[0], [1], [2]]
+    assert collapse([]) == ([], {"emails": 0, "distinct": 0, "collapsed": 0})
+
+def test_large_mailbox_near_linear():
+    emails = [{"id": str(i), "from": f"s{i % 300}@x.com", "subject": f"Topic {i % 2000} report {i}",
+               "snippet": f"template {i % 2000} body text number {i} with extra words {i % 2000} here"} for i in range(50_000)]
+    t0 = time.perf_counter()
+    out, report = collapse(emails)
+    assert time.perf_counter() - t0 < 10
+    assert report["distinct"] <= 2000 * 300
+    assert report["collapsed"] > 40_000
+
+def _distinct_mailbox(n, seed=0):
+    # Zipf-distributed words from a 20k vocabulary: almost every email is distinct
+    rnd = random.Random(seed)
+    vocab = ["".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(3, 9))) for _ in range(20_000)]
+    cum_weights = list(accumulate(1 / (i + 1) for i in range(len(vocab))))
+    emails = []
+    for i in range(n):
+        words = rnd.choices(vocab, cum_weights=cum_weights, k=36)
+        emails.append({"id": str(i), "from": f"s{i % 500}@x.com", "subject": " ".join(words[:6]), "snippet": " ".join(words[6:])})
+    return emails
+
+def test_distinct_mailbox_scales_linearly():
+    small, large = _distinct_mailbox(2_000), _distinct_mailbox(8_000, seed=1)
+    t0 = time.perf_counter()
+    collapse(small)
+    t_small = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    _, report = collapse(large)
+    t_large = time.perf_counter() - t0
+    assert report["distinct"] > 7_900
+    assert t_large < 8 * t_small + 0.5  # 4x the emails
+    assert t_large < 5
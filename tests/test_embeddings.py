@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.services import embeddings
+
+def test_importing_app_does_not_load_model():
+    env = {**os.environ, "PERPLEXITY_API_KEY": os.environ.get("PERPLEXITY_API_KEY", "test")}
+    probe = "import sys, app.main; print('sentence_transformers' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, env=env)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip().splitlines()[-1] == "False"
+
+def test_model_loaded_once_on_first_use(monkeypatch):
+    loads = []
+
+    class Model:
+        def encode(self, texts, **kw):
+            return np.ones((len(texts), 3), dtype=np.float32)
+
+    monkeypatch.setattr(embeddings, "_model", None)
+    import sentence_transformers
+    monkeypatch.setattr(sentence_transformers, "SentenceTransformer", lambda name: loads.append(name) or Model())
+    embeddings.get_embedding("a")
+    embeddings.get_embeddings(["b", "c"])
+    assert loads == [embeddings.EMB_MODEL]
+
+def test_empty_batch_does_not_load_model(monkeypatch):
+    monkeypatch.setattr(embeddings, "_model", None)
+    monkeypatch.setattr(embeddings, "_get_model", lambda: pytest.fail("model loaded for an empty batch"))
+    assert embeddings.get_embeddings([]).shape == (0, embeddings.EMB_DIM)
+    assert embeddings.emails_to_embeddings([]).dtype == np.float32
+
+def test_shared_embedding_server_roundtrip(monkeypatch):
+    from app.services import embedding_server
+
+    class Model:
+        def encode(self, texts, **kw):
+            return np.array([[len(t), 0.5] for t in texts], dtype=np.float32)
+
+    monkeypatch.setattr(embeddings, "_model", Model())
+    with TestClient(embedding_server.app) as server:
+        monkeypatch.setattr(embeddings, "EMBEDDINGS_SERVER_URL", "http://testserver")
+        monkeypatch.setattr(embeddings, "_get_session", lambda: server)
+        mat = embeddings.get_embeddings(["abc", "de"])
+    assert mat.dtype == np.float32
+    assert mat.tolist() == [[3.0, 0.5], [2.0, 0.5]]
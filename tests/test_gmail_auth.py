@@ -0,0 +1,109 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from app.services import gmail_service
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class FakeCreds:
+    def __init__(self, expires_in=3600):
+        self.expiry = _utcnow() + timedelta(seconds=expires_in)
+        self.refresh_token = "refresh"
+        self.refreshes = 0
+
+    @property
+    def valid(self):
+        return self.expiry > _utcnow()
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.expiry = _utcnow() + timedelta(seconds=3600)
+
+    def to_json(self):
+        return "{}"
+
+
+@pytest.fixture
+def auth(tmp_path, monkeypatch):
+    token = tmp_path / "token.json"
+    token.write_text("{}")
+    loaded = []
+
+    def from_file(path, scopes):
+        creds = FakeCreds(expires_in=loaded_expiry[0])
+        loaded.append(creds)
+        return creds
+
+    loaded_expiry = [3600]
+    monkeypatch.setattr(gmail_service, "token_path_for", lambda account_id=None: str(token))
+    monkeypatch.setattr(gmail_service.Credentials, "from_authorized_user_file", staticmethod(from_file))
+    monkeypatch.setattr(gmail_service, "build", lambda *a, **kw: object())
+    monkeypatch.setattr(gmail_service, "_creds_cache", {})
+    monkeypatch.setattr(gmail_service, "_auth_local", threading.local())
+    return loaded, loaded_expiry
+
+
+def test_service_is_built_once_per_thread(auth):
+    loaded, _ = auth
+    with gmail_service.count_auth_ops() as ops:
+        first = gmail_service.authenticate_gmail()
+        second = gmail_service.authenticate_gmail()
+    assert first is second
+    assert len(loaded) == 1
+    assert ops == {"token_loads": 1, "refreshes": 0, "builds": 1, "cache_hits": 1}
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(gmail_service.authenticate_gmail()))
+    t.start()
+    t.join()
+    assert other[0] is not first  # own service, shared credentials
+    assert len(loaded) == 1
+
+
+def test_refreshes_before_expiry(auth):
+    loaded, loaded_expiry = auth
+    loaded_expiry[0] = 60  # inside the refresh margin
+    with gmail_service.count_auth_ops() as ops:
+        gmail_service.authenticate_gmail()
+        gmail_service.authenticate_gmail()
+    assert loaded[0].refreshes == 1
+    assert ops["refreshes"] == 1
+
+
+def test_token_file_change_reloads(auth, tmp_path):
+    loaded, _ = auth
+    first = gmail_service.authenticate_gmail()
+    token = tmp_path / "token.json"
+    token.write_text('{"new": 1}')
+    stat = token.stat()
+    os.utime(token, (stat.st_atime, stat.st_mtime + 5))
+    second = gmail_service.authenticate_gmail()
+    assert len(loaded) == 2
+    assert second is not first
+
+
+def test_account_token_path_override(tmp_path, monkeypatch):
+    import json
+    from app.services import accounts
+    token = tmp_path / "secrets" / "bob.json"
+    token.parent.mkdir()
+    token.write_text("{}")
+    config = tmp_path / "accounts.json"
+    config.write_text(json.dumps({"accounts": [{"id": "bob", "token_path": str(token)}, {"id": "alice"}]}))
+    monkeypatch.setattr(accounts, "ACCOUNTS_PATH", str(config))
+    loaded_from = []
+    monkeypatch.setattr(gmail_service.Credentials, "from_authorized_user_file",
+                        staticmethod(lambda path, scopes: loaded_from.append(path) or FakeCreds()))
+    monkeypatch.setattr(gmail_service, "build", lambda *a, **kw: object())
+    monkeypatch.setattr(gmail_service, "_creds_cache", {})
+    monkeypatch.setattr(gmail_service, "_auth_local", threading.local())
+
+    gmail_service.authenticate_gmail(account_id="bob")
+    assert loaded_from == [str(token)]
+    assert accounts.token_path_for("alice") == os.path.join(accounts.TOKEN_DIR, "alice.json")
+    assert accounts.token_path_for("carol") == os.path.join(accounts.TOKEN_DIR, "carol.json")
@@ -0,0 +1,42 @@
+import time
+from app.services.gmail_service import get_emails_from_last_24_hours
+from tests.fakes import FakeGmailService, make_mailbox
+
+def test_batched_fetch_round_trips():
+    service = FakeGmailService(make_mailbox(120), page_size=50)
+    emails = get_emails_from_last_24_hours(max_results=120, service=service, mode="batch")
+    assert len(emails) == 120
+    assert [e["id"] for e in emails] == [m["id"] for m in service.messages]
+    # 3 list pages + 3 batches of 50
+    assert service.list_calls == 3
+    assert service.round_trips == 6
+
+def test_sequential_fetch_round_trips():
+    service = FakeGmailService(make_mailbox(30), page_size=50)
+    emails = get_emails_from_last_24_hours(max_results=30, service=service, mode="sequential")
+    assert len(emails) == 30
+    assert service.round_trips == 31
+    e = emails[0]
+    assert set(e) == {"from", "subject", "snippet", "id", "date"}
+    assert e["date"] == int(service.messages[0]["internalDate"]) // 1000
+
+def test_pagination_stops_at_max_results():
+    service = FakeGmailService(make_mailbox(300), page_size=100)
+    emails = get_emails_from_last_24_hours(max_results=150, service=service)
+    assert len(emails) == 150
+    assert service.list_calls == 2
+
+def test_batched_fetch_faster_than_sequential():
+    mailbox = make_mailbox(40)
+    seq = FakeGmailService(mailbox, latency=0.005)
+    t0 = time.perf_counter()
+    get_emails_from_last_24_hours(max_results=40, service=seq, mode="sequential")
+    seq_time = time.perf_counter() - t0
+
+    bat = FakeGmailService(mailbox, latency=0.005)
+    t0 = time.perf_counter()
+    get_emails_from_last_24_hours(max_results=40, service=bat, mode="batch")
+    bat_time = time.perf_counter() - t0
+
+    assert bat.round_trips < seq.round_trips
+    assert bat_time < seq_time
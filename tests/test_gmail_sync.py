@@ -0,0 +1,70 @@
+import pytest
+from app.services.gmail_service import sync_mailbox, load_sync_state
+from tests.fakes import FakeGmailService, make_mailbox
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / "sync_state.json")
+
+def test_first_sync_is_full(state_path):
+    service = FakeGmailService(make_mailbox(10))
+    window, new = sync_mailbox(max_results=20, service=service, state_path=state_path)
+    assert len(window) == 10
+    assert len(new) == 10
+    assert service.list_calls == 1
+    assert load_sync_state(state_path)["history_id"] == str(service.history_id)
+
+def test_repeat_sync_only_fetches_deltas(state_path):
+    service = FakeGmailService(make_mailbox(10))
+    sync_mailbox(max_results=20, service=service, state_path=state_path)
+    gets_after_full = service.get_calls
+
+    window, new = sync_mailbox(max_results=20, service=service, state_path=state_path)
+    assert new == []
+    assert len(window) == 10
+    assert service.get_calls == gets_after_full
+    assert service.list_calls == 1
+
+    service.add_messages(make_mailbox(3, start_id=100))
+    window, new = sync_mailbox(max_results=20, service=service, state_path=state_path)
+    assert {e["id"] for e in new} == {"m000100", "m000101", "m000102"}
+    assert len(window) == 13
+    assert service.get_calls == gets_after_full + 3
+
+def test_expired_history_falls_back_to_full_resync(state_path):
+    service = FakeGmailService(make_mailbox(5))
+    sync_mailbox(max_results=20, service=service, state_path=state_path)
+    service.add_messages(make_mailbox(2, start_id=50))
+    service.expire_history()
+
+    window, new = sync_mailbox(max_results=20, service=service, state_path=state_path)
+    assert service.list_calls == 2
+    assert {e["id"] for e in new} == {"m000050", "m000051"}
+    assert len(window) == 7
+
+def test_failed_fetch_is_retried_next_sync(state_path):
+    service = FakeGmailService(make_mailbox(5))
+    sync_mailbox(max_results=20, service=service, state_path=state_path)
+
+    service.add_messages(make_mailbox(2, start_id=100))
+    service.fail_batches = 1
+    window, new = sync_mailbox(max_results=20, service=service, state_path=state_path)
+    assert new == [] and len(window) == 5
+    state = load_sync_state(state_path)
+    assert state["history_id"] == str(service.history_id)
+    assert {r["id"] for r in state["pending"]} == {"m000100", "m000101"}
+
+    service.fail_ids = {"m000101"}  # one sub-request of the retry fails again
+    window, new = sync_mailbox(max_results=20, service=service, state_path=state_path)
+    assert [e["id"] for e in new] == ["m000100"]
+    service.fail_ids = set()
+    window, new = sync_mailbox(max_results=20, service=service, state_path=state_path)
+    assert [e["id"] for e in new] == ["m000101"] and len(window) == 7
+    assert load_sync_state(state_path)["pending"] == []
+
+def test_deleted_message_is_not_retried(state_path):
+    service = FakeGmailService(make_mailbox(3))
+    service.add_messages(make_mailbox(1, start_id=100))
+    del service.by_id["m000100"]  # gone before its get: 404, not a retryable failure
+    window, new = sync_mailbox(max_results=20, service=service, state_path=state_path)
+    assert len(window) == 3 and load_sync_state(state_path)["pending"] == []
@@ -0,0 +1,75 @@
+import time
+from app.services import gmail_service
+from app.services.gmail_service import get_emails_from_last_24_hours, sync_mailbox, load_sync_state
+from tests.fakes import FakeGmailService, make_mailbox
+
+def _threaded_mailbox(n: int, threads: int, start_id: int = 0):
+    mailbox = make_mailbox(n, start_id=start_id)
+    for i, m in enumerate(mailbox):
+        m["threadId"] = f"t{i % threads}"
+    return mailbox
+
+def test_thread_mode_fetches_one_record_per_thread():
+    service = FakeGmailService(_threaded_mailbox(30, 5))
+    records = get_emails_from_last_24_hours(max_results=30, service=service, threads=True)
+    assert [r["id"] for r in records] == ["t0", "t1", "t2", "t3", "t4"]
+    assert service.thread_calls == 5 and service.get_calls == 0
+    assert service.round_trips == 2  # one list page + one batch of threads.get
+
+    t0 = records[0]
+    assert t0["messages"] == 6 and t0["thread_id"] == "t0"
+    assert t0["subject"] == "Subject 25"  # the thread's first message
+    assert t0["from"] == "alerts@bank.example"  # its newest message
+    assert t0["date"] == int(service.by_id["m000000"]["internalDate"]) // 1000
+    assert t0["snippet"].splitlines()[-1].endswith("Body snippet for message 0")
+
+def test_thread_record_is_compacted(monkeypatch):
+    monkeypatch.setattr(gmail_service, "THREAD_MAX_MESSAGES", 3)
+    mailbox = _threaded_mailbox(8, 1)
+    mailbox[1]["snippet"] = mailbox[0]["snippet"]  # a re-send of the same text
+    records = get_emails_from_last_24_hours(max_results=8, service=FakeGmailService(mailbox), threads=True)
+    lines = records[0]["snippet"].splitlines()
+    assert lines[0] == "(+5 earlier messages)"
+    # message 0 repeats message 1's text, so only the first copy is kept
+    assert lines[1:] == ["news@shop.example: Body snippet for message 2", "team@work.example: Body snippet for message 0"]
+
+def test_thread_sync_refetches_only_touched_threads(tmp_path):
+    path = str(tmp_path / "state.json")
+    service = FakeGmailService(_threaded_mailbox(12, 3))
+    window, new = sync_mailbox(max_results=20, service=service, state_path=path, threads=True)
+    assert len(window) == 3 and len(new) == 3
+    assert service.thread_calls == 3
+
+    window, new = sync_mailbox(max_results=20, service=service, state_path=path, threads=True)
+    assert new == [] and len(window) == 3 and service.thread_calls == 3
+
+    reply = make_mailbox(1, start_id=500, now=time.time() + 60)
+    reply[0]["threadId"] = "t2"
+    service.add_messages(reply)
+    window, new = sync_mailbox(max_results=20, service=service, state_path=path, threads=True)
+    assert [r["id"] for r in new] == ["t2"] and new[0]["messages"] == 5
+    assert window[0]["id"] == "t2"
+    assert service.thread_calls == 4
+
+    # switching back to per-message mode starts a fresh store
+    window, new = sync_mailbox(max_results=20, service=service, state_path=path, threads=False)
+    assert len(window) == 13 and load_sync_state(path)["unit"] == "messages"
+
+def test_failed_thread_fetch_keeps_record_and_retries(tmp_path):
+    path = str(tmp_path / "state.json")
+    service = FakeGmailService(_threaded_mailbox(12, 3))
+    sync_mailbox(max_results=20, service=service, state_path=path, threads=True)
+
+    reply = make_mailbox(1, start_id=500, now=time.time() + 60)
+    reply[0]["threadId"] = "t2"
+    service.add_messages(reply)
+    service.fail_ids = {"t2"}
+    window, new = sync_mailbox(max_results=20, service=service, state_path=path, threads=True)
+    assert new == [] and len(window) == 3  # the old t2 record stays in the window
+    assert next(r for r in window if r["id"] == "t2")["messages"] == 4
+    assert load_sync_state(path)["pending"] == [{"id": "t2", "threadId": "t2"}]
+
+    service.fail_ids = set()
+    window, new = sync_mailbox(max_results=20, service=service, state_path=path, threads=True)
+    assert [r["id"] for r in new] == ["t2"] and new[0]["messages"] == 5
+    assert load_sync_state(path)["pending"] == []
@@ -0,0 +1,61 @@
+import json
+from app.services.history_store import HistoryStore, ts_to_epoch
+
+def _summary(n):
+    return {"summary_of_emails": [f"point {i}" for i in range(n)], "actions": []}
+
+def test_pagination_and_time_range(tmp_path):
+    store = HistoryStore(str(tmp_path / "h.sqlite3"))
+    for day in range(1, 8):
+        store.add(f"202501{day:02d}_070000", _summary(day), day)
+    assert store.count() == 7
+    page1 = store.list(limit=3)
+    page2 = store.list(limit=3, offset=3)
+    assert [r["run_time"] for r in page1] == ["20250107_070000", "20250106_070000", "20250105_070000"]
+    assert [r["count"] for r in page2] == [4, 3, 2]
+
+    start, end = ts_to_epoch("20250102_000000"), ts_to_epoch("20250104_000000")
+    assert [r["count"] for r in store.list(start=start, end=end)] == [3, 2]
+    assert store.count(start=start, end=end) == 2
+
+def test_latest_is_cached_and_updated_on_add(tmp_path):
+    store = HistoryStore(str(tmp_path / "h.sqlite3"))
+    assert store.latest() is None
+    store.add("20250101_070000", _summary(1), 1)
+    assert store.latest()["run_time"] == "20250101_070000"
+    store.add("20250102_070000", _summary(2), 2)
+    store.add("20241231_070000", _summary(3), 3)  # older run imported late
+    assert store.latest()["run_time"] == "20250102_070000"
+    assert HistoryStore(str(tmp_path / "h.sqlite3")).latest()["count"] == 2
+
+def test_json_log_migration_is_idempotent(tmp_path):
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    for ts in ("20250101_070000", "20250102_070000"):
+        (log_dir / f"summary_{ts}.json").write_text(json.dumps({"time": ts, "summary": _summary(2), "count": 5}))
+    (log_dir / "summary_broken.json").write_text("{not json")
+
+    store = HistoryStore(str(tmp_path / "h.sqlite3"))
+    assert store.migrate_once(str(log_dir)) == 2
+    assert store.migrate_once(str(log_dir)) == 0
+    assert store.import_json_logs(str(log_dir)) == 0
+    assert store.latest()["summary"] == _summary(2)
+
+def test_latest_sees_runs_added_by_another_connection(tmp_path):
+    path = str(tmp_path / "h.sqlite3")
+    reader, writer = HistoryStore(path), HistoryStore(path)
+    writer.add("20250101_070000", _summary(1), 1)
+    assert reader.latest()["run_time"] == "20250101_070000"
+    writer.add("20250102_070000", _summary(2), 2)
+    assert reader.latest()["run_time"] == "20250102_070000"
+
+def test_json_import_keeps_same_time_runs_of_other_accounts(tmp_path):
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    ts = "20250101_070000"
+    (log_dir / f"summary_{ts}.json").write_text(json.dumps({"time": ts, "summary": _summary(1), "count": 1}))
+    (log_dir / f"summary_{ts}_work.json").write_text(json.dumps({"time": ts, "summary": _summary(2), "count": 2, "account": "work"}))
+    store = HistoryStore(str(tmp_path / "h.sqlite3"))
+    assert store.import_json_logs(str(log_dir)) == 2
+    assert store.import_json_logs(str(log_dir)) == 0
+    assert sorted(r.get("account", "") for r in store.list()) == ["", "work"]
@@ -0,0 +1,78 @@
+import json
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+from app.services.jobs import JobManager
+
+def test_duplicate_submits_collapse_into_inflight_job():
+    manager = JobManager(max_workers=2)
+    release = threading.Event()
+    runs = []
+
+    def work(progress):
+        runs.append(1)
+        progress("fetched", count=3)
+        release.wait(5)
+        return "done"
+
+    first = manager.submit("digest", work)
+    second = manager.submit("digest", work)
+    assert first is second
+    release.set()
+    while not first.done:
+        first.wait_events(len(first.events), timeout=1)
+    assert first.status == "succeeded"
+    assert first.result == "done"
+    assert runs == [1]
+    assert first.progress["fetched"] == {"count": 3}
+    assert manager.submit("digest", work) is not first
+
+def test_jobs_with_different_params_do_not_collapse():
+    manager = JobManager(max_workers=4)
+    release = threading.Event()
+
+    def work(progress, max_results=20, profile=False):
+        release.wait(5)
+        return max_results
+
+    small = manager.submit("digest", work, max_results=5, profile=False)
+    large = manager.submit("digest", work, max_results=50, profile=False)
+    profiled = manager.submit("digest", work, max_results=5, profile=True)
+    assert len({small.id, large.id, profiled.id}) == 3
+    assert manager.submit("digest", work, profile=False, max_results=5) is small
+    release.set()
+    while not large.done:
+        large.wait_events(len(large.events), timeout=1)
+    assert large.result == 50
+
+def test_failed_job_records_error():
+    manager = JobManager(max_workers=1)
+    job = manager.submit("digest", lambda progress: 1 / 0)
+    while not job.done:
+        job.wait_events(len(job.events), timeout=1)
+    assert job.status == "failed"
+    assert "division by zero" in job.error
+
+def test_run_now_returns_job_and_streams_progress(monkeypatch):
+    def fake_digest(max_results=20, progress=None, profile=None):
+        progress("fetched", count=2)
+        progress("summarized", chunk=1, total=1)
+        return {"summary_of_emails": ["a", "b"], "actions": []}
+
+    monkeypatch.setattr(main, "run_and_email_digest", fake_digest)
+    client = TestClient(main.app)
+    res = client.post("/run-now")
+    assert res.status_code == 202
+    job_id = res.json()["job_id"]
+
+    with client.stream("GET", f"/jobs/{job_id}/events") as stream:
+        events = [json.loads(line[len("data: "):]) for line in stream.iter_lines() if line.startswith("data: ")]
+    stages = [e["stage"] for e in events]
+    assert stages[-1] == "succeeded"
+    assert "fetched" in stages and "summarized" in stages
+
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "succeeded"
+    assert job["result"]["summary_of_emails"] == ["a", "b"]
+    assert client.get("/jobs/nope").status_code == 404
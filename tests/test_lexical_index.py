@@ -0,0 +1,107 @@
+import numpy as np
+from app.services import embeddings, vector_store
+from app.services.lexical_index import LexicalIndex, tokenize, looks_lexical
+from tests.fakes import FakeEmbeddingModel, FakeQdrantClient
+
+DAY = 86400
+
+def _emails():
+    return [
+        {"id": "a", "from": "Bank <alerts@bank.example>", "subject": "Your OTP 482913", "snippet": "Use this code to sign in", "date": 10 * DAY},
+        {"id": "b", "from": "shop@store.example", "subject": "Order #A-77120 shipped", "snippet": "Your parcel is on the way", "date": 11 * DAY},
+        {"id": "c", "from": "team@work.example", "subject": "Standup notes", "snippet": "Parcel tracking service is down again", "date": 12 * DAY},
+        {"id": "d", "from": "alerts@bank.example", "subject": "Statement ready", "snippet": "Your monthly statement is ready", "date": 13 * DAY},
+    ]
+
+def _docs(emails):
+    return [
+        {"id": e["id"], "text": vector_store._email_doc_text(e), "content_hash": e["id"], "sender": e["from"],
+         "date": e["date"], "payload": {"subject": e["subject"]}}
+        for e in emails
+    ]
+
+def test_tokenize_keeps_addresses_whole():
+    tokens = tokenize("From Alerts@Bank.example: OTP 482913")
+    assert "alerts@bank.example" in tokens and "bank" in tokens and "482913" in tokens
+    assert looks_lexical("alerts@bank.example") and looks_lexical("order A-77120")
+    assert not looks_lexical("parcel delivery problems")
+
+def test_bm25_ranks_exact_terms_and_pushes_down_filters(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lex.sqlite3"))
+    index.upsert(_docs(_emails()))
+    assert [r["id"] for r in index.search("482913")] == ["a"]
+    assert index.search("77120")[0]["payload"] == {"subject": "Order #A-77120 shipped"}
+    assert {r["id"] for r in index.search("alerts@bank.example")} == {"a", "d"}
+    assert [r["id"] for r in index.search("parcel", sender="shop@store.example")] == ["b"]
+    assert [r["id"] for r in index.search("parcel", after=12 * DAY)] == ["c"]
+    assert [r["id"] for r in index.search("", sender="alerts@bank.example", before=13 * DAY)] == ["a"]
+
+    index.delete(["b"])
+    assert [r["id"] for r in index.search("parcel")] == ["c"]
+    reloaded = LexicalIndex(str(tmp_path / "lex.sqlite3"))
+    assert reloaded.count == 3
+    assert reloaded.get_hashes(["a", "b"]) == {"a": "a"}
+
+def _setup(monkeypatch, tmp_path):
+    model = FakeEmbeddingModel(dim=8)
+    client = FakeQdrantClient()
+    monkeypatch.setattr(embeddings, "_model", model)
+    monkeypatch.setattr(vector_store, "_get_client", lambda: client)
+    monkeypatch.setattr(vector_store, "ensure_collection", lambda: None)
+    monkeypatch.setattr(vector_store, "_backend", None)
+    monkeypatch.setattr(vector_store, "VECTOR_BACKEND", "qdrant")
+    monkeypatch.setattr(vector_store, "_lexical", LexicalIndex(str(tmp_path / "lex.sqlite3")))
+    vector_store.upsert_emails(_emails())
+    return model, client
+
+def test_lexical_query_skips_embedding_model(monkeypatch, tmp_path):
+    model, client = _setup(monkeypatch, tmp_path)
+    calls = model.calls
+    results = vector_store.search_emails("482913", top_k=3)
+    assert results[0]["id"] == vector_store._point_id({"id": "a"}, 0)
+    assert model.calls == calls
+    assert "search" not in client.calls
+
+def test_hybrid_fuses_both_engines_and_filters_vector_side(monkeypatch, tmp_path):
+    model, client = _setup(monkeypatch, tmp_path)
+    results = vector_store.search_emails("parcel on the way", top_k=4)
+    assert len(results) == 4  # vector hits without a term match still come through
+    assert results[0]["id"] == vector_store._point_id({"id": "b"}, 0)
+    assert client.calls["search"] == 1
+
+    filtered = vector_store.search_emails("statement", top_k=5, sender="alerts@bank.example", after="1970-01-13")
+    assert [r["payload"]["subject"] for r in filtered] == ["Statement ready"]
+    vector_only = vector_store.search_emails("anything", top_k=5, mode="vector", before=11 * DAY)
+    assert [r["payload"]["subject"] for r in vector_only] == ["Your OTP 482913"]
+
+def test_fuse_results_rewards_agreement():
+    a = [{"id": "x", "payload": {}}, {"id": "y", "payload": {}}]
+    b = [{"id": "y", "payload": {}}, {"id": "z", "payload": {}}]
+    fused = vector_store.fuse_results([a, b], top_k=3, k=60)
+    assert [r["id"] for r in fused] == ["y", "x", "z"]
+    assert np.isclose(fused[0]["score"], 1 / 62 + 1 / 61)
+
+def test_local_backend_filters(tmp_path):
+    backend = vector_store.LocalBackend(str(tmp_path / "index"))
+    emails = _emails()
+    vecs = np.eye(4, dtype=np.float32)
+    backend.upsert([e["id"] for e in emails], vecs, [vector_store._payload(e, e["id"]) for e in emails])
+    hits = backend.search(vecs[1], 4, filters={"sender": "alerts@bank.example", "after": None, "before": None})
+    assert {h["id"] for h in hits} == {"a", "d"}
+    assert {h["id"] for h in backend.search(vecs[1], 4, filters={"after": 12 * DAY})} == {"c", "d"}
+
+def test_search_is_scoped_to_account(monkeypatch, tmp_path):
+    model, client = _setup(monkeypatch, tmp_path)  # _emails() indexed without an account: the default mailbox
+    bob = [{"id": "x1", "from": "alerts@bank.example", "subject": "Bob statement ready", "snippet": "Parcel and statement", "date": 14 * DAY}]
+    vector_store.upsert_emails(bob, account_id="bob")
+    for mode in ("hybrid", "vector", "lexical"):
+        mine = vector_store.search_emails("statement parcel", top_k=10, mode=mode)
+        assert "Bob statement ready" not in {r["payload"]["subject"] for r in mine}
+        theirs = vector_store.search_emails("statement parcel", top_k=10, mode=mode, account="bob")
+        assert [r["payload"]["subject"] for r in theirs] == ["Bob statement ready"]
+
+    backend = vector_store.LocalBackend(str(tmp_path / "index"))
+    vecs = np.eye(2, dtype=np.float32)
+    backend.upsert(["p1", "p2"], vecs, [{"account": "alice"}, {}])
+    assert [h["id"] for h in backend.search(vecs[0], 2, filters={"account": "default"})] == ["p2"]
+    assert [h["id"] for h in backend.search(vecs[1], 2, filters={"account": "alice"})] == ["p1"]
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from app.services.local_index import LocalVectorIndex
+from app.services import embeddings, vector_store
+from tests.fakes import make_mailbox
+
+def _vecs(n, dim=8, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+def test_exact_top_k_matches_brute_force(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    vecs = _vecs(50)
+    index.upsert([f"p{i}" for i in range(50)], vecs, [{"n": i} for i in range(50)])
+    hits = index.search(vecs[7], top_k=3)
+    assert hits[0]["id"] == "p7"
+    assert hits[0]["payload"] == {"n": 7}
+    assert hits[0]["score"] == pytest.approx(1.0, abs=1e-5)
+    assert [h["score"] for h in hits] == sorted([h["score"] for h in hits], reverse=True)
+
+def test_overwrite_delete_compact_and_reopen(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    vecs = _vecs(2000)  # crosses the initial memmap capacity
+    ids = [f"p{i}" for i in range(2000)]
+    index.upsert(ids, vecs, [{"content_hash": str(i)} for i in range(2000)])
+    index.upsert(["p1"], vecs[5:6], [{"content_hash": "new"}])
+    index.delete(["p5", "p9"])
+    assert index.count == 1998
+    assert index.search(vecs[5], top_k=1)[0]["id"] == "p1"
+    assert index.get_hashes(["p1", "p5", "missing"]) == {"p1": "new"}
+
+    index.compact()
+    reopened = LocalVectorIndex(str(tmp_path))
+    assert reopened.count == 1998
+    assert reopened.search(vecs[100], top_k=1)[0]["id"] == "p100"
+
+def test_hnsw_index_finds_exact_neighbour(tmp_path):
+    pytest.importorskip("hnswlib")
+    index = LocalVectorIndex(str(tmp_path), ann="hnsw", ann_min_rows=10)
+    vecs = _vecs(300, dim=16)
+    index.upsert([f"p{i}" for i in range(300)], vecs, [{} for _ in range(300)])
+    assert index.search(vecs[42], top_k=1)[0]["id"] == "p42"
+    index.delete(["p42"])
+    assert index.search(vecs[42], top_k=1)[0]["id"] != "p42"
+
+def test_vector_store_with_local_backend(tmp_path, monkeypatch):
+    class Model:
+        def get_sentence_embedding_dimension(self):
+            return 8
+        def encode(self, texts, **kw):
+            single = isinstance(texts, str)
+            items = [texts] if single else texts
+            out = np.array([[t.count(str(d)) + 0.01 for d in range(8)] for t in items], dtype=np.float32)
+            return out[0] if single else out
+
+    monkeypatch.setattr(embeddings, "_model", Model())
+    monkeypatch.setattr(vector_store, "_backend", vector_store.LocalBackend(str(tmp_path)))
+    assert vector_store.upsert_emails(make_mailbox(20)) == 20
+    assert vector_store.upsert_emails(make_mailbox(20)) == 0
+    assert len(vector_store.search_emails("Subject 3", top_k=5)) == 5
+    vector_store.delete_emails(["m000003"])
+    assert vector_store.get_backend().index.count == 19
@@ -0,0 +1,28 @@
+from app.services import summarizer
+
+class FakePipeline:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, **kwargs):
+        self.calls.append((list(texts), kwargs))
+        return [{"summary_text": f"summary of {len(t.split())} words"} for t in texts]
+
+def test_pipeline_built_once_and_called_batched(monkeypatch):
+    builds = []
+    fake = FakePipeline()
+    monkeypatch.setattr(summarizer, "_local_pipelines", {})
+    monkeypatch.setattr(summarizer, "_build_local_pipeline", lambda model, quantize: builds.append((model, quantize)) or fake)
+    # count words instead of loading the model's tokenizer
+    monkeypatch.setattr(summarizer, "get_token_counter", lambda backend: lambda text: len(text.split()))
+    monkeypatch.setattr(summarizer, "token_budget", lambda backend: 600)
+
+    text = " ".join(["word"] * 1500)  # 3 chunks of <=600 words
+    for _ in range(3):
+        res = summarizer.call_transformers_local(text)
+    content = res["choices"][0]["message"]["content"]
+    assert content.split("\n\n") == ["summary of 600 words", "summary of 600 words", "summary of 300 words"]
+    assert builds == [(summarizer.HF_LOCAL_MODEL, summarizer.HF_LOCAL_QUANTIZE)]
+    assert len(fake.calls) == 3
+    assert len(fake.calls[0][0]) == 3
+    assert fake.calls[0][1]["batch_size"] == summarizer.HF_LOCAL_BATCH_SIZE
@@ -0,0 +1,43 @@
+import time
+import threading
+from app.services.rate_limiter import TokenBucket, parse_rate_limits
+
+def test_parse_rate_limits():
+    assert parse_rate_limits("Perplexity=2, Gemini=0.5,bad") == {"Perplexity": 2.0, "Gemini": 0.5}
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    t0 = time.perf_counter()
+    for _ in range(6):
+        bucket.acquire()
+    # first token is free, the other 5 wait ~20ms each
+    assert time.perf_counter() - t0 >= 0.08
+
+def test_token_bucket_timeout():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0.01)
+
+def test_concurrent_summarize_preserves_order(monkeypatch):
+    from app.services import summarizer
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fake_chunk(template, text, on_item=None):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        # chunk_text re-joins words: "From: a@b.c Subject: s0 x"
+        return {"summary_of_emails": [text.split()[3]], "actions": []}
+
+    monkeypatch.setattr(summarizer, "summarize_chunk", fake_chunk)
+    monkeypatch.setattr(summarizer, "CHUNK_STRATEGY", "fixed")
+    monkeypatch.setattr(summarizer, "CHUNK_SIZE", 1)
+    emails = [{"id": str(i), "from": "a@b.c", "subject": f"s{i}", "snippet": "x"} for i in range(10)]
+
+    out = summarizer.summarize_emails(emails, concurrency=4)
+    assert out["summary_of_emails"] == [f"s{i}" for i in range(10)]
+    assert 1 < peak[0] <= 4
@@ -0,0 +1,89 @@
+import json
+import math
+import re
+import pytest
+from app.services import summarizer
+from app.services.reducer import group_partials, merge_partials, render_partial
+
+def _count(text):
+    return len(text.split())
+
+def test_merge_partials_dedupes_ranks_and_bounds():
+    partials = [
+        {"summary_of_emails": ["📂 Promotions: Shoe sale", "📂 Work: Deploy failed on main"],
+         "actions": [{"name": "CI", "action": "Fix the build"}]},
+        {"summary_of_emails": ["📂 Banking: Card payment due Friday", "📂 work: deploy failed on main."],
+         "actions": [{"name": "CI", "action": "fix the build"}, {"name": "Bank", "action": "Pay card"}]},
+        {"summary_of_emails": ["Error producing summary"], "actions": []},
+    ]
+    merged = merge_partials(partials, max_points=2, max_actions=5)
+    assert merged["summary_of_emails"] == ["📂 Work: Deploy failed on main", "📂 Banking: Card payment due Friday"]
+    assert merged["actions"] == [{"name": "CI", "action": "Fix the build"}, {"name": "Bank", "action": "Pay card"}]
+    in_order = merge_partials(partials[:1], rank=False)
+    assert in_order["summary_of_emails"] == partials[0]["summary_of_emails"]
+
+def test_group_partials_respects_fanin_and_budget():
+    partials = [{"summary_of_emails": [f"📂 Work: point {i} " + "word " * 20 for i in range(10)], "actions": []}
+                for _ in range(9)]
+    groups = group_partials(partials, available=10_000, count_tokens=_count, fanin=4)
+    assert [len(g) for g in groups] == [4, 4, 1]
+    tight = group_partials(partials, available=200, count_tokens=_count, fanin=8)
+    assert all(len(g) >= 2 for g in tight[:-1])
+    for g in tight:
+        assert sum(_count(render_partial(p, i)) for i, p in enumerate(g, 1)) <= 200
+
+def _fake_backend(calls):
+    def complete(prompt):
+        if "Partial digests to merge" in prompt:
+            calls.append("reduce")
+            points = [line[2:] for line in prompt.split("Partial digests to merge:")[1].splitlines() if line.startswith("- 📂")]
+            return {"summary_of_emails": points[:40], "actions": [{"name": "me", "action": "review"}]}
+        calls.append("map")
+        subjects = re.findall(r"Subject: (s\d+)", prompt)
+        return {"summary_of_emails": [f"📂 Work: {s}" for s in subjects], "actions": []}
+    return complete
+
+def test_mapreduce_bounds_digest_with_log_reduce_rounds(monkeypatch):
+    calls, events = [], []
+    monkeypatch.setattr(summarizer, "get_summary_cache", lambda: None)
+    monkeypatch.setattr(summarizer, "summarize_with_backends", _fake_backend(calls))
+    monkeypatch.setattr(summarizer, "CHUNK_STRATEGY", "fixed")
+    monkeypatch.setattr(summarizer, "CHUNK_SIZE", 2)
+    monkeypatch.setattr(summarizer, "SUMMARY_STREAMING", False)
+    emails = [{"id": str(i), "from": "a@b.c", "subject": f"s{i}", "snippet": "x"} for i in range(400)]
+
+    out = summarizer.summarize_emails(emails, concurrency=4, mode="mapreduce",
+                                      progress=lambda stage, **d: events.append((stage, d)))
+    assert calls.count("map") == 200
+    assert 200 / 8 <= calls.count("reduce") <= math.ceil(200 / 7) + 3
+    assert len(out["summary_of_emails"]) == summarizer.DIGEST_MAX_POINTS
+    assert out["actions"] == [{"name": "me", "action": "review"}]
+    rounds = [d for stage, d in events if stage == "reduced"]
+    assert len(rounds) <= math.ceil(math.log(200, 2)) and rounds[-1]["remaining"] == 1
+    assert [d["text"] for stage, d in events if stage == "summary_point"] == out["summary_of_emails"]
+
+def test_failed_reduce_merges_locally(monkeypatch):
+    monkeypatch.setattr(summarizer, "get_summary_cache", lambda: None)
+    monkeypatch.setattr(summarizer, "summarize_with_backends",
+                        lambda prompt: {"summary_of_emails": [summarizer.ERROR_SUMMARY], "actions": []})
+    partials = [{"summary_of_emails": [f"📂 Work: item {i}", "📂 Work: shared"], "actions": []} for i in range(3)]
+    out = summarizer.reduce_summaries(partials, concurrency=1)
+    assert out["summary_of_emails"][0] == "📂 Work: shared"
+    assert set(out["summary_of_emails"]) == {"📂 Work: shared", "📂 Work: item 0", "📂 Work: item 1", "📂 Work: item 2"}
+    assert json.dumps(out)
+
+@pytest.mark.parametrize("answer", ["", "{}"])
+def test_unparseable_reduce_answer_merges_locally(monkeypatch, answer):
+    # the parse fallback / an empty digest must not lose the whole group
+    monkeypatch.setattr(summarizer, "get_summary_cache", lambda: None)
+    monkeypatch.setattr(summarizer, "summarize_with_backends", lambda prompt: summarizer.safe_parse_json_from_text(answer))
+    partials = [{"summary_of_emails": [f"📂 Work: item {i}"], "actions": []} for i in range(3)]
+    out = summarizer.reduce_summaries(partials, concurrency=1)
+    assert sorted(out["summary_of_emails"]) == ["📂 Work: item 0", "📂 Work: item 1", "📂 Work: item 2"]
+
+def test_triage_lines_stay_within_digest_bound():
+    summary = {"summary_of_emails": [f"📂 Work: point {i}" for i in range(summarizer.DIGEST_MAX_POINTS - 2)], "actions": []}
+    lines = [f"📂 Promotions: 1 email from shop{i}: Sale" for i in range(50)]
+    out = summarizer._add_triage_lines(summary, lines)
+    assert len(out["summary_of_emails"]) == summarizer.DIGEST_MAX_POINTS
+    assert out["summary_of_emails"][-2:] == lines[:2]
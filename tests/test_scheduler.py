@@ -0,0 +1,56 @@
+import json
+import threading
+import pytest
+from app.services import accounts, scheduler
+
+def test_load_accounts_applies_defaults(tmp_path):
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps({"accounts": [
+        {"id": "alice", "hour": 6, "timezone": "Europe/Berlin"},
+        {"id": "bob", "token_path": "secrets/bob.json", "enabled": False},
+    ]}))
+    alice, bob = accounts.load_accounts(str(path))
+    assert alice["token_path"] == accounts.token_path_for("alice")
+    assert (alice["hour"], alice["minute"], alice["timezone"]) == (6, accounts.SCHEDULE_MINUTE, "Europe/Berlin")
+    assert bob["token_path"] == "secrets/bob.json"
+    assert not bob["enabled"]
+    assert accounts.load_accounts(str(tmp_path / "missing.json"))[0]["id"] == accounts.DEFAULT_ACCOUNT
+
+def test_account_ids_cannot_escape_token_dir():
+    with pytest.raises(ValueError):
+        accounts.token_path_for("../etc/passwd")
+
+def test_scheduler_registers_job_per_account():
+    accs = [
+        {"id": "alice", "hour": 6, "minute": 30, "timezone": "Europe/Berlin", "max_results": 10, "enabled": True},
+        {"id": "bob", "hour": 7, "minute": 0, "timezone": "America/New_York", "max_results": 10, "enabled": True},
+        {"id": "carol", "hour": 7, "minute": 0, "timezone": "UTC", "max_results": 10, "enabled": False},
+    ]
+    sched = scheduler.start_scheduler(accs)
+    try:
+        jobs = {j.id: j for j in sched.get_jobs()}
+        assert set(jobs) == {"digest:alice", "digest:bob"}
+        assert str(jobs["digest:alice"].trigger.timezone) == "Europe/Berlin"
+        assert jobs["digest:bob"].trigger.jitter == scheduler.SCHEDULE_JITTER
+    finally:
+        scheduler.stop_scheduler()
+
+def test_run_all_accounts_uses_bounded_pool(monkeypatch):
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fake_digest(max_results=None, account_id=None):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        threading.Event().wait(0.01)
+        with lock:
+            active[0] -= 1
+        return {"summary_of_emails": [account_id], "actions": []}
+
+    monkeypatch.setattr(scheduler, "run_and_email_digest", fake_digest)
+    accs = [accounts._with_defaults({"id": f"acct{i}"}) for i in range(20)]
+    results = scheduler.run_all_accounts(accs, workers=3)
+    assert results["acct7"]["summary_of_emails"] == ["acct7"]
+    assert len(results) == 20
+    assert peak[0] <= 3
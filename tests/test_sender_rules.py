@@ -0,0 +1,60 @@
+import json
+import os
+import time
+from app.services import sender_rules
+from app.services.sender_rules import SenderMatcher, tag_essential
+
+def test_matcher_keeps_substring_semantics():
+    rules = ["Alerts@Bank.com", "@nptel.ac.in", "hod", "he", "she"]
+    m = SenderMatcher(rules)
+    assert m.match("Bank <alerts@bank.com>") == ["Alerts@Bank.com"]
+    assert m.match("exams@nptel.ac.in") == ["@nptel.ac.in"]
+    assert m.match("indus.HOD@uni.ac.in") == ["hod"]
+    assert set(m.match("ushers@x.org")) == {"he", "she"}  # overlapping rules via failure links
+    assert m.match("someone@else.org") == []
+    for sender in ["Bank <alerts@bank.com>", "indus.HOD@uni.ac.in", "ushers@x.org", "nobody@nowhere"]:
+        assert m.is_essential(sender) == any(r.lower() in sender.lower() for r in rules)
+
+def test_rules_reload_on_mtime_and_invalidate(tmp_path, monkeypatch):
+    path = tmp_path / "essential.json"
+    path.write_text(json.dumps({"senders": ["bank.com"]}))
+    monkeypatch.setattr(sender_rules, "ESSENTIAL_PATH", str(path))
+    sender_rules.invalidate_sender_rules()
+    first = sender_rules.get_sender_matcher()
+    assert sender_rules.get_sender_matcher() is first  # unchanged file: no recompile
+
+    path.write_text(json.dumps({"senders": ["bank.com", "shop.com"]}))
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert sender_rules.get_sender_matcher().rules == ["bank.com", "shop.com"]
+
+    path.write_text(json.dumps({"senders": ["work.com"]}))
+    sender_rules.invalidate_sender_rules()
+    assert sender_rules.get_sender_matcher().rules == ["work.com"]
+    sender_rules.invalidate_sender_rules()
+
+def test_tag_essential_single_pass(tmp_path, monkeypatch):
+    path = tmp_path / "essential.json"
+    path.write_text(json.dumps({"senders": ["bank.com"]}))
+    monkeypatch.setattr(sender_rules, "ESSENTIAL_PATH", str(path))
+    sender_rules.invalidate_sender_rules()
+    emails = [
+        {"id": "1", "from": "alerts@bank.com"},
+        {"id": "2", "from": "news@shop.com"},
+        {"id": "1", "from": "alerts@bank.com"},
+    ]
+    tagged, count = tag_essential(emails)
+    assert [e["id"] for e in tagged] == ["1", "2"]
+    assert count == 1
+    assert tagged[0]["essential"] is True and "essential" not in tagged[1]
+    assert "essential" not in emails[0]
+    sender_rules.invalidate_sender_rules()
+
+def test_many_rules_many_emails_fast():
+    rules = [f"sender{i}@domain{i % 50}.example" for i in range(5000)]
+    m = SenderMatcher(rules)
+    senders = [f"Person <sender{i % 7000}@domain{i % 50}.example>" for i in range(100_000)]
+    t0 = time.perf_counter()
+    hits = [m.is_essential(s) for s in senders]
+    assert time.perf_counter() - t0 < 5
+    for s, hit in list(zip(senders, hits))[:500]:
+        assert hit == any(r in s.lower() for r in rules)
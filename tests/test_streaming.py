@@ -0,0 +1,105 @@
+import json
+import time
+
+import pytest
+from app.services import summarizer
+from app.services.backend_router import BackendRouter
+from app.services.stream_parser import SummaryStreamParser
+from tests.fakes import FakeStreamingLLMServer
+
+ANSWER = json.dumps({
+    "summary_of_emails": ["📂 Banking: Card statement ready", "📂 Work: Standup moved to 10:00", 'Quote \\"x\\" and } brace'],
+    "actions": [{"name": "Bank", "action": "Pay card"}, {"name": "Team", "action": "Join {standup}"}],
+}, ensure_ascii=False)
+
+
+def test_parser_emits_items_as_they_complete():
+    parser = SummaryStreamParser()
+    events = []
+    for ch in "```json\n" + ANSWER + "\n```":
+        events.extend(parser.feed(ch))
+    expected = json.loads(ANSWER)
+    assert [i for k, i in events if k == "summary"] == expected["summary_of_emails"]
+    assert [i for k, i in events if k == "action"] == expected["actions"]
+    assert parser.complete
+    assert parser.result() == expected
+
+
+def test_parser_first_point_before_answer_ends():
+    parser = SummaryStreamParser()
+    cut = ANSWER.index('", "📂 Work') + 1
+    assert parser.feed(ANSWER[:cut]) == [("summary", "📂 Banking: Card statement ready")]
+    assert not parser.complete
+
+
+@pytest.fixture
+def perplexity_server(monkeypatch):
+    with FakeStreamingLLMServer(ANSWER, pieces=20, delay=0.05) as server:
+        monkeypatch.setenv("PERPLEXITY_API_KEY", "test")
+        monkeypatch.setenv("PERPLEXITY_BASE_URL", server.url)
+        monkeypatch.setattr(summarizer, "_perplexity_client", None)
+        monkeypatch.setattr(summarizer, "BACKENDS", [("Perplexity", summarizer.call_perplexity)])
+        monkeypatch.setattr(summarizer, "get_router", lambda: BackendRouter(timeouts={}, hedge_factor=0))
+        yield server
+    summarizer._perplexity_client = None
+
+
+def test_first_summary_arrives_before_generation_ends(perplexity_server):
+    arrivals = []
+    t0 = time.monotonic()
+    result = summarizer.stream_with_backends("prompt", lambda kind, item: arrivals.append((time.monotonic() - t0, kind, item)))
+    total = time.monotonic() - t0
+
+    assert perplexity_server.requests[0]["stream"] is True
+    assert result == json.loads(ANSWER)
+    assert [item for _, kind, item in arrivals if kind == "summary"] == result["summary_of_emails"]
+    # 20 deltas x 50ms: the first point is complete after 3 of them, so it
+    # arrives well before the generation ends (client start-up time aside)
+    assert total - arrivals[0][0] > 0.5
+
+
+def test_summarize_direct_streams_events(perplexity_server, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    monkeypatch.setattr(summarizer, "get_summary_cache", lambda: None)
+    emails = [{"id": "1", "from": "bank@x.com", "subject": "Statement", "snippet": "Your statement"}]
+
+    client = TestClient(app)
+    with client.stream("POST", "/summarize/direct?stream=true", json={"emails": emails}) as response:
+        events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+
+    stages = [e["stage"] for e in events]
+    assert stages.index("summary_point") < stages.index("succeeded") < stages.index("result")
+    assert events[-1]["summary"] == json.loads(ANSWER)
+    assert [e["text"] for e in events if e["stage"] == "summary_point"] == json.loads(ANSWER)["summary_of_emails"]
+
+
+def test_mid_stream_failure_retracts_streamed_items(monkeypatch):
+    first_point = json.loads(ANSWER)["summary_of_emails"][0]
+    fallback = {"summary_of_emails": [first_point], "actions": []}
+    with FakeStreamingLLMServer(ANSWER, pieces=20, fail_after=8) as server:
+        monkeypatch.setenv("PERPLEXITY_API_KEY", "test")
+        monkeypatch.setenv("PERPLEXITY_BASE_URL", server.url)
+        monkeypatch.setattr(summarizer, "_perplexity_client", None)
+        monkeypatch.setattr(summarizer, "get_router", lambda: BackendRouter(timeouts={}, hedge_factor=0, routing="ordered"))
+        monkeypatch.setattr(summarizer, "get_summary_cache", lambda: None)
+
+        monkeypatch.setattr(summarizer, "BACKENDS", [("Perplexity", summarizer.call_perplexity),
+                                                    ("Local", lambda prompt: {"choices": [{"message": {"content": json.dumps(fallback)}}]})])
+        events = []
+        emails = [{"id": "1", "from": "bank@x.com", "subject": "Statement", "snippet": "Your statement"}]
+        out = summarizer.summarize_emails(emails, progress=lambda stage, **d: events.append((stage, d)))
+        streamed = [(stage, d) for stage, d in events if stage in ("summary_point", "reset")]
+        reset = [stage for stage, _ in streamed].index("reset")
+        voided = [d["text"] for _, d in streamed[:reset]]
+        assert voided[0] == first_point and len(voided) < 3
+        assert streamed[reset] == ("reset", {"summary_of_emails": voided, "actions": []})
+        assert streamed[reset + 1:] == [("summary_point", {"text": first_point})]  # re-sent by the fallback
+        assert out == fallback
+
+        # every backend fails: the only streamed point is retracted
+        monkeypatch.setattr(summarizer, "BACKENDS", [("Perplexity", summarizer.call_perplexity)])
+        arrivals = []
+        result = summarizer.stream_with_backends("prompt", lambda kind, item: arrivals.append(kind))
+        assert arrivals == ["summary"] * len(voided) + ["reset"] and result["summary_of_emails"] == [summarizer.ERROR_SUMMARY]
+    summarizer._perplexity_client = None
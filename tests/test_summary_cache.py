@@ -0,0 +1,77 @@
+import time
+from app.services.summary_cache import SummaryCache, MemoryCacheBackend, SQLiteCacheBackend, make_key
+
+def test_key_depends_on_template_backend_and_chunk():
+    base = make_key("tmpl", "Perplexity", "chunk")
+    assert base == make_key("tmpl", "Perplexity", "chunk")
+    assert base != make_key("tmpl2", "Perplexity", "chunk")
+    assert base != make_key("tmpl", "Gemini", "chunk")
+    assert base != make_key("tmpl", "Perplexity", "chunk2")
+
+def test_hits_misses_and_ttl():
+    cache = SummaryCache(MemoryCacheBackend(), ttl=1, max_entries=10)
+    assert cache.get("k") is None
+    cache.set("k", {"summary_of_emails": ["a"], "actions": []})
+    assert cache.get("k") == {"summary_of_emails": ["a"], "actions": []}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    cache.backend._data["k"] = (cache.backend._data["k"][0], time.time() - 5)
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+def test_sqlite_lru_eviction_and_persistence(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SummaryCache(SQLiteCacheBackend(path), ttl=0, max_entries=2)
+    cache.set("a", {"n": 1})
+    time.sleep(0.01)
+    cache.set("b", {"n": 2})
+    time.sleep(0.01)
+    cache.get("a")  # a becomes most recently used
+    time.sleep(0.01)
+    cache.set("c", {"n": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1}
+
+    reopened = SummaryCache(SQLiteCacheBackend(path), ttl=0, max_entries=2)
+    assert reopened.stats()["entries"] == 2
+    assert reopened.get("c") == {"n": 3}
+
+class _FakeRouter:
+    """Answers every prompt from the backend at `answer_from` in the chain."""
+    def __init__(self, content, answer_from=0):
+        self.content, self.answer_from, self.calls = content, answer_from, []
+
+    def complete(self, prompt, backends):
+        self.calls.append(prompt)
+        return backends[self.answer_from][0], self.content
+
+def test_summarize_emails_rerun_skips_backends(monkeypatch):
+    from app.services import summarizer
+    cache = SummaryCache(MemoryCacheBackend())
+    router = _FakeRouter('{"summary_of_emails": ["ok"], "actions": []}')
+    calls = router.calls
+    monkeypatch.setattr(summarizer, "get_summary_cache", lambda: cache)
+    monkeypatch.setattr(summarizer, "get_router", lambda: router)
+    monkeypatch.setattr(summarizer, "BACKENDS", [("Perplexity", None), ("Local", None)])
+    emails = [{"id": str(i), "from": "a@b.c", "subject": f"s{i}", "snippet": "x"} for i in range(12)]
+
+    first = summarizer.summarize_emails(emails)
+    n_calls = len(calls)
+    second = summarizer.summarize_emails(emails)
+    assert n_calls > 0
+    assert len(calls) == n_calls
+    assert first == second
+    assert cache.stats()["hits"] == n_calls
+
+def test_degraded_answers_are_not_cached(monkeypatch):
+    from app.services import summarizer
+    cache = SummaryCache(MemoryCacheBackend())
+    monkeypatch.setattr(summarizer, "get_summary_cache", lambda: cache)
+    monkeypatch.setattr(summarizer, "BACKENDS", [("Perplexity", None), ("Local", None)])
+    for router in (_FakeRouter('{"summary_of_emails": ["ok"], "actions": []}', answer_from=1),  # fallback answered
+                   _FakeRouter("")):  # primary answered, but nothing parseable
+        monkeypatch.setattr(summarizer, "get_router", lambda: router)
+        summarizer.summarize_chunk("{emails_text}", "chunk")
+        summarizer.summarize_chunk("{emails_text}", "chunk")
+        assert len(router.calls) == 2
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,50 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services import telemetry
+from app.services.telemetry import span, start_run, submit_in_context, MetricsRegistry
+
+
+def test_spans_add_up_per_run_across_threads():
+    with start_run("test") as run:
+        with span("gmail.list"):
+            time.sleep(0.01)
+
+        def work():
+            with span("llm", backend="Fake"):
+                time.sleep(0.01)
+        with ThreadPoolExecutor(2) as pool:
+            for f in [submit_in_context(pool, work) for _ in range(3)]:
+                f.result()
+        # nested runs reuse the outer one
+        with start_run("inner") as inner:
+            assert inner is run
+
+    timings = run.timings()
+    assert timings["kind"] == "test"
+    assert timings["spans"]["gmail.list"]["count"] == 1
+    assert timings["spans"]["llm[Fake]"]["count"] == 3
+    assert timings["spans"]["run.test"]["count"] == 1
+    assert timings["wall_ms"] >= 20
+    assert telemetry.current_run() is None
+
+
+def test_prometheus_rendering():
+    registry = MetricsRegistry()
+    registry.observe("gmail.get", {"mode": "batch"}, 0.02)
+    registry.observe("gmail.get", {"mode": "batch"}, 3.0, error=True)
+    registry.inc("runs", kind="digest")
+    text = registry.render()
+    assert 'mailsmart_span_seconds_bucket{span="gmail.get",mode="batch",le="0.025"} 1' in text
+    assert 'mailsmart_span_seconds_bucket{span="gmail.get",mode="batch",le="+Inf"} 2' in text
+    assert 'mailsmart_span_seconds_count{span="gmail.get",mode="batch"} 2' in text
+    assert 'mailsmart_span_errors_total{span="gmail.get",mode="batch"} 1' in text
+    assert 'mailsmart_runs_total{kind="digest"} 1' in text
+
+
+def test_profile_mode_writes_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetry, "PROFILE_DIR", str(tmp_path))
+    with start_run("profiled", profile=True) as run:
+        sum(i * i for i in range(10000))
+    assert run.timings()["profile"].startswith(str(tmp_path))
+    assert (tmp_path / run.profile_path.split("/")[-1]).exists()
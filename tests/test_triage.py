@@ -0,0 +1,60 @@
+import numpy as np
+from app.services import summarizer, triage
+from app.services.triage import classify, header_category, templated_summary
+
+# 3-d "embeddings": promo, social, important
+PROTOS = (["Promotions", "Social", "keep"], np.eye(3, dtype=np.float32))
+
+def test_header_heuristics():
+    assert header_category({"from": "Shop <deals@shop.com>", "subject": "Weekend picks"}) == "Promotions"
+    assert header_category({"from": "a@b.com", "subject": "40% off all shoes"}) == "Promotions"
+    assert header_category({"from": "notification@facebookmail.com", "subject": "Ann"}) == "Social"
+    assert header_category({"from": "deals@shop.com", "subject": "Your order has shipped"}) is None
+    assert header_category({"from": "boss@work.com", "subject": "Quarterly plan"}) is None
+    assert classify({"from": "deals@shop.com", "subject": "Sale", "essential": True}) is None
+
+def test_embeddings_veto_and_detect(monkeypatch):
+    monkeypatch.setattr(triage, "_prototypes", PROTOS)
+    promo_header = {"from": "news@shop.com", "subject": "This week"}
+    plain = {"from": "someone@site.com", "subject": "Hello"}
+    looks_important = np.array([0.1, 0.0, 0.9], dtype=np.float32)
+    looks_promo = np.array([0.9, 0.1, 0.1], dtype=np.float32)
+    keep, skipped = triage.triage([promo_header, plain, dict(plain, id="2")], [looks_important, looks_promo, None])
+    assert keep == [promo_header, dict(plain, id="2")]
+    assert skipped == {"Promotions": [plain]}
+
+def test_templated_summary_groups_by_sender():
+    lines = templated_summary({"Promotions": [
+        {"from": "Shop <deals@shop.com>", "subject": "A"},
+        {"from": "Shop <deals@shop.com>", "subject": "B"},
+        {"from": "Shop <deals@shop.com>", "subject": "C"},
+        {"from": "news@paper.com", "subject": "Daily"},
+    ]})
+    assert lines == [
+        "📂 Promotions: 3 emails from Shop: A; B (+1 more)",
+        "📂 Promotions: 1 email from news@paper.com: Daily",
+    ]
+
+def test_triage_stage_reports_savings(monkeypatch):
+    monkeypatch.setattr(summarizer, "TRIAGE_ENABLED", True)
+    monkeypatch.setattr(summarizer, "CHUNK_STRATEGY", "tokens")
+    monkeypatch.setattr(summarizer, "BACKENDS", [("Perplexity", None)])
+    monkeypatch.setattr(summarizer, "get_email_vectors", lambda emails: [None] * len(emails))
+    important = [{"id": f"w{i}", "from": "boss@work.com", "subject": f"Plan {i}", "snippet": "word " * 200} for i in range(10)]
+    promos = [{"id": f"p{i}", "from": "deals@shop.com", "subject": f"Picks {i}", "snippet": "word " * 200} for i in range(30)]
+    events = []
+    keep, lines, report, chunks = summarizer._triage_stage(important + promos, lambda stage, **d: events.append((stage, d)))
+    assert keep == important
+    assert chunks == summarizer.plan_text_chunks(important, summarizer.load_prompt())
+    assert lines == ["📂 Promotions: 30 emails from deals@shop.com: Picks 0; Picks 1 (+28 more)"]
+    assert report["triaged"] == 30 and report["by_category"] == {"Promotions": 30}
+    assert report["llm_calls_saved"] > 0 and report["tokens_saved"] > 30 * 200
+    assert events[0][0] == "triage"
+
+def test_plan_cost_counts_reduce_calls(monkeypatch):
+    monkeypatch.setattr(summarizer, "SUMMARY_MODE", "mapreduce")
+    monkeypatch.setattr(summarizer, "REDUCE_FANIN", 8)
+    cost = summarizer._plan_cost(["chunk"] * 15, "{emails_text}")
+    assert cost["calls"] == 15 + 3  # 15 digests -> 2 -> 1
+    monkeypatch.setattr(summarizer, "SUMMARY_MODE", "concat")
+    assert summarizer._plan_cost(["chunk"] * 15, "{emails_text}")["calls"] == 15
@@ -0,0 +1,118 @@
+import pytest
+import numpy as np
+from app.services import embeddings, vector_store
+from tests.fakes import FakeQdrantClient, make_mailbox
+
+class CountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def get_sentence_embedding_dimension(self):
+        return 4
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True):
+        self.calls += 1
+        if isinstance(texts, str):
+            return np.ones(4, dtype=np.float32)
+        return np.array([[len(t), 1, 0, 0] for t in texts], dtype=np.float64)
+
+def test_get_embeddings_returns_float32_matrix(monkeypatch):
+    model = CountingModel()
+    monkeypatch.setattr(embeddings, "_model", model)
+    mat = embeddings.get_embeddings(["a", "bb", "ccc"])
+    assert mat.shape == (3, 4)
+    assert mat.dtype == np.float32
+    assert model.calls == 1
+    assert embeddings.get_embeddings([]).shape == (0, 4)
+
+def test_upsert_emails_single_encode_and_fixed_batches(monkeypatch):
+    model = CountingModel()
+    client = FakeQdrantClient()
+    monkeypatch.setattr(embeddings, "_model", model)
+    monkeypatch.setattr(vector_store, "_get_client", lambda: client)
+    monkeypatch.setattr(vector_store, "ensure_collection", lambda: None)
+
+    vector_store.upsert_emails(make_mailbox(25), batch_size=10)
+    assert model.calls == 1
+    assert client.calls["upsert"] == 3
+    assert len(client.points) == 25
+
+def test_upsert_skips_unchanged_emails(monkeypatch):
+    model = CountingModel()
+    client = FakeQdrantClient()
+    monkeypatch.setattr(embeddings, "_model", model)
+    monkeypatch.setattr(vector_store, "_get_client", lambda: client)
+    monkeypatch.setattr(vector_store, "ensure_collection", lambda: None)
+    mailbox = make_mailbox(10)
+
+    assert vector_store.upsert_emails(mailbox) == 10
+    assert vector_store.upsert_emails(mailbox) == 0
+    assert model.calls == 1
+
+    changed = dict(mailbox[0], snippet="edited")
+    assert vector_store.upsert_emails(mailbox[1:] + [changed] + make_mailbox(2, start_id=50)) == 3
+    assert model.calls == 2
+    assert len(client.points) == 12
+
+def test_client_pooled_and_collection_checked_once(monkeypatch):
+    import asyncio
+    from tests.fakes import FakeAsyncQdrantClient
+    created = []
+    client = FakeQdrantClient()
+    monkeypatch.setattr(embeddings, "_model", CountingModel())
+    monkeypatch.setattr(vector_store, "QdrantClient", lambda **kw: created.append(kw) or client)
+    monkeypatch.setattr(vector_store, "AsyncQdrantClient", lambda **kw: FakeAsyncQdrantClient(client))
+    vector_store.close_clients()
+    try:
+        vector_store.upsert_emails(make_mailbox(3))
+        for _ in range(5):
+            assert len(vector_store.search_emails("Subject 1", top_k=2)) == 2
+        results = asyncio.run(vector_store.search_emails_async("Subject 1", top_k=2))
+        assert len(results) == 2
+        assert len(created) == 1
+        assert client.calls["get_collection"] == 1
+        assert client.calls["search"] == 6
+    finally:
+        vector_store.close_clients()
+
+def test_email_vectors_reused_without_encoding(monkeypatch, tmp_path):
+    from app.services.lexical_index import LexicalIndex
+    model = CountingModel()
+    client = FakeQdrantClient()
+    monkeypatch.setattr(embeddings, "_model", model)
+    monkeypatch.setattr(vector_store, "_get_client", lambda: client)
+    monkeypatch.setattr(vector_store, "ensure_collection", lambda: None)
+    monkeypatch.setattr(vector_store, "_backend", None)
+    monkeypatch.setattr(vector_store, "VECTOR_BACKEND", "qdrant")
+    monkeypatch.setattr(vector_store, "_lexical", LexicalIndex(str(tmp_path / "lex.sqlite3")))
+    mailbox = make_mailbox(5)
+    vector_store.upsert_emails(mailbox)
+    calls = model.calls
+
+    retrieves = client.calls["retrieve"]
+    cached = vector_store.get_email_vectors(mailbox)
+    assert all(v is not None for v in cached)
+    assert client.calls["retrieve"] == retrieves  # straight from memory
+    vector_store._recent_vectors.clear()
+    stored = vector_store.get_email_vectors(mailbox + [{"id": "unknown", "from": "x"}])
+    assert client.calls["retrieve"] == retrieves + 1
+    assert np.allclose(np.asarray(stored[:5]), np.asarray(cached))
+    assert stored[5] is None
+    assert model.calls == calls
+
+def test_empty_query_never_embeds(monkeypatch, tmp_path):
+    import asyncio
+    from app.services.lexical_index import LexicalIndex
+    monkeypatch.setattr(embeddings, "_model", CountingModel())
+    monkeypatch.setattr(vector_store, "_get_client", lambda: FakeQdrantClient())
+    monkeypatch.setattr(vector_store, "ensure_collection", lambda: None)
+    monkeypatch.setattr(vector_store, "_backend", None)
+    monkeypatch.setattr(vector_store, "VECTOR_BACKEND", "qdrant")
+    monkeypatch.setattr(vector_store, "_lexical", LexicalIndex(str(tmp_path / "lex.sqlite3")))
+    vector_store.upsert_emails(make_mailbox(4))
+    monkeypatch.setattr(vector_store, "get_embedding", lambda text: pytest.fail("embedded an empty query"))
+    for mode in ("hybrid", "vector", "lexical"):
+        assert vector_store.search_emails("  ", mode=mode) == []
+        assert asyncio.run(vector_store.search_emails_async("", mode=mode)) == []
+    hits = vector_store.search_emails("", sender="alerts@bank.example")
+    assert [h["payload"]["subject"] for h in hits] == ["Subject 0"]